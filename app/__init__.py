@@ -0,0 +1,12 @@
+import importlib
+import importlib.util
+from types import ModuleType
+
+# Submodules are imported on first access (`app.model`, `from app import clock`), importing the package
+# itself loads nothing: pydantic models, requests and the rest are paid for by code using them only.
+
+
+def __getattr__(name: str) -> ModuleType:
+    if not name.startswith('_') and importlib.util.find_spec(f'{__name__}.{name}') is not None:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -4,8 +4,10 @@ from typing import List, Optional, Dict, Union
 
 import requests
 from pydantic import BaseModel, ValidationError, Field
+from pydantic_core import PydanticSerializationError
 
 from app.model import CDNResource, ItemType, APIFolder, APIProcessorError, OriginGroup
+from app.serializer import payload_serializer
 from app.utils import repeat_and_sleep, make_query_string_from_args
 
 
@@ -26,6 +28,14 @@ class APIProcessor(BaseModel):
         """ Returns the list of all existing items in the folder
         """
 
+        if items := self.get_items_list():
+            return [item['id'] for item in items]
+        return None
+
+    def get_items_list(self) -> Optional[List[dict]]:
+        """ Returns the list of all existing items in the folder as API returns them (None if request failed)
+        """
+
         url = f'{self.api_url}/{self.api_endpoint.value}?folderId={self.folder_id}'
         headers = {'Authorization': f'Bearer {self.api_token}'}
         response = requests.get(url=url, headers=headers)
@@ -42,8 +52,9 @@ class APIProcessor(BaseModel):
                 logging.error(f'internal error: details: code [{error_code}], message [{error_message}]')
                 return None
 
-            if resources := response_dict.get(self.api_endpoint.value, None):
-                return [resource['id'] for resource in resources]
+            items = response_dict.get(self.api_endpoint.value, [])
+            self.index_items(items, full=True)
+            return items
 
         except json.JSONDecodeError as e:  # TODO: how to get this to common decorator but use finally anyway?
             logging.debug(f'JSONDecodeError, details: {e}')
@@ -52,6 +63,14 @@ class APIProcessor(BaseModel):
         finally:
             logging.debug(f'response text: {response.text}')  # TODO: how to put this to decorator - how to pass response.text to it?
 
+    def index_items(self, items: List[dict], full: bool = False) -> None:
+        """ Hook to remember items got from API (no-op by default), full is True for listing of all folder items
+        """
+
+    def forget_item(self, item_id: str) -> None:
+        """ Hook to drop deleted item from whatever was remembered about it (no-op by default)
+        """
+
     @repeat_and_sleep(times_to_repeat=5, sleep_duration=1)
     def delete_item_by_id(self, item_id: str) -> Optional[bool]:
         """ Delete specific item by its id
@@ -96,6 +115,7 @@ class APIProcessor(BaseModel):
         finally:
             logging.debug(f'response text: {response.text}')
 
+        self.forget_item(item_id)
         logging.info(f'...OK')
         return True
 
@@ -139,21 +159,38 @@ class APIProcessor(BaseModel):
             logging.debug(f'error details: {e}')
             return None
 
+    def make_payload_from_item(self, item: Union[CDNResource, OriginGroup]) -> Optional[bytes]:
+        """ Return JSON request body made from item object (option subtrees are encoded once and then reused)
+        """
+
+        try:
+            return payload_serializer.dumps_item(item)
+        except (ValidationError, PydanticSerializationError) as e:
+            logging.error('pydantic serialization error')
+            logging.debug(f'error details: {e}')
+            return None
+
     @repeat_and_sleep(times_to_repeat=5, sleep_duration=1)
     def create_item(self, item: Union[CDNResource, OriginGroup]) -> Optional[str]:
         """ Create item
         """
 
+        return self.post_item(item)
+
+    def post_item(self, item: Union[CDNResource, OriginGroup]) -> Optional[str]:
+        """ Send single create request for the item (no retries)
+        """
+
         logging.info(f'Creating {self.item_type}...')
 
-        if not (payload := self.make_dict_from_item(item)):
+        if not (payload := self.make_payload_from_item(item)):
             logging.error('error while parsing item to payload')
             logging.debug(f'item dict: {item}')
             return None
 
         url = f'{self.api_url}/{self.api_endpoint.value}/'
-        headers = {'Authorization': f'Bearer {self.api_token}'}
-        request = requests.post(url=url, headers=headers, json=payload)
+        headers = {'Authorization': f'Bearer {self.api_token}', 'Content-Type': 'application/json'}
+        request = requests.post(url=url, headers=headers, data=payload)
 
         response_status = request.status_code
         if response_status == 200:
@@ -172,6 +209,7 @@ class APIProcessor(BaseModel):
 
                 if item_id := response_dict.get('metadata', {}).get(self.item_type.value + 'Id'):
                     item.id = item_id
+                    self.index_items([{**item.model_dump(include={'cname', 'origin_group_id'}, by_alias=True), 'id': item_id}])
                     logging.info(f'{self.item_type.value} [{item_id}] created successfully')
                     logging.debug(response_dict)
                     return item_id
@@ -185,11 +223,11 @@ class APIProcessor(BaseModel):
             #     logging.debug(f'error details: {e}')
             #     return None
             finally:
-                logging.debug(f'request payload: {json.dumps(payload)}')
+                logging.debug(f'request payload: {payload.decode()}')
                 logging.debug(f'response text: {request.text}')
         elif response_status == 400:
             logging.error('bad request')
-            logging.debug(f'request payload: {json.dumps(payload)}')
+            logging.debug(f'request payload: {payload.decode()}')
             logging.debug(f'response text: {request.text}')
             return None
         else:
@@ -0,0 +1,124 @@
+import threading
+from enum import Enum
+from typing import List, Optional
+
+from app import clock
+
+# paths per purge/prefetch request and requests per second to keep within API limits
+CACHE_BATCH_SIZE = 100
+CACHE_REQUESTS_RATE = 5
+
+
+class CacheAction(str, Enum):
+    PURGE = 'purge'
+    PREFETCH = 'prefetch'
+
+
+def split_batches(paths: List[str], batch_size: int) -> List[List[str]]:
+    return [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+
+
+class RateLimiter:
+    """ Spacing calls of all threads at least 1 / rate seconds apart (no limit if rate is not set)
+    """
+
+    def __init__(self, rate: Optional[float]):
+        self.interval = 1 / rate if rate else 0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = clock.monotonic()
+            at = max(self._next, now)
+            self._next = at + self.interval
+        if at > now:
+            clock.sleep(at - now)
+
+
+class CacheBatchResult:
+    """ One purge/prefetch request: its operation and when it was submitted and done (seconds since action start).
+    Batch is pending if its operation was submitted but not waited for and not done yet.
+    """
+
+    def __init__(self, index: int, paths: List[str]):
+        self.index = index
+        self.paths = paths
+        self.operation_id: Optional[str] = None
+        self.submitted: Optional[float] = None
+        self.done: Optional[float] = None
+        self.success = False
+        self.pending = False
+        self.error: Optional[str] = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        """ Operation time: from submission until it was seen done
+        """
+
+        return None if self.done is None or self.submitted is None else self.done - self.submitted
+
+    def to_dict(self) -> dict:
+        def rounded(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value, 3)
+
+        return {
+            'index': self.index,
+            'paths': len(self.paths),
+            'operation_id': self.operation_id,
+            'success': self.success,
+            'pending': self.pending,
+            'error': self.error,
+            'submitted': rounded(self.submitted),
+            'done': rounded(self.done),
+            'duration': rounded(self.duration),
+        }
+
+
+class CacheActionReport:
+    """ Per-batch results and throughput of purge/prefetch of one cdn resource
+    """
+
+    def __init__(self, action: CacheAction, resource_id: str, paths_count: int):
+        self.action = action
+        self.resource_id = resource_id
+        self.paths_count = paths_count
+        self.batches: List[CacheBatchResult] = []
+        self.elapsed = 0.0
+
+    @property
+    def succeeded(self) -> List[CacheBatchResult]:
+        return [batch for batch in self.batches if batch.success]
+
+    @property
+    def pending(self) -> List[CacheBatchResult]:
+        return [batch for batch in self.batches if batch.pending]
+
+    @property
+    def failed(self) -> List[CacheBatchResult]:
+        return [batch for batch in self.batches if not batch.success and not batch.pending]
+
+    @property
+    def success(self) -> bool:
+        return bool(self.batches) and len(self.succeeded) == len(self.batches)
+
+    def to_dict(self) -> dict:
+        durations = sorted(batch.duration for batch in self.batches if batch.duration is not None)
+        succeeded_paths = sum(len(batch.paths) for batch in self.succeeded)
+        return {
+            'action': self.action.value,
+            'resource_id': self.resource_id,
+            'paths': self.paths_count,
+            'batches': len(self.batches),
+            'failed_batches': len(self.failed),
+            'pending_batches': len(self.pending),
+            'elapsed': round(self.elapsed, 3),
+            'paths_per_second': round(succeeded_paths / self.elapsed, 3) if self.elapsed else None,
+            'batches_per_second': round(len(self.succeeded) / self.elapsed, 3) if self.elapsed else None,
+            'operation_duration': {
+                'min': round(durations[0], 3),
+                'p50': round(durations[(len(durations) - 1) // 2], 3),
+                'max': round(durations[-1], 3),
+            } if durations else None,
+            'results': [batch.to_dict() for batch in self.batches],
+        }
@@ -0,0 +1,299 @@
+import base64
+import bisect
+import gzip
+import logging
+import threading
+from datetime import timedelta
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import orjson
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from app import clock
+
+CASSETTE_VERSION = 1
+
+# never written to cassettes
+_SECRET_HEADERS = frozenset(('authorization', 'cookie', 'x-yacloud-subjecttoken'))
+
+_original_send = HTTPAdapter.send
+_active: Optional['Cassette'] = None
+
+
+def _request_host(request: requests.PreparedRequest) -> str:
+    return request.headers.get('Host') or urlsplit(request.url).netloc
+
+
+def _encode_body(body: Any) -> Optional[str]:
+    if body is None:
+        return None
+    if isinstance(body, str):
+        return body
+    try:
+        return body.decode()
+    except UnicodeDecodeError:
+        return 'base64:' + base64.b64encode(body).decode()
+
+
+def _decode_body(body: Optional[str]) -> bytes:
+    if body is None:
+        return b''
+    if body.startswith('base64:'):
+        return base64.b64decode(body[len('base64:'):])
+    return body.encode()
+
+
+class _RecordedBody:
+    """ Streamed response body passed to the caller as it is read and recorded once read up to the end,
+    released or closed, so streaming callers still measure time to first byte and throughput
+    """
+
+    def __init__(self, raw: Any, on_done: Callable[['_RecordedBody', bytes], None]):
+        self._raw = raw
+        self._on_done = on_done
+        self._chunks: List[bytes] = []
+        self._done = False
+
+    def read(self, amt: Optional[int] = None, *args: Any, **kwargs: Any) -> bytes:
+        data = self._raw.read(amt, decode_content=True)  # no stream(), so requests reads through here
+        if data:
+            self._chunks.append(data)
+        else:
+            self.finish()
+        return data
+
+    def finish(self) -> None:
+        if not self._done:
+            self._done = True
+            self._on_done(self, b''.join(self._chunks))
+
+    def release_conn(self) -> None:
+        self.finish()
+        self._raw.release_conn()
+
+    def close(self) -> None:
+        self.finish()
+        self._raw.close()
+
+    def __getattr__(self, name: str) -> Any:
+        if name == 'stream':
+            raise AttributeError(name)
+        return getattr(self._raw, name)
+
+
+class Cassette:
+    """ HTTP exchanges of a run (API and edges ones, as every request goes through HTTPAdapter.send)
+    in gzipped json lines: the first line is a header with the time run was started at, then one line per exchange
+    with request, response status, headers and body (or error) and when it was sent and how long it took.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+
+    def install(self) -> None:
+        global _active
+        if _active is not None:
+            raise RuntimeError(f'Cassette [{_active.path}] is already in use')
+        _active = self
+
+        def send(adapter: HTTPAdapter, request: requests.PreparedRequest, *args: Any, **kwargs: Any):
+            return self.send(adapter, request, *args, **kwargs)
+
+        HTTPAdapter.send = send
+
+    def uninstall(self) -> None:
+        global _active
+        if _active is self:
+            HTTPAdapter.send = _original_send
+            _active = None
+
+    def send(
+            self,
+            adapter: HTTPAdapter,
+            request: requests.PreparedRequest,
+            *args: Any,
+            **kwargs: Any
+    ) -> requests.Response:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.uninstall()
+
+
+class CassetteRecorder(Cassette):
+    """ Sending requests as usual and recording exchanges, secret headers are not recorded
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.recorded = 0
+        self._file = gzip.open(self.path, 'wb')
+        self._lock = threading.Lock()
+        self._streamed: Set[_RecordedBody] = set()  # bodies not read up to the end yet
+        self._write({'version': CASSETTE_VERSION, 'started': clock.time()})
+
+    def _write(self, line: dict) -> None:
+        with self._lock:
+            self._file.write(orjson.dumps(line) + b'\n')
+
+    def send(
+            self,
+            adapter: HTTPAdapter,
+            request: requests.PreparedRequest,
+            *args: Any,
+            **kwargs: Any
+    ) -> requests.Response:
+        sent_at, start = clock.time(), clock.perf_counter()
+        exchange = {
+            'time': sent_at,
+            'method': request.method,
+            'url': request.url,
+            'host': _request_host(request),
+            'request_headers': {k: v for k, v in request.headers.items() if k.lower() not in _SECRET_HEADERS},
+            'request_body': _encode_body(request.body),
+        }
+        try:
+            response = _original_send(adapter, request, *args, **kwargs)
+        except requests.RequestException as e:
+            exchange.update(elapsed=clock.perf_counter() - start, error=type(e).__name__, error_message=str(e))
+            self._write(exchange)
+            raise
+
+        exchange.update(
+            elapsed=clock.perf_counter() - start,
+            status=response.status_code,
+            reason=response.reason,
+            headers=dict(response.headers),
+        )
+        if not kwargs.get('stream', args[0] if args else False):
+            self._write_exchange(exchange, response.content)
+            return response
+
+        def on_done(body: _RecordedBody, content: bytes) -> None:
+            with self._lock:
+                self._streamed.discard(body)
+            self._write_exchange(exchange, content)
+
+        response.raw = _RecordedBody(response.raw, on_done)
+        with self._lock:
+            self._streamed.add(response.raw)
+        return response
+
+    def _write_exchange(self, exchange: dict, content: bytes) -> None:
+        self._write({**exchange, 'body': _encode_body(content)})
+        with self._lock:
+            self.recorded += 1
+
+    def close(self) -> None:
+        super().close()
+        with self._lock:
+            streamed = list(self._streamed)
+        for body in streamed:
+            body.finish()  # what was read of them
+        with self._lock:
+            self._file.close()
+        logging.info(f'{self.recorded} exchange(s) recorded to [{self.path}]')
+
+
+class CassettePlayer(Cassette):
+    """ Answering requests with recorded exchanges, nothing is sent. Request gets the exchange recorded for the same
+    method, address, host and path (query is ignored) which was the last one sent by the time of the request,
+    so replayed run with different requests schedule still sees what edges answered at that time. Requests going
+    to other addresses than recorded ones (e.g. resolved differently) are matched by host and path only.
+    Clock is set to recorded run time running speed times faster, responses take recorded time divided by speed.
+    """
+
+    def __init__(self, path: Path, speed: float = 1.0):
+        super().__init__(path)
+        with gzip.open(self.path, 'rb') as fp:
+            header, *exchanges = [orjson.loads(line) for line in fp]
+        if header.get('version') != CASSETTE_VERSION:
+            raise ValueError(f'Unsupported cassette version: {header.get("version")}')
+
+        self.started = header['started']
+        self.speed = speed
+        self.replayed = 0
+        self.missed = 0
+        self._previous_clock: Optional[clock.RealClock] = None
+
+        self._by_address: Dict[Tuple[str, str, str, str], List[dict]] = {}
+        self._by_host: Dict[Tuple[str, str, str], List[dict]] = {}
+        for exchange in sorted(exchanges, key=lambda e: e['time']):
+            url = urlsplit(exchange['url'])
+            method, host = exchange['method'], exchange['host']
+            self._by_address.setdefault((method, url.netloc, host, url.path), []).append(exchange)
+            self._by_host.setdefault((method, host, url.path), []).append(exchange)
+        indexes = {**self._by_address, **self._by_host}  # no dict union: python3.8
+        self._times = {key: [e['time'] for e in found] for key, found in indexes.items()}
+
+    def install(self) -> None:
+        super().install()
+        self._previous_clock = clock.use(clock.ScaledClock(self.started, self.speed))
+
+    def uninstall(self) -> None:
+        if _active is self and self._previous_clock is not None:
+            clock.use(self._previous_clock)
+        super().uninstall()
+
+    def find(self, request: requests.PreparedRequest, at: float) -> Optional[dict]:
+        url = urlsplit(request.url)
+        host = _request_host(request)
+        for key, index in (
+                ((request.method, url.netloc, host, url.path), self._by_address),
+                ((request.method, host, url.path), self._by_host)
+        ):
+            if found := index.get(key):
+                return found[max(bisect.bisect_right(self._times[key], at) - 1, 0)]
+        return None
+
+    def send(
+            self,
+            adapter: HTTPAdapter,
+            request: requests.PreparedRequest,
+            *args: Any,
+            **kwargs: Any
+    ) -> requests.Response:
+        if (exchange := self.find(request, clock.time())) is None:
+            self.missed += 1
+            raise requests.ConnectionError(f'No recorded exchange for {request.method} {request.url}', request=request)
+
+        clock.sleep(exchange['elapsed'])
+        self.replayed += 1
+        if error := exchange.get('error'):
+            error_type = getattr(requests.exceptions, error, requests.RequestException)
+            raise error_type(exchange['error_message'], request=request)
+
+        response = requests.Response()
+        response.status_code = exchange['status']
+        response.reason = exchange['reason']
+        response.headers = CaseInsensitiveDict(exchange['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response._content = _decode_body(exchange['body'])
+        response._content_consumed = True  # streamed requests iterate the content too
+        response.url = request.url
+        response.request = request
+        response.connection = adapter
+        response.elapsed = timedelta(seconds=exchange['elapsed'])
+        return response
+
+    def close(self) -> None:
+        super().close()
+        logging.info(f'{self.replayed} exchange(s) replayed from [{self.path}], {self.missed} request(s) not found')
+
+
+def record(path: Path) -> CassetteRecorder:
+    cassette = CassetteRecorder(path)
+    cassette.install()
+    return cassette
+
+
+def replay(path: Path, speed: float = 1.0) -> CassettePlayer:
+    cassette = CassettePlayer(path, speed)
+    cassette.install()
+    return cassette
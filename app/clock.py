@@ -0,0 +1,96 @@
+import threading
+import time as _time
+
+# Time source of probing and waiting: real time, or time of the replayed run running speed times faster.
+# Module functions mirror the ones of time module, so `clock.time()` is used where `time.time()` would be.
+
+
+class RealClock:
+    speed = 1.0
+
+    def time(self) -> float:
+        return _time.time()
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    def perf_counter(self) -> float:
+        return _time.perf_counter()
+
+    def sleep(self, seconds: float) -> None:
+        _time.sleep(seconds)
+
+    def to_real(self, seconds: float) -> float:
+        """ Real seconds passing while the clock counts given seconds
+        """
+
+        return seconds
+
+
+class ScaledClock(RealClock):
+    """ Clock started at the given epoch time and running speed times faster than real one:
+    replayed run sees the time it was recorded at, its sleeps are speed times shorter
+    """
+
+    def __init__(self, start: float, speed: float = 1.0):
+        if speed <= 0:
+            raise ValueError(f'Clock speed has to be positive, got {speed}')
+        self.start = start
+        self.speed = speed
+        self._origin = _time.monotonic()
+
+    def _elapsed(self) -> float:
+        return (_time.monotonic() - self._origin) * self.speed
+
+    def time(self) -> float:
+        return self.start + self._elapsed()
+
+    def monotonic(self) -> float:
+        return self._elapsed()
+
+    def perf_counter(self) -> float:
+        return self._elapsed()
+
+    def sleep(self, seconds: float) -> None:
+        _time.sleep(self.to_real(seconds))
+
+    def to_real(self, seconds: float) -> float:
+        return max(seconds, 0) / self.speed
+
+
+_clock = RealClock()
+_clock_lock = threading.Lock()
+
+
+def use(clock: RealClock) -> RealClock:
+    """ Make clock the time source, returns the previous one
+    """
+
+    global _clock
+    with _clock_lock:
+        previous, _clock = _clock, clock
+    return previous
+
+
+def current() -> RealClock:
+    return _clock
+
+
+def time() -> float:
+    return _clock.time()
+
+
+def monotonic() -> float:
+    return _clock.monotonic()
+
+
+def perf_counter() -> float:
+    return _clock.perf_counter()
+
+
+def sleep(seconds: float) -> None:
+    _clock.sleep(seconds)
+
+
+def to_real(seconds: float) -> float:
+    return _clock.to_real(seconds)
@@ -0,0 +1,127 @@
+import logging
+import threading
+from collections import namedtuple
+from typing import Dict, Optional, Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.resolver import DNSCache, dns_cache
+
+
+EdgeConnectionStats = namedtuple('EdgeConnectionStats', 'requests, connections, reused')
+
+
+class IPPinnedHTTPAdapter(HTTPAdapter):
+    """ Sending requests to the fixed ip address keeping original Host header,
+    for https also TLS SNI and certificate hostname check of the original host
+    """
+
+    def __init__(self, ip_address: str, *args: Any, **kwargs: Any):
+        self.ip_address = ip_address
+        super().__init__(*args, **kwargs)
+
+    def send(self, request: requests.PreparedRequest, *args: Any, **kwargs: Any) -> requests.Response:
+        url = urlsplit(request.url)
+        if 'Host' not in request.headers:
+            request.headers['Host'] = url.netloc
+        ip_address = f'[{self.ip_address}]' if ':' in self.ip_address else self.ip_address
+        netloc = ip_address if url.port is None else f'{ip_address}:{url.port}'
+        request.url = url._replace(netloc=netloc).geturl()
+        return super().send(request, *args, **kwargs)
+
+    def build_connection_pool_key_attributes(self, request: requests.PreparedRequest, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        if host_params['scheme'] == 'https':
+            # connection goes to ip address, so TLS has to be told which host it talks to
+            server_hostname = urlsplit(f'//{request.headers["Host"]}').hostname
+            pool_kwargs['server_hostname'] = server_hostname
+            if verify is not False:
+                pool_kwargs['assert_hostname'] = server_hostname
+        return host_params, pool_kwargs
+
+    def connection_stats(self) -> EdgeConnectionStats:
+        requests_count, connections_count = 0, 0
+        pools = self.poolmanager.pools
+        for key in pools.keys():
+            if pool := pools.get(key):
+                requests_count += pool.num_requests
+                connections_count += pool.num_connections
+        return EdgeConnectionStats(requests_count, connections_count, max(requests_count - connections_count, 0))
+
+
+class EdgeClientRegistry:
+    """ Long-lived keep-alive clients pinned to edge ip addresses: one connections pool set per edge ip
+    reused across all resources and probing periods
+    """
+
+    def __init__(self, pool_connections: int = 32, pool_maxsize: int = 10):
+        self.pool_connections = pool_connections  # pools per edge: one per scheme and (for https) per hostname
+        self.pool_maxsize = pool_maxsize  # keep-alive connections per pool
+        self._sessions: Dict[str, requests.Session] = {}
+        self._adapters: Dict[str, IPPinnedHTTPAdapter] = {}
+        self._lock = threading.Lock()
+
+    def get_session(self, ip_address: str) -> requests.Session:
+        with self._lock:
+            if (session := self._sessions.get(ip_address)) is None:
+                adapter = IPPinnedHTTPAdapter(
+                    ip_address,
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize
+                )
+                session = requests.Session()
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                self._sessions[ip_address] = session
+                self._adapters[ip_address] = adapter
+            return session
+
+    def get(self, url: str, ip_address: str, **kwargs: Any) -> requests.Response:
+        return self.get_session(ip_address).get(url, **kwargs)
+
+    def get_resolved(self, url: str, resolver: DNSCache = None, **kwargs: Any) -> requests.Response:
+        """ GET through one of cached addresses of url host, so no DNS lookup is made per request.
+        If host is not resolved request goes through system resolver to fail the usual way
+        """
+
+        if ip_address := (resolver or dns_cache).pick(urlsplit(url).hostname):
+            return self.get(url, ip_address, **kwargs)
+        return requests.get(url, **kwargs)
+
+    def connection_stats(self) -> Dict[str, EdgeConnectionStats]:
+        """ Returns requests sent, connections opened and reused per edge ip address
+        """
+
+        with self._lock:
+            adapters = dict(self._adapters)
+        return {ip_address: adapter.connection_stats() for ip_address, adapter in adapters.items()}
+
+    def close(self) -> None:
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+            self._adapters.clear()
+
+
+edge_clients = EdgeClientRegistry()
+
+
+def http_get_request_through_ip_address(
+        url: str,
+        ip_address: str,
+        protocol: str = 'http',
+        verify: bool = True,
+        timeout: Optional[int] = 5
+) -> Optional[requests.Response]:
+    """ GET url (without scheme) from the specific edge using pooled connections to it, None if request failed.
+    https certificate is checked against the url host unless verify is False
+    """
+
+    try:
+        return edge_clients.get(f'{protocol}://{url}', ip_address, verify=verify, timeout=timeout)
+    except requests.RequestException as e:
+        logging.debug(f'GET {protocol}://{url} through [{ip_address}] failed: {e}')
+        return None
@@ -0,0 +1,209 @@
+import logging
+import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from app.utils import ping
+
+PING_RTT_PATTERN = re.compile(r'time[=<]\s*([\d.]+)\s*ms')
+
+
+class RTTStats:
+    """ Running round trip time stats of one check of one edge: min/avg, jitter as mean difference
+    of consecutive RTTs (as RFC 3550 does) and loss
+    """
+
+    __slots__ = ('probes', 'lost', 'rtt_min', 'rtt_sum', 'jitter_sum', 'last_rtt', 'updated_at')
+
+    def __init__(self):
+        self.probes = 0
+        self.lost = 0
+        self.rtt_min: Optional[float] = None
+        self.rtt_sum = 0.0
+        self.jitter_sum = 0.0
+        self.last_rtt: Optional[float] = None
+        self.updated_at: Optional[float] = None
+
+    def add(self, rtt: Optional[float]) -> None:
+        self.probes += 1
+        self.updated_at = time.time()
+        if rtt is None:
+            self.lost += 1
+            return
+        if self.last_rtt is not None:
+            self.jitter_sum += abs(rtt - self.last_rtt)
+        self.last_rtt = rtt
+        self.rtt_sum += rtt
+        self.rtt_min = rtt if self.rtt_min is None else min(self.rtt_min, rtt)
+
+    @property
+    def received(self) -> int:
+        return self.probes - self.lost
+
+    @property
+    def loss(self) -> Optional[float]:
+        return self.lost / self.probes if self.probes else None
+
+    @property
+    def rtt_avg(self) -> Optional[float]:
+        return self.rtt_sum / self.received if self.received else None
+
+    @property
+    def jitter(self) -> Optional[float]:
+        return self.jitter_sum / (self.received - 1) if self.received > 1 else None
+
+    def to_dict(self) -> dict:
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            'probes': self.probes,
+            'loss': self.loss,
+            'rtt_min_ms': ms(self.rtt_min),
+            'rtt_avg_ms': ms(self.rtt_avg),
+            'jitter_ms': ms(self.jitter),
+        }
+
+    def __repr__(self) -> str:
+        return f'RTTStats({self.to_dict()})'
+
+
+class EdgeHealth:
+    def __init__(self, host: str, use_icmp: bool = False):
+        self.host = host
+        self.tcp = RTTStats()
+        self.icmp = RTTStats() if use_icmp else None
+
+    def is_healthy(self, max_loss: float = 0.5) -> Optional[bool]:
+        """ Edge accepts connections, ICMP is informational only as it is often filtered.
+        None if edge is not checked yet
+        """
+
+        if self.tcp.loss is None:
+            return None
+        return self.tcp.loss <= max_loss
+
+    def to_dict(self) -> dict:
+        return {'tcp': self.tcp.to_dict(), 'icmp': self.icmp.to_dict() if self.icmp else None}
+
+    def __repr__(self) -> str:
+        return f'EdgeHealth({self.host}, {self.to_dict()})'
+
+
+def tcp_connect_rtt(host: str, port: int, timeout: float) -> Optional[float]:
+    start = time.perf_counter()
+    try:
+        with socket.create_connection((host, port), timeout=timeout):
+            return time.perf_counter() - start
+    except OSError as e:
+        logging.debug(f'TCP connect to [{host}:{port}] failed: {e}')
+        return None
+
+
+def icmp_rtt(host: str, timeout: float) -> Optional[float]:
+    if (res := ping(host, attempts=1, timeout=timeout)) is None:
+        return None
+    if match := PING_RTT_PATTERN.search(res.stdout):
+        return float(match.group(1)) / 1000
+    return None
+
+
+class EdgeHealthMonitor:
+    """ Checking all edges at once by TCP connect (and optionally by ICMP ping) round by round,
+    either on demand or continuously in the background thread, so the health is read from cache without waiting
+    """
+
+    def __init__(
+            self,
+            hosts: List[str],
+            port: int = 80,
+            use_icmp: bool = False,
+            timeout: float = 2,
+            interval: float = 10,
+            max_workers: int = 32
+    ):
+        self.port = port
+        self.use_icmp = use_icmp
+        self.timeout = timeout
+        self.interval = interval
+        self.max_workers = max_workers
+        self.rounds = 0
+
+        self._health: Dict[str, EdgeHealth] = {host: EdgeHealth(host, use_icmp) for host in hosts}
+        self._lock = threading.Lock()
+        self._checked = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _check_host(self, host: str) -> None:
+        tcp_rtt = tcp_connect_rtt(host, self.port, self.timeout)
+        rtt = icmp_rtt(host, self.timeout) if self.use_icmp else None
+        with self._lock:
+            health = self._health[host]
+            health.tcp.add(tcp_rtt)
+            if health.icmp:
+                health.icmp.add(rtt)
+
+    def check(self, rounds: int = 1) -> Dict[str, EdgeHealth]:
+        """ Check all edges concurrently the given number of rounds
+        """
+
+        if not self._health:
+            self._checked.set()
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self._health))) as executor:
+            for _ in range(rounds):
+                list(executor.map(self._check_host, self._health))
+                self.rounds += 1
+                self._checked.set()
+        return self.snapshot()
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self.check()
+            self._stopped.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='edge-health-monitor', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def wait_checked(self, timeout: Optional[float] = None) -> bool:
+        """ Wait for the first round to be finished: by the background thread if it runs, otherwise the round
+        is made here. Returns False if the background round is not finished in timeout
+        """
+
+        if self._thread is None or not self._thread.is_alive():
+            if not self._checked.is_set():
+                self.check()
+            return True
+        return self._checked.wait(timeout)
+
+    def snapshot(self, wait: Optional[float] = None) -> Dict[str, EdgeHealth]:
+        """ Health of all edges, waiting up to `wait` seconds for the first round if it is not finished yet
+        """
+
+        if wait:
+            self._checked.wait(wait)
+        with self._lock:
+            return dict(self._health)
+
+    def unhealthy(self, max_loss: float = 0.5, wait: Optional[float] = None) -> List[str]:
+        """ Checked edges which are not healthy, edges not checked yet are not in there
+        """
+
+        return [host for host, health in self.snapshot(wait).items() if health.is_healthy(max_loss) is False]
+
+    def unchecked(self) -> List[str]:
+        return [host for host, health in self.snapshot().items() if health.is_healthy() is None]
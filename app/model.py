@@ -1,9 +1,10 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 from datetime import datetime
 from enum import Enum
-from typing import Optional, List, Dict
+from typing import Any, Optional, List, Dict, Tuple
 
 from pydantic import BaseModel, Field, ConfigDict
 
@@ -183,7 +184,16 @@ class Origin(BaseModelWithAliases):
     backup: Optional[bool] = Field(None)
     meta: Optional[OriginMeta] = Field(None)
 
-# TODO: make origins and origin groups comparable (__eq()__ and __ne()__)
+    def fingerprint(self) -> Tuple[str, bool, bool]:
+        # ids are assigned by API and not set options are API defaults (enabled, not backup)
+        return self.source, self.enabled is not False, bool(self.backup)
+
+    def __eq__(self, other: Origin) -> bool:
+        return isinstance(other, Origin) and self.fingerprint() == other.fingerprint()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
 class OriginGroup(BaseModelWithAliases):
     use_next: Optional[bool] = Field(None, alias='useNext')
     origins: List[Origin]
@@ -191,3 +201,24 @@ class OriginGroup(BaseModelWithAliases):
     folder_id: str = Field(..., alias='folderId')
     name: str
 
+    def fingerprint(self) -> str:
+        """ Hash of origin group content regardless of ids and origins order
+        """
+
+        content = (self.folder_id, self.name, bool(self.use_next), sorted(o.fingerprint() for o in self.origins))
+        return hashlib.sha256(repr(content).encode()).hexdigest()
+
+    def __eq__(self, other: OriginGroup) -> bool:
+        return isinstance(other, OriginGroup) and self.fingerprint() == other.fingerprint()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+
+class Operation(BaseModelWithAliases):
+    id: str
+    description: Optional[str] = Field(None)
+    created_at: Optional[datetime] = Field(None, alias='createdAt')
+    done: bool = Field(False)
+    error: Optional[APIProcessorError] = Field(None)
+    metadata: Optional[Dict[str, Any]] = Field(None)
@@ -1,10 +1,138 @@
-from typing import Any
+import json
+import logging
+from typing import Any, List, Optional, Set
+
+import orjson
+import requests
+from pydantic import ValidationError
 
 from app.apiprocessor import APIProcessor
+from app.model import OriginGroup, APIProcessorError
+from app.resource import ResourcesAPIProcessor
 
 
 class OriginGroupsAPIProcessor(APIProcessor):
 
     def __init__(self, *args: Any, **kwargs: Any):
         super().__init__(*args, **kwargs)
-        self.query_args = {'folderId': self.folder_id}
\ No newline at end of file
+        self.api_endpoint_query_args = {'folderId': self.folder_id}
+
+    def get_origin_group_by_id(self, origin_group_id: str) -> Optional[OriginGroup]:
+
+        if not origin_group_id:
+            logging.error(f'None or empty origin group id: [{origin_group_id}]')
+            return None
+
+        url = f'{self.api_url}/{self.api_endpoint.value}/{origin_group_id}?folderId={self.folder_id}'
+        headers = {'Authorization': f'Bearer {self.api_token}'}
+
+        request = requests.get(url=url, headers=headers)
+        try:
+            return OriginGroup.model_validate(request.json())
+        except json.JSONDecodeError as e:
+            logging.error(f'json decode error')
+            logging.debug(f'error details: {e}')
+            return None
+        except ValidationError as e:
+            logging.error(f'pydantic validation error')
+            logging.debug(f'error details: {e}')
+            return None
+        finally:
+            logging.debug(f'response text: {request.text}')
+
+    def get_origin_groups_list(self) -> Optional[List[OriginGroup]]:
+        """ Returns all origin groups of the folder
+        """
+
+        if (items := self.get_items_list()) is None:
+            return None
+        try:
+            return [OriginGroup.model_validate(item) for item in items]
+        except ValidationError as e:
+            logging.error(f'pydantic validation error')
+            logging.debug(f'error details: {e}')
+            return None
+
+    def compare_origin_group_to_existing(self, origin_group: OriginGroup) -> bool:
+        existing_origin_group = self.get_origin_group_by_id(origin_group.id)
+        return origin_group == existing_origin_group
+
+    def update(self, updated_origin_group: OriginGroup) -> Optional[OriginGroup]:
+        """ Update origin group, returns it as it is after the update (None if update failed)
+        """
+
+        url = f'{self.api_url}/{self.api_endpoint.value}'
+        headers = {'Authorization': f'Bearer {self.api_token}', 'Content-Type': 'application/json'}
+
+        payload = updated_origin_group.model_dump(
+            exclude={'id': True, 'origins': {'__all__': {'id', 'origin_group_id'}}},
+            exclude_none=True,
+            by_alias=True
+        )
+        payload['groupId'] = updated_origin_group.id
+        payload['groupName'] = payload.pop('name')  # update request names it differently from the model
+        body = orjson.dumps(payload)
+        request = requests.patch(url=url, headers=headers, data=body)
+        logging.debug(f'request body:\n {body.decode()}')
+
+        response_status = request.status_code
+        if response_status == 200:
+            try:
+                response_dict = request.json()
+
+                if error := response_dict.get('error'):
+                    try:
+                        error = APIProcessorError.model_validate(error)
+                    except ValidationError as e:
+                        logging.error('pydantic validation error')
+                        logging.debug(f'error details: {e}')
+                        return None
+
+                    logging.error(f'API error: {error.message}, code {error.code}')
+                    return None
+
+                if origin_group_id := response_dict.get('metadata', {}).get('originGroupId'):
+                    logging.info(f'Origin group [{origin_group_id}] updated successfully')
+                    logging.debug(response_dict)
+                    return self.get_origin_group_by_id(origin_group_id)
+
+            except json.JSONDecodeError as e:
+                logging.error('JSONDecodeError')
+                logging.debug(f'error details: {e}')
+                return None
+            finally:
+                logging.debug(f'response text: {request.text}')
+        elif response_status == 400:
+            logging.error('bad request')
+            logging.debug(request.text)
+            return None
+
+    def get_origin_groups_ids_by_source(self, source: str) -> Optional[Set[str]]:
+        """ Returns ids of origin groups having origin with the source
+        """
+
+        if (origin_groups := self.get_origin_groups_list()) is None:
+            return None
+        return {
+            origin_group.id for origin_group in origin_groups
+            if any(origin.source == source for origin in origin_group.origins)
+        }
+
+    def get_resources_ids_using_origin(
+            self,
+            source: str,
+            resources_processor: ResourcesAPIProcessor,
+            refresh: bool = False
+    ) -> Optional[Set[str]]:
+        """ Returns ids of cdn resources using the origin source: looked up at resources processor reverse index
+        (refreshed from API listing if asked) instead of scanning every resource
+        """
+
+        if (origin_groups_ids := self.get_origin_groups_ids_by_source(source)) is None:
+            return None
+        if refresh:
+            resources_processor.get_items_ids_list()
+        return set().union(*[
+            resources_processor.get_resources_ids_by_origin_group_id(origin_group_id)
+            for origin_group_id in origin_groups_ids
+        ])
@@ -0,0 +1,107 @@
+import logging
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import dns.exception
+    import dns.resolver
+except ImportError:  # dnspython is optional: system resolver is used then and records TTLs are unknown
+    dns = None
+
+DNSRecord = namedtuple('DNSRecord', 'addresses, expires_at')
+
+_RESOLVE_ERRORS = (OSError, UnicodeError) + ((dns.exception.DNSException,) if dns else ())
+
+
+class DNSCache:
+    """ Resolving names once per record TTL (default TTL with system resolver), so requests are sent to cached
+    addresses and DNS lookup time is not a part of measured latency. All addresses name ever resolved to are kept:
+    for cdn resource cname these are edges serving it.
+    """
+
+    def __init__(self, default_ttl: float = 30, negative_ttl: float = 5, use_dnspython: bool = True):
+        self.default_ttl = default_ttl
+        self.negative_ttl = negative_ttl  # names failed to resolve are not looked up again for that long
+        self.use_dnspython = use_dnspython and dns is not None
+        self.lookups = 0
+        self.hits = 0
+
+        self._records: Dict[str, DNSRecord] = {}
+        self._seen: Dict[str, Dict[str, None]] = {}  # ordered sets of all addresses of names
+        self._round_robin: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def _query(self, name: str) -> Tuple[List[str], float]:
+        if self.use_dnspython:
+            addresses, ttls = [], []
+            for record_type in ('A', 'AAAA'):
+                try:
+                    answer = dns.resolver.resolve(name, record_type)
+                except dns.resolver.NoAnswer:
+                    continue
+                addresses += [record.address for record in answer]
+                ttls.append(answer.rrset.ttl)
+            return addresses, min(ttls, default=self.default_ttl)
+
+        infos = socket.getaddrinfo(name, None, type=socket.SOCK_STREAM)
+        return list(dict.fromkeys(info[4][0] for info in infos)), self.default_ttl
+
+    def resolve(self, name: str) -> List[str]:
+        """ Cached addresses of the name, empty list if name is not resolved
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            if (record := self._records.get(name)) and record.expires_at > now:
+                self.hits += 1
+                return record.addresses
+
+        try:
+            addresses, ttl = self._query(name)
+        except _RESOLVE_ERRORS as e:
+            logging.debug(f'Failed to resolve [{name}]: {e}')
+            addresses, ttl = [], self.negative_ttl
+
+        with self._lock:
+            self.lookups += 1
+            self._records[name] = DNSRecord(addresses, now + (ttl if addresses else self.negative_ttl))
+            self._seen.setdefault(name, {}).update(dict.fromkeys(addresses))
+        logging.debug(f'[{name}] resolved to {addresses} for {ttl} seconds')
+        return addresses
+
+    def pick(self, name: str) -> Optional[str]:
+        """ Next of the cached addresses of the name round robin (as DNS would rotate them)
+        """
+
+        if not (addresses := self.resolve(name)):
+            return None
+        with self._lock:
+            i = self._round_robin[name] = self._round_robin.get(name, -1) + 1
+        return addresses[i % len(addresses)]
+
+    def resolve_all(self, names: Iterable[str], max_workers: int = 16) -> Dict[str, List[str]]:
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(names))) as executor:
+            return dict(zip(names, executor.map(self.resolve, names)))
+
+    def seen_addresses(self, name: str) -> List[str]:
+        with self._lock:
+            return list(self._seen.get(name, {}))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._records.clear()
+            self._seen.clear()
+            self._round_robin.clear()
+
+    def __repr__(self) -> str:
+        return f'DNSCache(names={len(self._records)}, lookups={self.lookups}, hits={self.hits})'
+
+
+dns_cache = DNSCache()
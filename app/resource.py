@@ -1,15 +1,159 @@
 import json
-from typing import Iterator, Union
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, Union, Set
 
+import orjson
 import requests
-from pydantic import ValidationError
+from pydantic import Field, ValidationError, PrivateAttr
+from pydantic_core import PydanticSerializationError
 
+from app import clock
 from app.apiprocessor import APIProcessor
+from app.cacheops import CACHE_BATCH_SIZE, CACHE_REQUESTS_RATE, CacheAction, CacheActionReport, CacheBatchResult, \
+    RateLimiter, split_batches
 from app.model import *
-from app.utils import make_random_8_symbols
+from app.serializer import payload_serializer
+from app.utils import make_random_8_symbols, repeat_and_sleep, increment
+from app.waiter import wait_for
+
+# max seconds to wait for concurrent creator of the same cname, its create retries included
+CNAME_RESERVATION_TIMEOUT = 300
+
+# network errors worth retrying: request may pass once connection is back
+TRANSIENT_REQUEST_ERRORS = (requests.ConnectionError, requests.Timeout)
 
 
 class ResourcesAPIProcessor(APIProcessor):
+    operation_api_url: str = Field(
+        'https://operation.api.cloud.yandex.net/operations', description='Yandex Cloud operations API url'
+    )
+
+    # cname -> id of resources known to exist in the folder: filled from listings and own creates
+    _cname_index: Dict[str, str] = PrivateAttr(default_factory=dict)
+    # cnames currently being created by some of parallel creators
+    _reserved_cnames: Set[str] = PrivateAttr(default_factory=set)
+    # origin group id -> ids of resources using it (reverse index) and resource id -> its origin group id
+    _origin_group_index: Dict[str, Set[str]] = PrivateAttr(default_factory=dict)
+    _resource_origin_group: Dict[str, str] = PrivateAttr(default_factory=dict)
+    # lock of the indexes, notified once a cname reservation is released
+    _index_lock: threading.Condition = PrivateAttr(default_factory=threading.Condition)
+    # called with id and resource once it is updated through the processor, with id and None once it is deleted
+    _update_listeners: List[Callable[[str, Optional[CDNResource]], None]] = PrivateAttr(default_factory=list)
+
+    def add_update_listener(self, listener: Callable[[str, Optional[CDNResource]], None]) -> None:
+        self._update_listeners.append(listener)
+
+    def _notify_update_listeners(self, resource_id: str, resource: Optional[CDNResource]) -> None:
+        for listener in self._update_listeners:
+            listener(resource_id, resource)
+
+    def index_items(self, items: List[dict], full: bool = False) -> None:
+        """ Remember cnames and origin groups of items, full listing replaces the indexes: resources deleted
+        elsewhere are forgotten
+        """
+
+        with self._index_lock:
+            if full:
+                self._cname_index.clear()
+                self._origin_group_index.clear()
+                self._resource_origin_group.clear()
+            for item in items:
+                if not (item_id := item.get('id')):
+                    continue
+                if cname := item.get('cname'):
+                    self._cname_index[cname] = item_id
+                if origin_group_id := item.get('originGroupId'):
+                    self._unindex_origin_group(item_id)
+                    self._origin_group_index.setdefault(str(origin_group_id), set()).add(item_id)
+                    self._resource_origin_group[item_id] = str(origin_group_id)
+
+    def forget_item(self, item_id: str) -> None:
+        with self._index_lock:
+            for cname in [cname for cname, indexed_id in self._cname_index.items() if indexed_id == item_id]:
+                del self._cname_index[cname]
+            self._unindex_origin_group(item_id)
+        self._notify_update_listeners(item_id, None)
+
+    def _unindex_origin_group(self, item_id: str) -> None:
+        if (origin_group_id := self._resource_origin_group.pop(item_id, None)) is not None:
+            self._origin_group_index[origin_group_id].discard(item_id)
+            if not self._origin_group_index[origin_group_id]:
+                del self._origin_group_index[origin_group_id]
+
+    def get_resources_ids_by_origin_group_id(self, origin_group_id: str, refresh: bool = False) -> Set[str]:
+        """ Return ids of known resources using the origin group, index is refreshed from API listing if asked
+        """
+
+        if refresh:
+            self.get_items_ids_list()
+        with self._index_lock:
+            return set(self._origin_group_index.get(str(origin_group_id), ()))
+
+    def get_resource_id_by_cname(self, cname: str, refresh: bool = False) -> Optional[str]:
+        """ Return id of existing resource with the cname, index is refreshed from API listing if asked
+        """
+
+        if refresh:
+            self.get_items_ids_list()
+        with self._index_lock:
+            return self._cname_index.get(cname)
+
+    def reserve_cname(self, cname: str, timeout: Optional[float] = CNAME_RESERVATION_TIMEOUT) -> bool:
+        """ Atomically reserve cname for creation: fails if it is already used. Cname being created by someone else
+        is waited for (up to timeout seconds) to be created or given up by that creator first
+        """
+
+        with self._index_lock:
+            real_timeout = None if timeout is None else clock.to_real(timeout)
+            if not self._index_lock.wait_for(lambda: cname not in self._reserved_cnames, real_timeout):
+                return False
+            if cname in self._cname_index:
+                return False
+            self._reserved_cnames.add(cname)
+            return True
+
+    def release_cname(self, cname: str) -> None:
+        with self._index_lock:
+            self._reserved_cnames.discard(cname)
+            self._index_lock.notify_all()
+
+    def create_item(self, item: CDNResource) -> Optional[str]:
+        """ Idempotently create cdn resource: existing resource with the same cname is returned instead of a duplicate
+        (API accepts duplicate cnames with following crash of such resources). Concurrent creator of the same cname
+        is waited for and its resource is returned
+        """
+
+        if not self.reserve_cname(item.cname):
+            if existing_id := self.get_resource_id_by_cname(item.cname):
+                logging.info(f'cdn resource with cname [{item.cname}] already exists: [{existing_id}]')
+                item.id = existing_id
+                return existing_id
+            logging.error(f'cname [{item.cname}] is still being created by another creator')
+            return None
+
+        try:
+            return self.create_reserved_item(item)
+        finally:
+            self.release_cname(item.cname)
+
+    def create_reserved_item(self, item: CDNResource) -> Optional[str]:
+        """ Create cdn resource which cname is already reserved by the caller
+        """
+
+        attempt = increment()
+
+        @repeat_and_sleep(times_to_repeat=5, sleep_duration=1)
+        def create_once() -> Optional[str]:
+            # previous attempt could have created the resource but lost the response: check listing before posting again
+            if next(attempt) > 1 and (existing_id := self.get_resource_id_by_cname(item.cname, refresh=True)):
+                logging.info(f'cdn resource with cname [{item.cname}] was created by previous attempt: [{existing_id}]')
+                item.id = existing_id
+                return existing_id
+            return self.post_item(item)
+
+        return create_once()
 
     def get_resource_by_id(self, resource_id: str) -> Optional[CDNResource]:
 
@@ -39,22 +183,23 @@ class ResourcesAPIProcessor(APIProcessor):
         existing_item = self.get_resource_by_id(item.id)
         return item == existing_item
 
-    def make_dict_from_item(self, item: CDNResource) -> Optional[dict]:
-        if not (item_dict := super().make_dict_from_item(item)):
-            logging.error('error while transforming cdn resource to dict')
+    def make_payload_from_item(self, item: CDNResource) -> Optional[bytes]:
+        if not item.origin_group_id:
+            logging.error('[originGroupId] attribute is absent at cdn resource')
             logging.debug(f'cdn resource: {item}')
             return None
 
-        if not (origin_group_id := item_dict.get('originGroupId')):
-            logging.error('[originGroupId] attribute is absent at cdn resource dict')
-            logging.debug(f'cdn resource dict: {item_dict}')
+        try:
+            return payload_serializer.dumps_item(
+                item,
+                exclude={'origin_group_id'},
+                update={'origin': {'originGroupId': item.origin_group_id}}
+            )
+        except (ValidationError, PydanticSerializationError) as e:
+            logging.error('error while transforming cdn resource to payload')
+            logging.debug(f'error details: {e}')
             return None
 
-        # TODO: move to create method as it is used only there
-        item_dict['origin'] = {'originGroupId': origin_group_id}
-        del (item_dict['originGroupId'])
-        return item_dict
-
     def create_several_default_cdn_resources(
             self,
             cname_domain:str,
@@ -72,13 +217,19 @@ class ResourcesAPIProcessor(APIProcessor):
                 origin_group_id=origin_group_id
             )
 
+        self.get_items_ids_list()  # fill cname index not to generate cnames of already existing resources
+
         cname_generator = self.random_cname_generator(cname_domain=cname_domain)
         for i in range(n):
-            cdn_resource.cname = next(cname_generator)
-            if not (cdn_id := self.create_item(item=cdn_resource)):
-                cdn_resource.cname = next(cname_generator)  # крайне маловероятно, но повторно генерим cname - на случай, если предыдущий совпал с уже существующим TODO: заменить на обработку кастомной ошибки одинакового cname
-                if not (cdn_id := self.create_item(item=cdn_resource)):
+            while not self.reserve_cname(cname := next(cname_generator), timeout=0):  # taken: just take the next one
+                continue
+            cdn_resource.cname = cname
+            cdn_resource.id = None
+            try:
+                if not (cdn_id := self.create_reserved_item(item=cdn_resource)):
                     logging.error(f'Error creating cdn resource #{i+1}')
+            finally:
+                self.release_cname(cname)
 
             if cdn_id:
                 logging.info(f'сdn resource #{i+1} with id [{cdn_id}] created')
@@ -102,9 +253,11 @@ class ResourcesAPIProcessor(APIProcessor):
         url = f'{self.api_url}/resources/{updated_resource.id}'
         headers = {'Authorization': f'Bearer {self.api_token}'}
 
-        payload = updated_resource.model_dump(exclude={'created_at', 'updated_at'}, by_alias=True)
-        request = requests.patch(url=url, headers=headers, json=payload)
-        logging.debug(f'request body:\n {request.request.body}')
+        headers['Content-Type'] = 'application/json'
+
+        payload = payload_serializer.dumps_item(updated_resource, exclude={'created_at', 'updated_at'}, exclude_none=False)
+        request = requests.patch(url=url, headers=headers, data=payload)
+        logging.debug(f'request body:\n {payload.decode()}')
 
         response_status = request.status_code
         if response_status == 200:
@@ -122,6 +275,8 @@ class ResourcesAPIProcessor(APIProcessor):
                     return None
 
                 if 'metadata' in response_dict and (cdn_resource_id := response_dict['metadata'].get('resourceId')):
+                    self.index_items([{'id': cdn_resource_id, 'originGroupId': updated_resource.origin_group_id}])
+                    self._notify_update_listeners(cdn_resource_id, updated_resource)
                     logging.info(f'CDN Resource [{cdn_resource_id}] updated successfully')
                     logging.debug(response_dict)
                     return cdn_resource_id
@@ -140,6 +295,157 @@ class ResourcesAPIProcessor(APIProcessor):
             logging.debug(request.text)
             return None
 
+    def submit_cache_action(self, action: CacheAction, resource_id: str, paths: List[str]) -> Optional[Operation]:
+        """ Send single purge/prefetch request, returns operation started by it
+        """
+
+        url = f'{self.api_url}/cache/{resource_id}:{action.value}'
+        headers = {'Authorization': f'Bearer {self.api_token}', 'Content-Type': 'application/json'}
+
+        request = requests.post(url=url, headers=headers, data=orjson.dumps({'paths': paths}))
+        if request.status_code != 200:
+            logging.error(f'{action.value} of [{resource_id}] failed with status code {request.status_code}')
+            logging.debug(f'response text: {request.text}')
+            return None
+        try:
+            response_dict = request.json()
+            if error := response_dict.get('error'):
+                error = APIProcessorError.model_validate(error)
+                logging.error(f'API error: {error.message}, code {error.code}')
+                return None
+            return Operation.model_validate(response_dict)
+        except json.JSONDecodeError as e:
+            logging.error('JSONDecodeError')
+            logging.debug(f'error details: {e}')
+            return None
+        except ValidationError as e:
+            logging.error('pydantic validation error')
+            logging.debug(f'error details: {e}')
+            return None
+        finally:
+            logging.debug(f'response text: {request.text}')
+
+    def get_operation(self, operation_id: str) -> Optional[Operation]:
+        """ Current state of the operation, None if it is not available now.
+        Client errors (401, 404 etc.) are not going to pass on retry and are raised as requests.HTTPError
+        """
+
+        url = f'{self.operation_api_url}/{operation_id}'
+        headers = {'Authorization': f'Bearer {self.api_token}'}
+
+        request = requests.get(url=url, headers=headers)
+        if request.status_code != 200:
+            logging.error(f'getting operation [{operation_id}] failed with status code {request.status_code}')
+            logging.debug(f'response text: {request.text}')
+            if 400 <= request.status_code < 500:
+                request.raise_for_status()
+            return None
+        try:
+            return Operation.model_validate(request.json())
+        except json.JSONDecodeError as e:
+            logging.error(f'json decode error')
+            logging.debug(f'error details: {e}')
+            return None
+        except ValidationError as e:
+            logging.error(f'pydantic validation error')
+            logging.debug(f'error details: {e}')
+            return None
+        finally:
+            logging.debug(f'response text: {request.text}')
+
+    def run_cache_action(
+            self,
+            action: CacheAction,
+            resource_id: str,
+            paths: Iterable[str],
+            batch_size: int = CACHE_BATCH_SIZE,
+            rate: Optional[float] = CACHE_REQUESTS_RATE,
+            max_workers: int = 8,
+            wait: bool = True,
+            timeout: float = 600
+    ) -> CacheActionReport:
+        """ Purge/prefetch paths split into batches of batch_size: batches are submitted concurrently,
+        at most rate requests per second, and (if wait) their operations are tracked until done or timeout.
+        Without wait batches whose operations are not done yet are reported pending, not succeeded.
+        Empty paths list is a single batch (purge of the whole cache).
+        """
+
+        paths = list(dict.fromkeys(paths))
+        report = CacheActionReport(action, resource_id, len(paths))
+        report.batches = [CacheBatchResult(i, batch) for i, batch in enumerate(split_batches(paths, batch_size) or [[]])]
+        limiter = RateLimiter(rate)
+        start = clock.monotonic()
+
+        def submit(batch: CacheBatchResult) -> Optional[Operation]:
+            limiter.acquire()  # retries are rate limited as well
+            return self.submit_cache_action(action, resource_id, batch.paths)
+
+        def track_batch(batch: CacheBatchResult) -> None:
+            name = f'{action.value} batch #{batch.index} of [{resource_id}]'
+            submitted = wait_for(
+                f'{name} submit',
+                lambda: submit(batch),
+                attempts=3,
+                is_success=lambda op: op is not None,
+                exceptions=TRANSIENT_REQUEST_ERRORS
+            )
+            if not (operation := submitted.value):
+                batch.error = f'not submitted: {submitted.error}' if submitted.error else 'not submitted'
+                return
+            batch.operation_id, batch.submitted = operation.id, clock.monotonic() - start
+
+            if not operation.done and not wait:
+                batch.pending = True
+                return
+            if not operation.done:
+                tracked = wait_for(
+                    f'{name} operation [{operation.id}]',
+                    lambda: self.get_operation(operation.id),
+                    max_delay=5,
+                    timeout=timeout,
+                    is_success=lambda op: op is not None and op.done,
+                    exceptions=TRANSIENT_REQUEST_ERRORS
+                )
+                if not tracked.success:
+                    batch.error = f'operation is not done in {timeout} seconds'
+                    return
+                operation = tracked.value
+
+            batch.done = clock.monotonic() - start
+            batch.error = operation.error.message if operation.error else None
+            batch.success = operation.error is None
+
+        def run_batch(batch: CacheBatchResult) -> None:
+            # failure of one batch request is its own error, not the whole report one
+            try:
+                track_batch(batch)
+            except requests.HTTPError as e:
+                batch.error = f'operation is not available: {e}'
+            except requests.RequestException as e:
+                batch.error = f'request failed: {e}'
+
+        logging.info(f'{action.value} of {len(paths)} path(s) of [{resource_id}] in {len(report.batches)} batch(es)...')
+        with ThreadPoolExecutor(max_workers=max(min(max_workers, len(report.batches)), 1)) as executor:
+            list(executor.map(run_batch, report.batches))
+        report.elapsed = clock.monotonic() - start
+        logging.info(f'...{len(report.succeeded)} of {len(report.batches)} batch(es) done, {len(report.pending)} pending, '
+                     f'in {report.elapsed:.2f}s')
+        return report
+
+    def purge(self, resource_id: str, paths: Iterable[str] = (), **kwargs: Any) -> CacheActionReport:
+        """ Purge cached paths of the resource (the whole cache if no paths given), see run_cache_action
+        """
+
+        return self.run_cache_action(CacheAction.PURGE, resource_id, paths, **kwargs)
+
+    def prefetch(self, resource_id: str, paths: Iterable[str], **kwargs: Any) -> CacheActionReport:
+        """ Load paths of the resource to the cache, see run_cache_action
+        """
+
+        if not (paths := list(paths)):
+            raise ValueError('No paths to prefetch')
+        return self.run_cache_action(CacheAction.PREFETCH, resource_id, paths, **kwargs)
+
     @staticmethod
     def make_cdn_resource_ssl_certificate_attribute(ssl_type: str = None) -> SSLCertificate:
         # TODO: make different types
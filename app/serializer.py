@@ -0,0 +1,116 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Set, Dict
+
+import orjson
+from pydantic import BaseModel
+
+
+_ATOMIC_TYPES = frozenset((str, int, float, bool, type(None)))
+
+
+def freeze(value: Any) -> Hashable:
+    """ Make hashable key from the content of (possibly nested) model value.
+    Hot path of fragments cache: atomic values are not passed to recursive calls
+    """
+
+    value_type = type(value)
+    if value_type in _ATOMIC_TYPES:
+        return value
+    if hasattr(value_type, '__pydantic_fields__'):
+        return value_type, *[v if type(v) in _ATOMIC_TYPES else freeze(v) for v in value.__dict__.values()]
+    if value_type is dict:
+        return tuple(sorted([(k, v if type(v) in _ATOMIC_TYPES else freeze(v)) for k, v in value.items()]))
+    if value_type in (list, tuple, set):
+        return tuple([v if type(v) in _ATOMIC_TYPES else freeze(v) for v in value])
+    return value
+
+
+class PayloadSerializer:
+    """ Serializing items to JSON request bodies with already encoded option subtrees taken from cache.
+    The same template pushed to hundreds of resources is encoded only once.
+    """
+
+    def __init__(self, max_cached_fragments: int = 4096):
+        self.max_cached_fragments = max_cached_fragments
+        self.hits = 0
+        self.misses = 0
+        self._fragments: OrderedDict[Hashable, bytes] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get_fragment(self, key: Hashable) -> Optional[bytes]:
+        with self._lock:
+            if (fragment := self._fragments.get(key)) is not None:
+                self._fragments.move_to_end(key)
+                self.hits += 1
+            return fragment
+
+    def _put_fragment(self, key: Hashable, fragment: bytes) -> None:
+        with self._lock:
+            self.misses += 1
+            self._fragments[key] = fragment
+            if len(self._fragments) > self.max_cached_fragments:
+                self._fragments.popitem(last=False)
+
+    def encode_model(self, model: BaseModel, exclude_none: bool = True) -> bytes:
+        """ Return JSON (by alias) of the model, encoding it only if the same content was not encoded before
+        """
+
+        key = (exclude_none, freeze(model))
+        if (fragment := self._get_fragment(key)) is None:
+            fragment = orjson.dumps(model.model_dump(exclude_none=exclude_none, by_alias=True))
+            self._put_fragment(key, fragment)
+        return fragment
+
+    def encode_options(self, options: BaseModel, exclude_none: bool = True) -> bytes:
+        """ Return JSON of the options assembled from cached fragments of every single option
+        """
+
+        key = ('options', exclude_none, freeze(options))
+        if (fragment := self._get_fragment(key)) is not None:
+            return fragment
+
+        parts = []
+        for name, field_info in type(options).model_fields.items():
+            value = getattr(options, name)
+            if value is None and exclude_none:
+                continue
+            encoded_value = self.encode_model(value, exclude_none) if isinstance(value, BaseModel) else orjson.dumps(value)
+            parts.append(orjson.dumps(field_info.alias or name) + b':' + encoded_value)
+
+        fragment = b'{' + b','.join(parts) + b'}'
+        self._put_fragment(key, fragment)
+        return fragment
+
+    def dumps_item(
+            self,
+            item: BaseModel,
+            exclude: Optional[Set[str]] = None,
+            exclude_none: bool = True,
+            update: Optional[Dict[str, Any]] = None
+    ) -> bytes:
+        """ Return JSON request body of the item (by alias) with options got from fragments cache.
+        update overrides (aliased) top-level keys of the body.
+        """
+
+        exclude = set(exclude or ())
+        item_dict = item.model_dump(exclude=exclude | {'options'}, exclude_none=exclude_none, by_alias=True)
+        if update:
+            item_dict.update(update)
+        body = orjson.dumps(item_dict)
+
+        options = getattr(item, 'options', None)
+        if 'options' in exclude or 'options' not in type(item).model_fields or (options is None and exclude_none):
+            return body
+
+        options_fragment = self.encode_options(options, exclude_none) if options is not None else b'null'
+        separator = b',' if item_dict else b''
+        return body[:-1] + separator + b'"options":' + options_fragment + b'}'
+
+    def clear(self) -> None:
+        with self._lock:
+            self._fragments.clear()
+            self.hits = self.misses = 0
+
+
+payload_serializer = PayloadSerializer()
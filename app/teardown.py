@@ -0,0 +1,105 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, List, Optional, Set, Iterable
+
+from app.apiprocessor import APIProcessor
+
+
+class TeardownScheduler:
+    """ Deleting cdn resources and origin groups in parallel with respect to their dependencies:
+    resources of an origin group are deleted concurrently, the group itself is deleted as soon as the last resource
+    using it is gone, independent origin groups are torn down at the same time
+    """
+
+    def __init__(
+            self,
+            resources_processor: APIProcessor,
+            origin_groups_processor: APIProcessor,
+            max_workers: int = 8
+    ):
+        self.resources_processor = resources_processor
+        self.origin_groups_processor = origin_groups_processor
+        self.max_workers = max_workers
+
+    def build_dependency_graph(self) -> Optional[Dict[Optional[str], Set[str]]]:
+        """ Return origin group id -> ids of all resources using it, built from API listings.
+        Resources without origin group are put under None key.
+        """
+
+        if (resources := self.resources_processor.get_items_list()) is None:
+            logging.error('error while listing cdn resources')
+            return None
+        if (origin_groups := self.origin_groups_processor.get_items_list()) is None:
+            logging.error('error while listing origin groups')
+            return None
+
+        graph = {str(origin_group['id']): set() for origin_group in origin_groups}
+        for resource in resources:
+            origin_group_id = resource.get('originGroupId')
+            graph.setdefault(str(origin_group_id) if origin_group_id else None, set()).add(resource['id'])
+        logging.debug(f'dependency graph: {graph}')
+        return graph
+
+    def teardown(
+            self,
+            resources_ids: Optional[Iterable[str]] = None,
+            origin_groups_ids: Optional[Iterable[str]] = None
+    ) -> bool:
+        """ Delete given resources and origin groups (all items of the folder if not given).
+        Origin group still used by resources which are not to be deleted is kept.
+        """
+
+        if (graph := self.build_dependency_graph()) is None:
+            return False
+
+        all_resources_ids = set().union(*graph.values())
+        resources_to_delete = all_resources_ids if resources_ids is None else set(resources_ids) & all_resources_ids
+        groups_to_delete = (
+            {group_id for group_id in graph if group_id is not None}
+            if origin_groups_ids is None else {str(group_id) for group_id in origin_groups_ids}
+        )
+
+        logging.info(f'Tearing down [{len(resources_to_delete)}] cdn resources '
+                     f'and [{len(groups_to_delete)}] origin groups...')
+
+        with ThreadPoolExecutor(self.max_workers) as resources_pool, ThreadPoolExecutor(self.max_workers) as groups_pool:
+            futures = []
+            for group_id, dependents in graph.items():
+                group_resources = dependents & resources_to_delete
+                if group_id in groups_to_delete:
+                    futures.append(groups_pool.submit(
+                        self._teardown_origin_group, group_id, group_resources, dependents - group_resources, resources_pool
+                    ))
+                else:
+                    futures.extend(self._submit_resources_deletion(group_resources, resources_pool))
+
+            # origin groups not found at listing could be already deleted or be not listed yet
+            for group_id in groups_to_delete - set(graph):
+                futures.append(groups_pool.submit(self.origin_groups_processor.delete_item_by_id, group_id))
+
+            res = all([future.result() for future in futures])
+
+        logging.info('...OK' if res else '...FAIL')
+        return res
+
+    def _submit_resources_deletion(self, resources_ids: Iterable[str], pool: ThreadPoolExecutor) -> List[Future]:
+        return [pool.submit(self.resources_processor.delete_item_by_id, resource_id) for resource_id in resources_ids]
+
+    def _teardown_origin_group(
+            self,
+            origin_group_id: str,
+            resources_ids: Set[str],
+            kept_resources_ids: Set[str],
+            resources_pool: ThreadPoolExecutor
+    ) -> bool:
+
+        futures = self._submit_resources_deletion(resources_ids, resources_pool)
+        if not all([future.result() for future in futures]):
+            logging.error(f'origin group [{origin_group_id}] is kept: not all of its resources were deleted')
+            return False
+
+        if kept_resources_ids:
+            logging.error(f'origin group [{origin_group_id}] is kept: used by resources {sorted(kept_resources_ids)}')
+            return False
+
+        return bool(self.origin_groups_processor.delete_item_by_id(origin_group_id))
@@ -1,33 +1,42 @@
 import json
 import logging
+import platform
 import subprocess
-import time
 import uuid
 from functools import wraps
 from typing import Callable, Any, Dict, Optional, Generator
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.poolmanager import PoolManager
+from app.waiter import wait_for
 
+# ping attempts count option differs on Windows, platform is detected once
+PING_ATTEMPTS_PARAM = '-n' if platform.system() == 'Windows' else '-c'
+
+# retries start fast, pauses grow up to the configured ones
+FIRST_RETRY_DELAY = 0.25
 
 # need for requesting API several times with pause as API methods may be completed not instantly
 def repeat_and_sleep(times_to_repeat: int = 3, sleep_duration: int = 1):
+    """ Repeat until func returns not None, pauses grow from short ones up to sleep_duration.
+    Waiting is not given up before times_to_repeat - 1 pauses of sleep_duration, as with fixed pauses
+    """
+
     def decorator(func: Callable):
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any):
-            logging.info(f'Processing function [{func}] for [{times_to_repeat}] '
-                         f'times with [{sleep_duration}] second(s) sleep...')
-            for i in range(times_to_repeat):
-                logging.info(f'Attempt #{i+1}...')
-                res = func(*args, **kwargs)
-                if res is not None:
-                    return res
-                logging.info(f'...failed. Sleeping for {sleep_duration} second(s)...')
-                time.sleep(sleep_duration)
-            else:
+            logging.info(f'Processing function [{func}] for up to [{times_to_repeat}] times...')
+            result = wait_for(
+                func.__qualname__,
+                lambda: func(*args, **kwargs),
+                initial_delay=min(FIRST_RETRY_DELAY, sleep_duration),
+                max_delay=sleep_duration,
+                attempts=times_to_repeat,
+                min_elapsed=(times_to_repeat - 1) * sleep_duration,
+                is_success=lambda res: res is not None
+            )
+            if not result.success:
                 logging.error(f'failed to successfully complete func [{func}]')
                 return None
+            return result.value
         return wrapper
     return decorator
 
@@ -37,44 +46,14 @@ def make_random_8_symbols() -> str:
 def make_query_string_from_args(args_dict: Dict[str, str]) -> str:
     return str.join('&', [f'{arg}={val}' for arg, val in args_dict.items()])
 
-def ping(host: str, attempts: int = 1) -> Optional[subprocess.CompletedProcess]:
-    param = '-n' if subprocess.run(['uname'], capture_output=True, text=True).stdout.strip() == 'Windows' else '-c'
-    command = ['ping', param, str(attempts), host]
+def ping(host: str, attempts: int = 1, timeout: Optional[float] = None) -> Optional[subprocess.CompletedProcess]:
+    command = ['ping', PING_ATTEMPTS_PARAM, str(attempts), host]
     try:
-        res = subprocess.run(command, capture_output=True, text=True, check=True)
+        res = subprocess.run(command, capture_output=True, text=True, check=True, timeout=timeout)
         return res
-    except subprocess.CalledProcessError as e:
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
         return None
 
-def http_get_request_through_ip_address(url: str, ip_address: str) -> Optional[requests.Response]:
-    class HostHeaderHTTPAdapter(HTTPAdapter):
-        def __init__(self, ip_address: str, *args, **kwargs):
-            self.dest_ip = ip_address
-            super().__init__(*args, **kwargs)
-
-        def get_connection(self, url, proxies=None):
-            # Подменяем хост в URL на целевой IP адрес
-            conn = super().get_connection_with_tls_context(url.replace(self.dest_ip, ''), proxies)
-            conn.poolmanager = PoolManager(10, **self.poolmanager.connection_pool_kw)
-            return conn
-
-        def send(self, request, *args, **kwargs):
-            original_host = request.url.split('/')[2]
-            request.url = request.url.replace(original_host, self.dest_ip)
-            if 'Host' not in request.headers:
-                request.headers['Host'] = original_host
-            return super().send(request, *args, **kwargs)
-
-    url = f'http://{url}'
-    session = requests.Session()
-    session.mount('http://', HostHeaderHTTPAdapter(ip_address))
-
-    try:
-        return session.get(url)
-    except requests.RequestException as e:
-        #TODO: implement exception processing
-        ...
-
 def increment() -> Generator[int, None, None]:
     i = 0
     while True:
@@ -0,0 +1,163 @@
+import logging
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Iterable, List, Optional, Tuple, Type
+
+from app import clock
+
+WaitResult = namedtuple('WaitResult', 'name, success, value, attempts, time_to_success, elapsed, error')
+
+# called with result of every wait, e.g. the profiler collects waits of the running test
+_wait_listeners: List[Callable[[WaitResult], None]] = []
+_wait_listeners_lock = threading.Lock()
+
+
+def add_wait_listener(listener: Callable[[WaitResult], None]) -> None:
+    with _wait_listeners_lock:
+        _wait_listeners.append(listener)
+
+
+def remove_wait_listener(listener: Callable[[WaitResult], None]) -> None:
+    with _wait_listeners_lock:
+        if listener in _wait_listeners:
+            _wait_listeners.remove(listener)
+
+
+def record_wait(result: WaitResult) -> None:
+    with _wait_listeners_lock:
+        listeners = list(_wait_listeners)
+    for listener in listeners:
+        listener(result)
+    if result.success:
+        logging.info(f'[{result.name}] succeeded in {result.time_to_success:.2f} second(s) '
+                     f'after {result.attempts} attempt(s)')
+    else:
+        logging.info(f'[{result.name}] failed after {result.attempts} attempt(s) in {result.elapsed:.2f} second(s), '
+                     f'last error: {result.error}')
+
+
+class Condition:
+    """ Condition to wait for: check is called until its result is a success for `hold` checks in a row.
+    Waiting stops once timeout, attempts or failures limit is reached, any of them may be unlimited (None).
+    Attempts and failures limits do not stop waiting before min_elapsed seconds, so retries with growing pauses
+    keep the window of the same number of fixed pauses. Exceptions of the given types are failed checks,
+    others are raised.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            check: Callable[[], Any],
+            timeout: Optional[float] = None,
+            attempts: Optional[int] = None,
+            max_failures: Optional[int] = None,
+            min_elapsed: float = 0,
+            hold: int = 1,
+            hold_interval: float = 0,
+            is_success: Callable[[Any], bool] = bool,
+            exceptions: Tuple[Type[BaseException], ...] = ()
+    ):
+        self.name = name
+        self.check = check
+        self.timeout = timeout
+        self.attempts = attempts
+        self.max_failures = max_failures
+        self.min_elapsed = min_elapsed
+        self.hold = hold
+        self.hold_interval = hold_interval  # between successful checks while holding
+        self.is_success = is_success
+        self.exceptions = exceptions
+
+
+class ConditionWaiter:
+    """ Waiting for conditions: after a failed check delay starts short and grows exponentially up to max_delay,
+    so conditions getting true soon are not slept over. Many conditions are waited at once, every one in its own
+    thread with its own deadline. Every wait gets its time-to-success recorded.
+    """
+
+    def __init__(self, initial_delay: float = 0.25, max_delay: float = 15, backoff: float = 2, max_workers: int = 16):
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.backoff = backoff
+        self.max_workers = max_workers
+
+    def wait(self, condition: Condition) -> WaitResult:
+        start = clock.monotonic()
+        deadline = start + condition.timeout if condition.timeout is not None else None
+        delay = min(self.initial_delay, self.max_delay)
+        attempts, failures, streak = 0, 0, 0
+        streak_started = start
+        value, error = None, None
+
+        while True:
+            attempts += 1
+            try:
+                value, error = condition.check(), None
+                success = condition.is_success(value)
+            except condition.exceptions as e:
+                value, error, success = None, e, False
+            now = clock.monotonic()
+
+            if success:
+                if not streak:
+                    streak_started = now
+                streak += 1
+                if streak >= condition.hold:
+                    result = WaitResult(condition.name, True, value, attempts, streak_started - start, now - start, None)
+                    break
+                pause = condition.hold_interval
+            else:
+                streak = 0
+                failures += 1
+                pause, delay = delay, min(delay * self.backoff, self.max_delay)
+
+            if deadline is not None:
+                pause = min(pause, deadline - now)
+            limit_reached = (
+                    (condition.attempts is not None and attempts >= condition.attempts)
+                    or (condition.max_failures is not None and failures >= condition.max_failures)
+            )
+            if (limit_reached and now - start >= condition.min_elapsed) or (deadline is not None and pause <= 0):
+                result = WaitResult(condition.name, False, value, attempts, None, now - start, error)
+                break
+
+            logging.debug(f'[{condition.name}] attempt #{attempts}: {"holding" if success else "failed"}, '
+                          f'next check in {pause:.2f} second(s)...')
+            clock.sleep(pause)
+
+        record_wait(result)
+        return result
+
+    def wait_all(self, conditions: Iterable[Condition]) -> List[WaitResult]:
+        """ Results of all conditions in their order, single condition is waited in the calling thread
+        """
+
+        conditions = list(conditions)
+        if len(conditions) <= 1:
+            return [self.wait(condition) for condition in conditions]
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(conditions))) as executor:
+            return list(executor.map(self.wait, conditions))
+
+
+def wait_for(
+        name: str,
+        check: Callable[[], Any],
+        initial_delay: float = 0.25,
+        max_delay: float = 15,
+        backoff: float = 2,
+        **kwargs: Any
+) -> WaitResult:
+    waiter = ConditionWaiter(initial_delay=initial_delay, max_delay=max_delay, backoff=backoff)
+    return waiter.wait(Condition(name, check, **kwargs))
+
+
+def wait_for_all(
+        conditions: Iterable[Condition],
+        initial_delay: float = 0.25,
+        max_delay: float = 15,
+        backoff: float = 2,
+        max_workers: int = 16
+) -> List[WaitResult]:
+    waiter = ConditionWaiter(initial_delay=initial_delay, max_delay=max_delay, backoff=backoff, max_workers=max_workers)
+    return waiter.wait_all(conditions)
@@ -0,0 +1,69 @@
+""" Benchmark of request bodies serialization for bulk creation of cdn resources from one template.
+
+Usage: python -m benchmark.bulk_create_serialization [resources_count]
+"""
+
+import json
+import sys
+import time
+
+from app.model import ItemType, APIFolder
+from app.resource import ResourcesAPIProcessor
+from app.serializer import payload_serializer
+
+RESOURCES_COUNT = 1000
+FOLDER_ID = 'benchmark-folder'
+ORIGIN_GROUP_ID = '1234567890'
+
+
+def make_resources(processor: ResourcesAPIProcessor, n: int) -> list:
+    template = processor.make_default_cdn_resource(folder_id=FOLDER_ID, cname='', origin_group_id=ORIGIN_GROUP_ID)
+    return [template.model_copy(update={'cname': f'bench-{i}.example.com'}) for i in range(n)]
+
+
+def serialize_as_before(processor: ResourcesAPIProcessor, resources: list) -> int:
+    # model_dump -> json.dumps by requests -> json.dumps for debug log of create_item
+    size = 0
+    for resource in resources:
+        payload = processor.make_dict_from_item(resource)
+        payload['origin'] = {'originGroupId': payload.pop('originGroupId')}
+        size += len(json.dumps(payload).encode())
+        json.dumps(payload)
+    return size
+
+
+def serialize_with_fragments_cache(processor: ResourcesAPIProcessor, resources: list) -> int:
+    size = 0
+    for resource in resources:
+        size += len(processor.make_payload_from_item(resource))
+    return size
+
+
+def measure(func, *args) -> float:
+    start_time = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start_time
+
+
+def main(n: int = RESOURCES_COUNT) -> None:
+    processor = ResourcesAPIProcessor(
+        item_type=ItemType.CDN_RESOURCE,
+        api_endpoint=APIFolder.CDN_RESOURCE,
+        api_token='',
+        api_url='',
+        folder_id=FOLDER_ID
+    )
+    resources = make_resources(processor, n)
+
+    payload_serializer.clear()
+    before = measure(serialize_as_before, processor, resources)
+    after = measure(serialize_with_fragments_cache, processor, resources)
+
+    print(f'resources: {n}')
+    print(f'model_dump + json.dumps: {before * 1000:.1f} ms ({before / n * 1e6:.1f} us per resource)')
+    print(f'fragments cache + orjson: {after * 1000:.1f} ms ({after / n * 1e6:.1f} us per resource)')
+    print(f'speedup: {before / after:.1f}x, cache hits/misses: {payload_serializer.hits}/{payload_serializer.misses}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else RESOURCES_COUNT)
@@ -1,21 +1,198 @@
+import argparse
+import json
 import logging
 import os
-import random
+from typing import TYPE_CHECKING
 
-import yaml
+# heavy modules (pydantic models, requests, yaml, test helpers) are imported by commands using them,
+# so short runs (--help, cron probes) do not pay for all of them
+if TYPE_CHECKING:
+    from test.model import Config
 
 
-from app.authorization import Authorization
+def read_config(config_path: str) -> 'Config':
+    import yaml
+    from test.model import Config
 
-#TODO: get logging level from cli args
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(funcName)s - %(message)s')
-logging.info('Starting service')
+    with open(config_path) as fp:
+        return Config.model_validate(yaml.safe_load(fp))
 
-from test.utils import get_connection_error_type
+
+def write_report(report: dict, output: str = None) -> None:
+    result = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as fp:
+            fp.write(result)
+    else:
+        print(result)
+
+
+def load(args: argparse.Namespace) -> None:
+    """ Open-loop load of configured cdn resources cnames, pinned to edge cache hosts if asked
+    """
+
+    from test.loadgen import LoadTarget, OpenLoopLoadGenerator
+
+    config = read_config(args.config)
+
+    edges_ips = [None]
+    if args.pin_edges and config.resources.edge_cache_hosts:
+        edges_ips = [edge_host.ip_address for edge_host in config.resources.edge_cache_hosts]
+    targets = [LoadTarget(resource.cname, edge_ip)
+               for resource in config.resources.cdn_resources for edge_ip in edges_ips]
+
+    report = OpenLoopLoadGenerator(
+        targets,
+        rate=args.rate,
+        duration=args.duration,
+        protocol=args.protocol or config.api_test_parameters.default_protocol.value,
+        max_workers=args.workers,
+        timeout=args.timeout
+    ).run()
+
+    write_report(report, args.output)
+
+
+def propagation(args: argparse.Namespace) -> None:
+    """ Time for cdn resource update to get to every edge: configured edge cache hosts
+    or edges resource cname resolves to
+    """
+
+    from app.authorization import Authorization
+    from app.model import ItemType, APIFolder
+    from app.resolver import dns_cache
+    from app.resource import ResourcesAPIProcessor
+    from test.propagation import PropagationBenchmark
+
+    config = read_config(args.config)
+    resource_id = args.resource_id or next(r.id for r in config.resources.cdn_resources if r.id)
+
+    token = Authorization(oauth=os.environ['OAUTH'], iam_token_url=config.yandex_cloud_api.iam_token_url).get_token()
+    resources_processor = ResourcesAPIProcessor(
+        item_type=ItemType.CDN_RESOURCE,
+        api_url=config.yandex_cloud_api.api_url,
+        api_endpoint=APIFolder.CDN_RESOURCE,
+        folder_id=config.resources.folder_id,
+        api_token=token
+    )
+    if not (resource := resources_processor.get_resource_by_id(resource_id)):
+        raise SystemExit(f'CDN resource [{resource_id}] is not found')
+
+    if config.resources.edge_cache_hosts:
+        edges_ips = [edge_host.ip_address for edge_host in config.resources.edge_cache_hosts]
+    else:
+        edges_ips = dns_cache.resolve(resource.cname)
+    if not edges_ips:
+        raise SystemExit(f'No edges to probe: no edge cache hosts in config and [{resource.cname}] is not resolved')
+
+    report = PropagationBenchmark(
+        resources_processor,
+        resource,
+        edges_ips,
+        protocol=args.protocol or config.api_test_parameters.default_protocol.value,
+        timeout=args.timeout,
+        probe_interval=args.probe_interval,
+        delay_between_trials=args.trial_interval,
+        verify=not args.insecure
+    ).run(trials=args.trials)
+
+    write_report(report, args.output)
+
+
+def warmup(args: argparse.Namespace) -> None:
+    """ Request hot objects of cdn resources through every edge cache host until they are cached,
+    report warm coverage and time to warm per edge
+    """
+
+    from app.resolver import dns_cache
+    from test.warmup import EdgeWarmup, WarmupTarget
+
+    config = read_config(args.config)
+
+    if args.urls:
+        with open(args.urls) as fp:
+            paths = json.load(fp)
+    else:
+        paths = {resource.cname: resource.warmup_paths for resource in config.resources.cdn_resources}
+    targets = [WarmupTarget(cname, path if path.startswith('/') else f'/{path}')
+               for cname, cname_paths in paths.items() for path in cname_paths]
+    if not targets:
+        raise SystemExit('No urls to warm up: set warmup_paths of cdn resources or --urls')
+
+    if config.resources.edge_cache_hosts:
+        edges_ips = [edge_host.ip_address for edge_host in config.resources.edge_cache_hosts]
+    else:
+        edges_ips = sorted({ip for cname in paths for ip in dns_cache.resolve(cname)})
+
+    report = EdgeWarmup(
+        targets,
+        edges_ips,
+        protocol=args.protocol or config.api_test_parameters.default_protocol.value,
+        interval=args.interval,
+        timeout=args.timeout,
+        max_attempts=args.attempts,
+        rate=args.rate,
+        max_workers=args.workers,
+        max_in_flight_per_url=args.per_url,
+        verify=not args.insecure
+    ).run()
+
+    write_report(report, args.output)
+    if args.min_coverage is not None and report['coverage'] < args.min_coverage:
+        raise SystemExit(f'Warm coverage {report["coverage"]} is below {args.min_coverage}')
+
+
+def make_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Yandex Cloud CDN API processor')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    load_parser = commands.add_parser('load', help='load cdn resources with fixed requests rate')
+    load_parser.add_argument('--config', default='test/config.yaml', help='tests config with resources to load')
+    load_parser.add_argument('--rate', type=float, default=50, help='requests per second')
+    load_parser.add_argument('--duration', type=float, default=30, help='seconds')
+    load_parser.add_argument('--protocol', choices=('http', 'https'), help='default protocol of config if not set')
+    load_parser.add_argument('--pin-edges', action='store_true', help='send requests to every edge cache host of config')
+    load_parser.add_argument('--workers', type=int, default=64, help='max requests in flight')
+    load_parser.add_argument('--timeout', type=float, default=5, help='request timeout, seconds')
+    load_parser.add_argument('--output', help='json report file, stdout if not set')
+    load_parser.set_defaults(func=load)
+
+    propagation_parser = commands.add_parser('propagation', help='measure time for resource update to reach edges')
+    propagation_parser.add_argument('--config', default='test/config.yaml', help='tests config with resources')
+    propagation_parser.add_argument('--resource-id', help='first cdn resource of config with id if not set')
+    propagation_parser.add_argument('--trials', type=int, default=5, help='updates to measure')
+    propagation_parser.add_argument('--protocol', choices=('http', 'https'), help='default protocol of config if not set')
+    propagation_parser.add_argument('--timeout', type=float, default=600, help='max seconds to wait for one update')
+    propagation_parser.add_argument('--probe-interval', type=float, default=0.5, help='seconds between edge probes')
+    propagation_parser.add_argument('--trial-interval', type=float, default=10, help='seconds between updates')
+    propagation_parser.add_argument('--insecure', action='store_true', help='do not verify tls certificates of edges')
+    propagation_parser.add_argument('--output', help='json report file, stdout if not set')
+    propagation_parser.set_defaults(func=propagation)
+
+    warmup_parser = commands.add_parser('warmup', help='warm up edge caches and check hot objects are cached')
+    warmup_parser.add_argument('--config', default='test/config.yaml', help='tests config with resources and edges')
+    warmup_parser.add_argument('--urls', help='json {cname: [paths]} to warm up, warmup_paths of config if not set')
+    warmup_parser.add_argument('--protocol', choices=('http', 'https'), help='default protocol of config if not set')
+    warmup_parser.add_argument('--interval', type=float, default=1, help='seconds between requests of url to edge')
+    warmup_parser.add_argument('--timeout', type=float, default=60, help='max seconds to warm url on one edge')
+    warmup_parser.add_argument('--attempts', type=int, default=10, help='max requests of url to one edge')
+    warmup_parser.add_argument('--rate', type=float, default=20, help='max requests per second to all edges')
+    warmup_parser.add_argument('--workers', type=int, default=16, help='max requests in flight')
+    warmup_parser.add_argument('--per-url', type=int, default=2, help='max requests of one url in flight')
+    warmup_parser.add_argument('--insecure', action='store_true', help='do not verify tls certificates of edges')
+    warmup_parser.add_argument('--min-coverage', type=float, help='exit with error if warm coverage is lower')
+    warmup_parser.add_argument('--output', help='json report file, stdout if not set')
+    warmup_parser.set_defaults(func=warmup)
+
+    return parser
 
 
 def main():
-    ...
+    args = make_parser().parse_args()
+    #TODO: get logging level from cli args
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(funcName)s - %(message)s')
+    logging.info('Starting service')
+    args.func(args)
     # OAUTH = os.environ['OAUTH']
     # authorization = Authorization(oauth=OAUTH, iam_token_url=IAM_TOKEN_URL)
     # token = authorization.get_token()
@@ -53,8 +230,7 @@ def main():
     #
 
 if __name__ == '__main__':
-    # main()
-    ...
+    main()
     # OAUTH = os.environ['OAUTH']
     # authorization = Authorization(oauth=OAUTH, iam_token_url='https://iam.api.cloud.yandex.net/iam/v1/tokens')
     # token = authorization.get_token()
@@ -67,55 +243,3 @@ if __name__ == '__main__':
     #     requests.get('http://edge-qa-1.marmotabobak.ru/')
     # except requests.exceptions.ConnectionError as e:
     #     print(get_connection_error_type(e.__context__))
-
-from typing import Callable, Any
-from functools import wraps
-import time
-import random
-
-def repeat_until_success_or_timeout(attempts: int = 10, attempt_delay: int = 0):
-    def decorator(func: Callable):
-        @wraps(func)
-        def wrapper(*args: Any, **kwargs: Any) -> Any:
-            for i in range(attempts):
-                logging.debug(f'Attempt #{i + 1} of {attempts}...')
-                if func(*args, **kwargs):
-                    return True
-                if i < attempts - 1:
-                    time.sleep(attempt_delay)
-            print('!!!ERRR')
-        return wrapper
-    return decorator
-
-def repeat_for_period_ot_time_or_until_fail(
-        attempts_needed_to_succeed: int = 3,
-        success_attempt_delay: int = 0,
-        tries_if_fail: int = 2):
-    def decorator(func: Callable):
-        @wraps(func)
-        def wrapper(*args: Any, **kwargs: Any) -> bool:
-            for _ in range(tries_if_fail):
-                res = None
-                for i in range(attempts_needed_to_succeed):
-                    logging.debug(f'Attempt #{i + 1} of {attempts_needed_to_succeed}...')
-                    res = func(*args, **kwargs)
-                    if not res:
-                        break
-                    logging.debug(f'...OK. Sleeping for {success_attempt_delay} seconds...')
-                    if i < attempts_needed_to_succeed - 1:
-                        time.sleep(success_attempt_delay)
-                if not res:
-                    continue
-                else:
-                    return True
-            return False
-        return wrapper
-    return decorator
-
-@repeat_for_period_ot_time_or_until_fail()
-def get_numb():
-    n = random.randint(0, 1)
-    print(n)
-    return n == 1
-
-print(get_numb())
\ No newline at end of file
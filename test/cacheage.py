@@ -0,0 +1,117 @@
+from typing import Dict, List, Optional, Tuple
+
+from test.model import EdgeResponseHeaders
+from test.samplestore import CacheStatus
+
+# Date and Age headers have one second resolution
+HEADERS_TIME_RESOLUTION = 1.0
+
+
+class CacheObjectEstimator:
+    """ Estimating lifetime of the object cached by edge from Date and Age response headers: object was stored at
+    (Date - Age) by edge clock, so every store (revalidation) is seen even if its MISS/REVALIDATED response was got
+    by another client, and the next expiry is predicted without hammering edge through whole TTL.
+    Lifetime is the shortest one measured between stores, otherwise the one given by Cache-Control/Expires,
+    the configured ttl is only the last resort.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.stored_at: Optional[float] = None  # store time of current object by edge clock
+        self.stored: List[float] = []  # store times of all seen objects
+        self.header_lifetime: Optional[float] = None  # freshness lifetime by Cache-Control/Expires
+        self.last_date: Optional[float] = None
+        self.clock_offset: Optional[float] = None  # local time minus edge time (network latency included)
+
+    def edge_time(self, headers: EdgeResponseHeaders, received: float) -> float:
+        """ Time of the response by edge clock: its Date, otherwise receive time shifted by known clock offset.
+        Receive time is returned as is only while no response of the pair had Date
+        """
+
+        if (date_timestamp := headers.date_timestamp) is not None:
+            self.last_date = date_timestamp
+            offset = received - date_timestamp
+            self.clock_offset = offset if self.clock_offset is None else min(self.clock_offset, offset)
+            return date_timestamp
+        return received if self.clock_offset is None else received - self.clock_offset
+
+    def add(self, headers: EdgeResponseHeaders, received: float) -> Optional[float]:
+        """ Returns store time of the object if it is new one, None if object is the same or store time is unknown:
+        no Date, or no Age in the response which is not MISS/REVALIDATED (those are stored at their Date)
+        """
+
+        edge_time = self.edge_time(headers, received)
+        status = CacheStatus.from_header(headers.cache_status)
+        if (stored_at := headers.stored_at) is None:
+            if headers.date is None or status not in (CacheStatus.MISS, CacheStatus.REVALIDATED):
+                return None
+            stored_at = edge_time  # just fetched from origin
+
+        if (header_lifetime := headers.freshness_lifetime) is not None:
+            self.header_lifetime = header_lifetime
+
+        is_new = (
+            self.stored_at is None
+            or status in (CacheStatus.MISS, CacheStatus.REVALIDATED)
+            or stored_at > self.stored_at + HEADERS_TIME_RESOLUTION
+        )
+        if not is_new:
+            return None
+
+        self.stored_at = stored_at
+        self.stored.append(stored_at)
+        return stored_at
+
+    @property
+    def age(self) -> Optional[float]:
+        """ Age of current object at the moment of the last response
+        """
+
+        if self.stored_at is None:
+            return None
+        return self.last_date - self.stored_at
+
+    @property
+    def lifetimes(self) -> List[float]:
+        return [later - earlier for earlier, later in zip(self.stored, self.stored[1:])]
+
+    @property
+    def lifetime(self) -> float:
+        """ Expected lifetime of cached objects
+        """
+
+        if lifetimes := self.lifetimes:
+            return min(lifetimes)
+        return self.ttl if self.header_lifetime is None else self.header_lifetime
+
+    def predicted_expiry(self) -> Optional[float]:
+        """ Local time current object is expected to expire at
+        """
+
+        if self.stored_at is None:
+            return None
+        return self.stored_at + self.lifetime + self.clock_offset
+
+    def __repr__(self) -> str:
+        return (f'CacheObjectEstimator(stored={len(self.stored)}, age={self.age}, lifetimes={self.lifetimes}, '
+                f'header_lifetime={self.header_lifetime})')
+
+
+class CacheObjectEstimators:
+    """ Estimators of all (resource, host) pairs created on their first sample
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._estimators: Dict[Tuple[str, str], CacheObjectEstimator] = {}
+
+    def get(self, resource_id: str, host: str) -> CacheObjectEstimator:
+        if (estimator := self._estimators.get((resource_id, host))) is None:
+            estimator = self._estimators[resource_id, host] = CacheObjectEstimator(self.ttl)
+        return estimator
+
+    def find(self, resource_id: str, host: str) -> Optional[CacheObjectEstimator]:
+        return self._estimators.get((resource_id, host))
+
+    def __repr__(self) -> str:
+        return f'CacheObjectEstimators({self._estimators})'
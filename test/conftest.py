@@ -0,0 +1,118 @@
+import os
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import allure
+import pytest
+
+from app import cassette
+from test.logger import logger
+from test.pool import PoolLeases
+from test.profiler import TimeProfile, profiler
+from test.sharding import Partition, SharedSessionState, workers_count
+
+
+cassette_key = pytest.StashKey[Optional[cassette.Cassette]]()
+profile_key = pytest.StashKey[TimeProfile]()
+
+
+def is_xdist_worker(config: pytest.Config) -> bool:
+    return hasattr(config, 'workerinput')
+
+
+def is_xdist_controller(config: pytest.Config) -> bool:
+    return (
+            not is_xdist_worker(config)
+            and config.pluginmanager.hasplugin('xdist')
+            and bool(config.getoption('numprocesses'))
+    )
+
+
+def worker_cassette_path(path: str) -> Path:
+    """ Every xdist worker records its own cassette: run.jsonl.gz is run.gw0.jsonl.gz for worker gw0
+    """
+
+    path = Path(path)
+    if not (worker_id := os.environ.get('PYTEST_XDIST_WORKER')):
+        return path
+    head, _, tail = path.name.partition('.')
+    return path.with_name(f'{head}.{worker_id}.{tail}' if tail else f'{head}.{worker_id}')
+
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    group = parser.getgroup('cassette', 'record and replay of API and edges HTTP exchanges')
+    group.addoption('--record-cassette', metavar='PATH', help='Record HTTP exchanges of the run to the cassette')
+    group.addoption('--replay-cassette', metavar='PATH',
+                    help='Answer HTTP requests with exchanges recorded to the cassette, nothing is sent')
+    group.addoption('--replay-speed', type=float, default=1.0,
+                    help='Replayed run speed: 1 keeps original timing, 10 runs 10 times faster')
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    # controller picks the run id passed to xdist workers, so it finds their shared state afterwards
+    if is_xdist_controller(config):
+        if not config.getoption('testrunuid'):
+            config.option.testrunuid = uuid.uuid4().hex
+        os.environ['PYTEST_XDIST_TESTRUNUID'] = config.option.testrunuid
+
+    # xdist controller runs no tests, so it has no cassette
+    config.stash[cassette_key] = None
+    if not is_xdist_controller(config):
+        if path := config.getoption('replay_cassette'):
+            config.stash[cassette_key] = cassette.replay(worker_cassette_path(path), config.getoption('replay_speed'))
+        elif path := config.getoption('record_cassette'):
+            config.stash[cassette_key] = cassette.record(worker_cassette_path(path))
+        profiler.install()  # on top of cassette, so replayed time is profiled as well
+
+
+def pytest_unconfigure(config: pytest.Config) -> None:
+    profiler.uninstall()
+    if used_cassette := config.stash.get(cassette_key, None):
+        used_cassette.close()
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    # every xdist worker collects the same shards, so TTL checks of different resources run in parallel
+    if 'resources_shard' in metafunc.fixturenames:
+        shards = [Partition(index, workers_count()) for index in range(workers_count())]
+        metafunc.parametrize('resources_shard', shards, ids=str)
+
+
+# every test phase adds to the time profile of the test, class setup is a part of its first test setup
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_setup(item: pytest.Item):
+    item.stash[profile_key] = TimeProfile(item.nodeid)
+    with profiler.collect(item.stash[profile_key]):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_call(item: pytest.Item):
+    with profiler.collect(item.stash[profile_key]):
+        yield
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_teardown(item: pytest.Item):
+    with profiler.collect(profile := item.stash[profile_key]):
+        yield
+    logger.debug(f'{profile.name} time: { {k: round(v, 3) for k, v in profile.totals().items()} }')
+    allure.attach(profile.render(), name='Time breakdown', attachment_type=allure.attachment_type.TEXT)
+
+
+def pytest_sessionfinish(session: pytest.Session) -> None:
+    if is_xdist_worker(session.config):
+        return  # controller cleans up once all workers are finished
+
+    state = SharedSessionState.for_current_run()
+    if session.config.getoption('replay_cassette'):
+        state.remove()  # replayed resources and leases are not real ones
+        return
+    if (lease := state.read('pool_lease')) is not None:
+        PoolLeases(lease['state_path']).release(lease['owner'])  # pool resources are returned for the next runs
+    if state.read('new_resources') is not None:
+        from test.utils_for_test_class import UtilsForTestClass  # needs OAUTH env, so only when there is a cleanup
+        UtilsForTestClass.delete_shared_new_resources(state)
+    state.remove()
+
@@ -0,0 +1,94 @@
+import math
+from typing import Dict, Iterable, Optional
+
+PERCENTILES = (50.0, 90.0, 99.0, 99.9)
+
+
+class LatencyHistogram:
+    """ Log-bucketed latency histogram: bucket bounds grow by constant ratio, so relative error of any percentile
+    is bounded by (ratio - 1) whatever the range of values is. Buckets are sparse counters, histograms of different
+    workers, edges or runs are merged by adding counters.
+    """
+
+    def __init__(self, min_value: float = 1e-5, ratio: float = 1.04):
+        self.min_value = min_value  # seconds, smaller values go to the first bucket
+        self.ratio = ratio
+        self._log_ratio = math.log(ratio)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+
+    def _bucket(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        return int(math.log(value / self.min_value) / self._log_ratio) + 1
+
+    def _bucket_upper_bound(self, bucket: int) -> float:
+        return self.min_value * self.ratio ** bucket
+
+    def add(self, value: float) -> None:
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, other: 'LatencyHistogram') -> 'LatencyHistogram':
+        if (other.min_value, other.ratio) != (self.min_value, self.ratio):
+            raise ValueError('Histograms with different buckets can not be merged')
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.count:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        return self
+
+    @classmethod
+    def merged(cls, histograms: Iterable['LatencyHistogram']) -> 'LatencyHistogram':
+        result = None
+        for histogram in histograms:
+            if result is None:
+                result = cls(histogram.min_value, histogram.ratio)
+            result.merge(histogram)
+        return result or cls()
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """ Upper bound of the bucket holding the percentile, clamped by observed max
+        """
+
+        if not self.count:
+            return None
+        rank = math.ceil(percentile / 100 * self.count)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(self._bucket_upper_bound(bucket), self.max)
+        return self.max
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def to_dict(self, percentiles: Iterable[float] = PERCENTILES) -> dict:
+        """ Summary in milliseconds
+        """
+
+        def ms(value: Optional[float]) -> Optional[float]:
+            return None if value is None else round(value * 1000, 3)
+
+        return {
+            'count': self.count,
+            'min': ms(self.min),
+            'mean': ms(self.mean),
+            'max': ms(self.max),
+            **{f'p{p:g}': ms(self.percentile(p)) for p in percentiles},
+        }
+
+    def __repr__(self) -> str:
+        return f'LatencyHistogram({self.to_dict()})'
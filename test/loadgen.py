@@ -0,0 +1,166 @@
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.edgeclient import EdgeClientRegistry
+from test.histogram import LatencyHistogram
+from test.logger import logger
+from test.samplestore import CacheStatus
+from test.utils import get_connection_error_type
+
+LoadTarget = namedtuple('LoadTarget', 'cname, edge_ip')  # edge_ip is None to go through DNS
+
+
+class EdgeLoadStats:
+    """ Latency, cache statuses, response codes and errors of one edge
+    """
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.cache_statuses: Dict[str, int] = {}
+        self.status_codes: Dict[int, int] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add_response(self, latency: float, status_code: int, cache_status: Optional[str]) -> None:
+        self.latency.add(latency)
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        status = CacheStatus.from_header(cache_status).name
+        self.cache_statuses[status] = self.cache_statuses.get(status, 0) + 1
+
+    def add_error(self, error_type: str) -> None:
+        self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    @property
+    def hit_ratio(self) -> Optional[float]:
+        cached = sum(count for status, count in self.cache_statuses.items() if status != CacheStatus.OTHER.name)
+        return self.cache_statuses.get(CacheStatus.HIT.name, 0) / cached if cached else None
+
+    def merge(self, other: 'EdgeLoadStats') -> 'EdgeLoadStats':
+        self.latency.merge(other.latency)
+        for own, others in ((self.cache_statuses, other.cache_statuses),
+                            (self.status_codes, other.status_codes),
+                            (self.errors, other.errors)):
+            for key, count in others.items():
+                own[key] = own.get(key, 0) + count
+        return self
+
+    def to_dict(self) -> dict:
+        return {
+            'responses': self.latency.count,
+            'errors_count': sum(self.errors.values()),
+            'hit_ratio': None if self.hit_ratio is None else round(self.hit_ratio, 4),
+            'latency_ms': self.latency.to_dict(),
+            'cache_statuses': self.cache_statuses,
+            'status_codes': {str(code): count for code, count in sorted(self.status_codes.items())},
+            'errors': self.errors,
+        }
+
+
+class OpenLoopLoadGenerator:
+    """ Sending requests to targets at the fixed rate whatever the responses times are (open loop):
+    request i is due at start + i / rate and its latency is measured from that moment, so time spent waiting
+    for a free worker is counted and slow responses can not hide tail latency (no coordinated omission).
+    Targets are taken round robin.
+    """
+
+    def __init__(
+            self,
+            targets: List[LoadTarget],
+            rate: float,
+            duration: float,
+            protocol: str = 'http',
+            max_workers: int = 64,
+            timeout: float = 5
+    ):
+        if not targets:
+            raise ValueError('No targets to load')
+        self.targets = targets
+        self.rate = rate
+        self.duration = duration
+        self.protocol = protocol
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        self.stats: Dict[str, EdgeLoadStats] = {}
+        self.scheduled = 0
+        self.max_dispatch_lag = 0.0  # how late requests were handed to workers
+        self._lock = threading.Lock()
+        self._clients = EdgeClientRegistry(pool_maxsize=max_workers)
+        self._session = requests.Session()
+        self._session.mount(f'{protocol}://', HTTPAdapter(pool_maxsize=max_workers))
+
+    def _get(self, target: LoadTarget) -> requests.Response:
+        url = f'{self.protocol}://{target.cname}'
+        if target.edge_ip:
+            return self._clients.get(url, target.edge_ip, verify=False, timeout=self.timeout)
+        return self._session.get(url, verify=False, timeout=self.timeout)
+
+    def _edge_stats(self, edge: str) -> EdgeLoadStats:
+        if (stats := self.stats.get(edge)) is None:
+            stats = self.stats[edge] = EdgeLoadStats()
+        return stats
+
+    def _request(self, target: LoadTarget, due: float) -> None:
+        try:
+            response = self._get(target)
+        except requests.Timeout:
+            error_type = 'TIMEOUT'
+        except requests.ConnectionError as e:
+            error_type = get_connection_error_type(e.__context__).name
+        except requests.RequestException as e:
+            logger.debug(f'GET {target.cname} through [{target.edge_ip}] failed: {e}')
+            error_type = 'REQUEST_ERROR'
+        else:
+            latency = time.perf_counter() - due
+            # headers lookup is case-insensitive and responses of non-CDN hosts may have no Cache-Host
+            cache_host = response.headers.get('Cache-Host')
+            with self._lock:
+                self._edge_stats(target.edge_ip or cache_host or target.cname).add_response(
+                    latency, response.status_code, response.headers.get('Cache-Status')
+                )
+            return
+
+        with self._lock:
+            self._edge_stats(target.edge_ip or target.cname).add_error(error_type)
+
+    def run(self) -> dict:
+        logger.info(f'Loading [{len(self.targets)}] targets with {self.rate} rps for {self.duration} seconds...')
+        start = time.perf_counter()
+        interval = 1 / self.rate
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while (due := start + self.scheduled * interval) < start + self.duration:
+                if (delay := due - time.perf_counter()) > 0:
+                    time.sleep(delay)
+                else:
+                    self.max_dispatch_lag = max(self.max_dispatch_lag, -delay)
+                executor.submit(self._request, self.targets[self.scheduled % len(self.targets)], due)
+                self.scheduled += 1
+
+        elapsed = time.perf_counter() - start
+        self._clients.close()
+        self._session.close()
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        with self._lock:
+            total = EdgeLoadStats()
+            for stats in self.stats.values():
+                total.merge(stats)
+            edges = {edge: stats.to_dict() for edge, stats in sorted(self.stats.items())}
+
+        return {
+            'target_rate': self.rate,
+            'duration': self.duration,
+            'elapsed': round(elapsed, 3),
+            'scheduled': self.scheduled,
+            'achieved_rate': round((total.latency.count + sum(total.errors.values())) / elapsed, 3) if elapsed else None,
+            'max_dispatch_lag_ms': round(self.max_dispatch_lag * 1000, 3),
+            'total': total.to_dict(),
+            'edges': edges,
+        }
@@ -1,4 +1,5 @@
 from collections import namedtuple
+from email.utils import parsedate_to_datetime
 from enum import Enum
 from typing import List, Optional
 
@@ -22,11 +23,32 @@ class TTLSettings(BaseModel):
 class RequestsType(str, Enum):
     random = 'random'
     targeted = 'targeted'
+    concurrent = 'concurrent'  # (resource, edge) probes at the same time, edges are pinned if edge_cache_hosts are set
 
 class EdgeCurlSettings(BaseModel):
     periods_to_test: int = Field(..., description='Number of attempts to curl edges for testing')
     finish_once_success: bool = Field(..., description='Successfully stop test if any of edges successfully passed')
     requests_type: RequestsType
+    max_in_flight: int = Field(32, description='Max concurrent requests of concurrent requests type')
+    max_in_flight_per_host: int = Field(4, description='Max concurrent requests to one edge (or cname if not pinned) '
+                                                       'of concurrent requests type')
+    requests_budget: Optional[int] = Field(None, description='Max requests to edges of one check, unlimited if not set')
+    verify_tls: bool = Field(True, description='Check edges https certificates against resources cnames')
+
+class EdgeHealthSettings(BaseModel):
+    enabled: bool = Field(True, description='Check edges are reachable before tests')
+    use_icmp: bool = Field(False, description='Ping edges besides TCP connect (informational, ICMP may be filtered)')
+    interval: float = Field(10, description='Seconds between background checks rounds')
+    timeout: float = Field(2, description='Timeout of one check')
+    max_loss: float = Field(0.5, description='Max share of failed TCP connects for edge to be healthy')
+
+class OriginProbeSettings(BaseModel):
+    window: float = Field(5, description='Seconds every origin is sampled for')
+    interval: float = Field(0.2, description='Seconds between requests to one origin')
+    timeout: float = Field(5, description='Timeout of one request')
+    path: str = Field('/', description='Path requested from origins')
+    min_success_ratio: float = Field(0.9, ge=0, le=1, description='Min share of 200 responses of primary origin '
+                                                                  'for tests to start')
 
 class DefaultProtocol(str, Enum):
     http = 'http'
@@ -40,11 +62,14 @@ class ResourcesInitializeMethod(str, Enum):
     use_existing = 'use_existing'  # Use existing resources for tests
     update_existing = 'update_existing'  # Use existing but update them first
     from_scratch = 'from_scratch'  # Clean existing and create new resources for tests
+    from_pool = 'from_pool'  # Lease pre-provisioned resources of the pool and reset them for tests
 
 class ApiTestParameters(BaseModel):
     setup_initialize_resources_check: SetupInitializeResourcesCheck = Field(..., description='')
     ttl_settings: TTLSettings = Field(..., description='Edge cache ttl to check if edge revalidates')
     edge_curl_settings: EdgeCurlSettings = Field(..., description='')
+    edge_health_settings: EdgeHealthSettings = Field(default_factory=EdgeHealthSettings, description='')
+    origin_probe_settings: OriginProbeSettings = Field(default_factory=OriginProbeSettings, description='')
     default_protocol: DefaultProtocol = Field(..., description='Default (http/https) protocol to use')
     client_headers_settings: ClientHeadersSettings = Field(..., description='Settings for client headers')
     resources_initialize_method: str = Field(..., description='')
@@ -56,17 +81,30 @@ class Origin(BaseModel):
 class CDNResource(BaseModel):
     id: Optional[str] = Field(None, description='')
     cname: str = Field(..., description='')
+    warmup_paths: List[str] = Field(default_factory=list, description='Paths of hot objects to warm up on edges')
 
 class EdgeCacheHost(BaseModel):
     url: Optional[str] = Field(None, description='')
     ip_address: str = Field(..., description='')
 
+class ResourcePool(BaseModel):
+    cnames: List[str] = Field(..., description='Cnames of pool resources, DNS records have to point to CDN')
+    size: Optional[int] = Field(None, description='Target number of pool resources, all cnames if not set')
+    lease_size: int = Field(10, ge=10, description='Number of resources leased by a run, tests options need 10')
+    state_path: str = Field('~/.cache/yccdn-qa/pool.json', description='Pool resources and leases file')
+    lease_ttl: int = Field(6 * 3600, description='Seconds after which lease of a crashed run expires, '
+                                                 'leases of running ones are renewed on every refill')
+    refill_interval: float = Field(60, description='Seconds between background refills')
+
 class Resources(BaseModel):
     folder_id: str = Field(..., description='')
     origin_group_name: Optional[str] = Field(None, description='')
     origin: Origin = Field(..., description='')
     cdn_resources: List[CDNResource] = Field(..., description='')
     edge_cache_hosts: Optional[List[EdgeCacheHost]] = Field(None, description='')
+    discover_edge_cache_hosts: bool = Field(False, description='Add edges cdn resources cnames resolve to '
+                                                               'to edge cache hosts')
+    pool: Optional[ResourcePool] = Field(None, description='Pool of resources for from_pool initialize method')
 
 class Config(BaseModel):
     yandex_cloud_api: YandexCloudAPI = Field(..., description='')
@@ -79,6 +117,57 @@ class EdgeResponseHeaders(BaseModel):
     cache_host: str = Field(..., alias='Cache-Host')
     cache_status: Optional[str] = Field(None, alias='Cache-Status')
     param_to_test: Optional[str] = Field(None, alias='param-to-test')
+    age: Optional[int] = Field(None, alias='Age', description='Seconds since cached object was stored by edge')
+    date: Optional[str] = Field(None, alias='Date', description='Time response was prepared by edge')
+    expires: Optional[str] = Field(None, alias='Expires')
+    cache_control: Optional[str] = Field(None, alias='Cache-Control')
+    last_modified: Optional[str] = Field(None, alias='Last-Modified', description='Time object was modified on origin')
+
+    @property
+    def date_timestamp(self) -> Optional[float]:
+        return parse_http_date(self.date)
+
+    @property
+    def stored_at(self) -> Optional[float]:
+        """ Edge clock time cached object was stored (fetched or revalidated) at, None without Date or Age:
+        Date alone is the time of the response, not of the object
+        """
+
+        if self.age is None or (date_timestamp := self.date_timestamp) is None:
+            return None
+        return date_timestamp - self.age
+
+    @property
+    def max_age(self) -> Optional[int]:
+        """ Shared cache lifetime from Cache-Control (s-maxage wins over max-age)
+        """
+
+        directives = dict(
+            directive.strip().partition('=')[::2] for directive in (self.cache_control or '').lower().split(',')
+        )
+        for name in ('s-maxage', 'max-age'):
+            if (value := directives.get(name, '').strip('"')).isdigit():
+                return int(value)
+        return None
+
+    @property
+    def freshness_lifetime(self) -> Optional[float]:
+        """ Seconds cached object is fresh for by the headers: max-age, otherwise Expires counted from the store time
+        """
+
+        if (max_age := self.max_age) is not None:
+            return max_age
+        if (expires := parse_http_date(self.expires)) is None or (stored_at := self.stored_at) is None:
+            return None
+        return max(expires - stored_at, 0.0)
+
+def parse_http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
 
 HostResponse = namedtuple('HostResponse', 'time, status')
 
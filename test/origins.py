@@ -0,0 +1,169 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import clock
+from app.model import OriginGroup
+from test.histogram import LatencyHistogram
+from test.logger import logger
+from test.utils import get_connection_error_type
+
+# origin_group_id and use_next (whether group falls back to backups) are None if origin is not in a group
+OriginTarget = namedtuple('OriginTarget', 'origin_group_id, source, backup, use_next')
+
+CHUNK_SIZE = 64 * 1024
+
+
+def origin_targets(origin_groups: Iterable[OriginGroup], sources: Iterable[str] = ()) -> List[OriginTarget]:
+    """ Enabled origins of origin groups and other sources not in any of them, every source once
+    """
+
+    targets = {}
+    for origin_group in origin_groups:
+        for origin in origin_group.origins:
+            if origin.enabled is not False:
+                targets.setdefault(origin.source, OriginTarget(
+                    origin_group.id, origin.source, bool(origin.backup), bool(origin_group.use_next)
+                ))
+    for source in sources:
+        targets.setdefault(source, OriginTarget(None, source, False, None))
+    return list(targets.values())
+
+
+class OriginStats:
+    """ Statuses, time to first byte and throughput of one origin
+    """
+
+    def __init__(self):
+        self.ttfb = LatencyHistogram()
+        self.status_codes: Dict[int, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.bytes = 0
+        self.transfer_time = 0.0  # from request sent to the last byte, throughput is bytes over it
+
+    def add_response(self, status_code: int, ttfb: float, size: int, transfer_time: float) -> None:
+        self.ttfb.add(ttfb)
+        self.status_codes[status_code] = self.status_codes.get(status_code, 0) + 1
+        self.bytes += size
+        self.transfer_time += transfer_time
+
+    def add_error(self, error_type: str) -> None:
+        self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    @property
+    def all_200(self) -> bool:
+        return bool(self.status_codes) and not self.errors and set(self.status_codes) == {200}
+
+    @property
+    def success_ratio(self) -> Optional[float]:
+        """ Share of requests answered 200, None if nothing was sent
+        """
+
+        requests_count = self.ttfb.count + sum(self.errors.values())
+        return self.status_codes.get(200, 0) / requests_count if requests_count else None
+
+    @property
+    def throughput(self) -> Optional[float]:
+        return self.bytes / self.transfer_time if self.transfer_time else None
+
+    def to_dict(self) -> dict:
+        return {
+            'responses': self.ttfb.count,
+            'all_200': self.all_200,
+            'success_ratio': None if self.success_ratio is None else round(self.success_ratio, 4),
+            'status_codes': {str(code): count for code, count in sorted(self.status_codes.items())},
+            'errors': self.errors,
+            'ttfb_ms': self.ttfb.to_dict(),
+            'throughput_bytes_per_second': None if self.throughput is None else round(self.throughput),
+        }
+
+
+class OriginProber:
+    """ Sampling every origin at the same time for a short window: each origin is requested back-to-back
+    (with interval between requests) over keep-alive connections, so origin latency can be told from edges one.
+    TTFB is time until response headers are received, throughput is body bytes over the whole transfer time.
+    """
+
+    def __init__(
+            self,
+            targets: List[OriginTarget],
+            protocol: str = 'http',
+            path: str = '/',
+            window: float = 5,
+            interval: float = 0.2,
+            timeout: float = 5,
+            max_workers: int = 16
+    ):
+        self.targets = targets
+        self.protocol = protocol
+        self.path = path
+        self.window = window
+        self.interval = interval
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+        self.stats: Dict[str, OriginStats] = {target.source: OriginStats() for target in targets}
+        self._lock = threading.Lock()
+        self._session = requests.Session()
+        self._session.mount(f'{protocol}://', HTTPAdapter(pool_maxsize=max_workers))
+
+    def probe(self, target: OriginTarget) -> None:
+        url = f'{self.protocol}://{target.source}{self.path}'
+        start = clock.perf_counter()
+        try:
+            with self._session.get(url, verify=False, timeout=self.timeout, stream=True) as response:
+                ttfb = clock.perf_counter() - start
+                size = sum(len(chunk) for chunk in response.iter_content(CHUNK_SIZE))
+        except requests.Timeout:
+            error_type = 'TIMEOUT'
+        except requests.ConnectionError as e:
+            error_type = get_connection_error_type(e.__context__).name
+        except requests.RequestException as e:
+            logger.debug(f'GET {url} failed: {e}')
+            error_type = 'REQUEST_ERROR'
+        else:
+            with self._lock:
+                self.stats[target.source].add_response(response.status_code, ttfb, size, clock.perf_counter() - start)
+            return
+
+        with self._lock:
+            self.stats[target.source].add_error(error_type)
+
+    def _sample(self, target: OriginTarget, deadline: float) -> None:
+        while True:
+            self.probe(target)
+            if clock.perf_counter() + self.interval >= deadline:
+                return
+            clock.sleep(self.interval)
+
+    def run(self) -> dict:
+        if not self.targets:
+            return {}
+        logger.info(f'Sampling origins {[target.source for target in self.targets]} for {self.window} seconds...')
+        deadline = clock.perf_counter() + self.window
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(self.targets))) as executor:
+            list(executor.map(lambda target: self._sample(target, deadline), self.targets))
+        self._session.close()
+        return self.report()
+
+    def report(self) -> dict:
+        """ Origin group id (None for sources out of groups) -> its use_next and origin source -> its stats
+        """
+
+        report = {}
+        for target in self.targets:
+            group = report.setdefault(str(target.origin_group_id), {'use_next': target.use_next, 'origins': {}})
+            group['origins'][target.source] = {'backup': target.backup, **self.stats[target.source].to_dict()}
+        return report
+
+    def failed(self, min_success_ratio: float = 1.0, include_backup: bool = False) -> List[OriginTarget]:
+        """ Origins which responded 200 to less than min_success_ratio of requests
+        """
+
+        return [target for target in self.targets
+                if (include_backup or not target.backup)
+                and (self.stats[target.source].success_ratio or 0) < min_success_ratio]
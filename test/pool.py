@@ -0,0 +1,208 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from filelock import FileLock
+
+from app.model import CDNResource
+from app.resource import ResourcesAPIProcessor
+from test.logger import logger
+from test.model import CDNResource as PoolResource
+from test.readiness import CnameReadinessChecker
+
+
+class PoolLeases:
+    """ Cdn resources of the pool and their leases kept in json file guarded by file lock, so runs on the same host
+    never lease the same resource. Leases of crashed runs expire after lease_ttl seconds.
+    """
+
+    def __init__(self, state_path: Path, lease_ttl: float = 6 * 3600):
+        self.state_path = Path(state_path).expanduser()
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_ttl = lease_ttl
+        self._lock = FileLock(f'{self.state_path}.lock')
+
+    @contextmanager
+    def _state(self) -> Iterator[Dict[str, dict]]:
+        """ Resource id -> {'cname': ..., 'owner': ..., 'expires_at': ...}, written back on exit
+        """
+
+        with self._lock:
+            state = json.loads(self.state_path.read_text()) if self.state_path.exists() else {}
+            yield state
+            self.state_path.write_text(json.dumps(state, indent=2))
+
+    def _is_free(self, entry: dict, now: float) -> bool:
+        return not entry.get('owner') or entry.get('expires_at', 0) < now
+
+    def resources(self) -> List[PoolResource]:
+        with self._state() as state:
+            return [PoolResource(id=resource_id, cname=entry['cname']) for resource_id, entry in state.items()]
+
+    def free_count(self) -> int:
+        now = time.time()
+        with self._state() as state:
+            return sum(self._is_free(entry, now) for entry in state.values())
+
+    def add(self, resources: List[PoolResource]) -> None:
+        with self._state() as state:
+            for resource in resources:
+                state.setdefault(resource.id, {'cname': resource.cname})
+
+    def remove(self, resources_ids: List[str]) -> None:
+        with self._state() as state:
+            for resource_id in resources_ids:
+                state.pop(resource_id, None)
+
+    def lease(self, count: int, owner: str) -> Optional[List[PoolResource]]:
+        """ Lease count free resources (resources already leased by the owner are leased again first),
+        None if there are not enough of them: nothing is leased then
+        """
+
+        now = time.time()
+        with self._state() as state:
+            owned = [resource_id for resource_id, entry in state.items() if entry.get('owner') == owner]
+            free = [resource_id for resource_id, entry in state.items()
+                    if resource_id not in owned and self._is_free(entry, now)]
+            if len(leased := (owned + free)[:count]) < count:
+                logger.error(f'Only {len(owned) + len(free)} of {count} pool resources are free')
+                return None
+            for resource_id in leased:
+                state[resource_id].update(owner=owner, expires_at=now + self.lease_ttl)
+            logger.info(f'Pool resources {leased} are leased by [{owner}]')
+            return [PoolResource(id=resource_id, cname=state[resource_id]['cname']) for resource_id in leased]
+
+    def renew(self, owner: str) -> List[str]:
+        """ Extend leases of the owner by lease_ttl from now, so long runs keep their resources
+        """
+
+        now = time.time()
+        with self._state() as state:
+            renewed = [resource_id for resource_id, entry in state.items() if entry.get('owner') == owner]
+            for resource_id in renewed:
+                state[resource_id]['expires_at'] = now + self.lease_ttl
+        logger.debug(f'Pool resources {renewed} leases are renewed by [{owner}]')
+        return renewed
+
+    def release(self, owner: str) -> List[str]:
+        with self._state() as state:
+            released = [resource_id for resource_id, entry in state.items() if entry.get('owner') == owner]
+            for resource_id in released:
+                state[resource_id] = {'cname': state[resource_id]['cname']}
+        logger.info(f'Pool resources {released} are released by [{owner}]')
+        return released
+
+
+class ResourcePool:
+    """ Pool of pre-provisioned cdn resources, so tests start with resources already created and served by edges.
+    Leased resources are reset to wanted options updating only those which differ from existing ones,
+    background refill creates resources for free pool cnames until the pool has its target size
+    and renews the lease of the run.
+    """
+
+    def __init__(
+            self,
+            resources_processor: ResourcesAPIProcessor,
+            leases: PoolLeases,
+            origin_group_id: str,
+            cnames: List[str],
+            size: Optional[int] = None,
+            refill_interval: float = 60,
+            max_workers: int = 8
+    ):
+        self.resources_processor = resources_processor
+        self.leases = leases
+        self.origin_group_id = origin_group_id
+        self.cnames = cnames
+        self.size = len(cnames) if size is None else min(size, len(cnames))
+        self.refill_interval = refill_interval
+        self.max_workers = max_workers
+
+        self._refill_lock = FileLock(f'{leases.state_path}.refill.lock')  # one refill at a time for all runs
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._owner: Optional[str] = None  # whose lease is renewed by the background refill
+
+    def refill(self) -> int:
+        """ Drop resources deleted from the folder, create new ones up to the pool size, returns number created
+        """
+
+        with self._refill_lock:
+            if (existing := self.resources_processor.get_items_list()) is None:
+                logger.error('Error while listing cdn resources, pool is not refilled')
+                return 0
+
+            existing_ids = {resource['id'] for resource in existing}
+            pool_resources = self.leases.resources()
+            if gone := [resource.id for resource in pool_resources if resource.id not in existing_ids]:
+                logger.info(f'Pool resources {gone} no longer exist')
+                self.leases.remove(gone)
+
+            missing = self.size - (len(pool_resources) - len(gone))
+            used_cnames = {resource.get('cname') for resource in existing}
+            candidates = [cname for cname in self.cnames if cname not in used_cnames]
+            if missing <= 0 or not candidates:
+                return 0
+
+            report = CnameReadinessChecker().check(candidates)
+            created = []
+            for cname in [cname for cname in candidates if report[cname].ready][:missing]:
+                resource = self.resources_processor.make_default_cdn_resource(
+                    folder_id=self.resources_processor.folder_id,
+                    cname=cname,
+                    origin_group_id=self.origin_group_id
+                )
+                if self.resources_processor.create_item(resource):
+                    created.append(PoolResource(id=resource.id, cname=cname))
+            self.leases.add(created)
+
+        logger.info(f'Pool is refilled with {len(created)} of {missing} missing resources')
+        return len(created)
+
+    def reset_one(self, wanted: CDNResource) -> bool:
+        existing = self.resources_processor.get_resource_by_id(wanted.id)
+        if existing is not None and existing == wanted:
+            logger.debug(f'Pool resource [{wanted.id}] already has wanted options')
+            return True
+        return bool(self.resources_processor.update(wanted))
+
+    def reset(self, resources: List[CDNResource]) -> bool:
+        """ Bring leased resources to wanted state: only resources differing from wanted are updated
+        """
+
+        if not resources:
+            return True
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(resources))) as executor:
+            results = list(executor.map(self.reset_one, resources))
+        logger.info(f'Pool resources reset: {len(results)} checked, {results.count(False)} failed')
+        return all(results)
+
+    def _run(self) -> None:
+        while not self._stopped.wait(self.refill_interval):
+            try:
+                if self._owner:
+                    self.leases.renew(self._owner)
+                self.refill()
+            except Exception as e:  # refill is best effort, next round retries it
+                logger.error(f'Pool refill failed: {e}')
+
+    def start_refill(self, owner: Optional[str] = None) -> None:
+        """ Refill the pool and renew leases of the owner (if given) every refill_interval in the background
+        """
+
+        if self._thread and self._thread.is_alive():
+            return
+        self._owner = owner
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name='resource-pool-refill', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
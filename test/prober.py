@@ -0,0 +1,132 @@
+import asyncio
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional
+
+import requests
+
+from app import clock
+from app.edgeclient import EdgeClientRegistry, edge_clients
+from app.utils import increment
+from test.logger import logger
+from test.model import EdgeResponseHeaders
+from test.scheduler import AdaptiveProbeScheduler
+
+ProbeTarget = namedtuple('ProbeTarget', 'resource_id, cname, edge_ip')  # edge_ip is None to go through DNS
+ProbeSample = namedtuple('ProbeSample', 'target, time, elapsed, status_code, headers')
+
+
+class AsyncEdgeProber:
+    """ Probing (resource, edge) pairs concurrently: every target is probed in its own loop,
+    number of in-flight requests is limited overall and per host (edge ip or cname if not pinned).
+    requests is blocking, so probes are run in thread pool and connections are taken from pools.
+    Not pinned targets are sent to cached addresses of their cnames, so DNS lookups are not measured.
+    With scheduler every target waits for its next probe time, otherwise it is probed back-to-back.
+    """
+
+    def __init__(
+            self,
+            protocol: str = 'http',
+            max_in_flight: int = 32,
+            max_in_flight_per_host: int = 4,
+            timeout: int = 5,
+            add_query_arg: bool = False,
+            verify: bool = True,
+            clients: EdgeClientRegistry = None,
+            scheduler: AdaptiveProbeScheduler = None
+    ):
+        self.protocol = protocol
+        self.max_in_flight = max_in_flight
+        self.max_in_flight_per_host = max_in_flight_per_host
+        self.timeout = timeout
+        self.add_query_arg = add_query_arg
+        self.verify = verify  # tls certificates of edges
+        self.clients = clients or edge_clients
+        self.scheduler = scheduler
+        self.requests_sent = 0
+
+        self._query_generator = increment()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._in_flight: Optional[asyncio.Semaphore] = None
+        self._in_flight_per_host: Dict[str, asyncio.Semaphore] = {}
+        self._stopped: Optional[asyncio.Event] = None
+
+    def _make_url(self, target: ProbeTarget) -> str:
+        url = target.cname
+        if self.add_query_arg:
+            url += '?foo=' + str(next(self._query_generator))
+        return url
+
+    def _get(self, target: ProbeTarget, url: str) -> requests.Response:
+        if target.edge_ip:
+            return self.clients.get(f'{self.protocol}://{url}', target.edge_ip, verify=self.verify, timeout=self.timeout)
+        # not pinned target goes to edges its cname resolves to, cached addresses are rotated
+        return self.clients.get_resolved(f'{self.protocol}://{url}', verify=self.verify, timeout=self.timeout)
+
+    async def probe(self, target: ProbeTarget) -> Optional[ProbeSample]:
+        host = target.edge_ip or target.cname
+        host_semaphore = self._in_flight_per_host.setdefault(host, asyncio.Semaphore(self.max_in_flight_per_host))
+        url = self._make_url(target)
+
+        async with self._in_flight, host_semaphore:
+            self.requests_sent += 1
+            start = clock.perf_counter()
+            try:
+                response = await asyncio.get_running_loop().run_in_executor(self._executor, self._get, target, url)
+            except requests.RequestException as e:
+                logger.debug(f'GET {url} through [{host}] failed: {e}')
+                return None
+            elapsed = clock.perf_counter() - start
+            received = clock.time()
+
+        headers = EdgeResponseHeaders(**response.headers)
+        logger.debug(f'GET {url} through [{host}]: {response.status_code}, {headers}')
+        return ProbeSample(target=target, time=received, elapsed=elapsed, status_code=response.status_code, headers=headers)
+
+    async def _probe_target(self, target: ProbeTarget, deadline: float, on_sample: Callable[[ProbeSample], bool]):
+        while clock.time() < deadline and not self._stopped.is_set():
+            if self.scheduler and not self.scheduler.take():
+                logger.debug(f'requests budget is spent: {self.scheduler}')
+                self.stop()
+                return
+            if (sample := await self.probe(target)) and on_sample(sample):
+                return
+            if self.scheduler:
+                host = sample.headers.cache_host if sample else None
+                await self._sleep(min(self.scheduler.next_delay(target.resource_id, host, clock.time()),
+                                      deadline - clock.time()))
+
+    async def _sleep(self, delay: float) -> None:
+        """ Sleep interrupted once prober is stopped
+        """
+
+        if delay <= 0:
+            return
+        try:
+            await asyncio.wait_for(self._stopped.wait(), timeout=clock.to_real(delay))
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(
+            self,
+            targets: Iterable[ProbeTarget],
+            duration: float,
+            on_sample: Callable[[ProbeSample], bool]
+    ) -> None:
+        """ Probe every target until duration is over, prober is stopped or on_sample returns True for the target
+        """
+
+        self._in_flight = asyncio.Semaphore(self.max_in_flight)
+        self._in_flight_per_host = {}
+        self._stopped = asyncio.Event()
+        deadline = clock.time() + duration
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as self._executor:
+            await asyncio.gather(*[self._probe_target(target, deadline, on_sample) for target in targets])
+
+    def run_sync(self, targets: Iterable[ProbeTarget], duration: float, on_sample: Callable[[ProbeSample], bool]) -> None:
+        asyncio.run(self.run(targets, duration, on_sample))
+
+    def stop(self) -> None:
+        if self._stopped:
+            self._stopped.set()
@@ -0,0 +1,220 @@
+import re
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app import clock
+from app.resolver import DNSCache
+from app.waiter import WaitResult, add_wait_listener, remove_wait_listener
+
+SLEEP, API, EDGE, DNS, CPU, OTHER = 'sleep', 'api', 'edge', 'dns', 'cpu', 'other'
+
+# ids in API paths, so requests to different items are summed up
+_ID_SEGMENT = re.compile(r'/(?=[a-z]*\d)[a-z0-9]{8,}(?=/|$)')
+
+# sleeps are attributed to the first caller out of these: retries sleep inside of the waiter,
+# so the sleep is named after the retry decorator or function waiting
+_SLEEP_HELPERS_MODULES = {'app.clock', 'app.waiter', __name__}
+
+
+def sleep_caller() -> str:
+    frame = sys._getframe(1)
+    while frame.f_back is not None and frame.f_globals.get('__name__') in _SLEEP_HELPERS_MODULES:
+        frame = frame.f_back
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name).replace('.<locals>', '')  # co_qualname is 3.11+
+    return f'{frame.f_globals.get("__name__")}.{name}'
+
+
+class TimeProfile:
+    """ Where wall-clock time of one test goes. Time of the thread running the test is split between
+    instrumented calls (sleep, API, edge, DNS), CPU outside of them and the rest (waiting for other threads).
+    Instrumented calls of other threads (e.g. concurrent probes) are summed up separately as they overlap.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.wall = 0.0
+        self.cpu = 0.0  # of the test thread, including CPU spent inside instrumented calls
+        self.inside_cpu = 0.0
+        self.calls: Dict[Tuple[bool, str, str], List[float]] = {}  # (test thread, category, detail) -> [seconds, n]
+        self.waits: List[WaitResult] = []
+
+    def add(self, in_test_thread: bool, category: str, detail: str, seconds: float, cpu: float = 0) -> None:
+        totals = self.calls.setdefault((in_test_thread, category, detail), [0.0, 0])
+        totals[0] += seconds
+        totals[1] += 1
+        if in_test_thread:
+            self.inside_cpu += cpu
+
+    def totals(self, in_test_thread: bool = True) -> Dict[str, float]:
+        totals = {}
+        for (test_thread, category, _), (seconds, _) in self.calls.items():
+            if test_thread == in_test_thread:
+                totals[category] = totals.get(category, 0) + seconds
+        if in_test_thread:
+            totals[CPU] = max(self.cpu - self.inside_cpu, 0)
+            totals[OTHER] = max(self.wall - sum(totals.values()), 0)
+        return totals
+
+    def folded(self) -> List[str]:
+        """ Stacks in folded format (flamegraph.pl, speedscope) with milliseconds as values
+        """
+
+        stack = self.name.replace(';', ':')
+        lines = []
+        for (test_thread, category, detail), (seconds, _) in sorted(self.calls.items()):
+            thread = 'test' if test_thread else 'concurrent'
+            lines.append(f'{stack};{thread};{category};{detail} {round(seconds * 1000)}')
+        totals = self.totals()
+        lines += [f'{stack};test;{category} {round(totals[category] * 1000)}' for category in (CPU, OTHER)]
+        return lines
+
+    def render(self) -> str:
+        def bar(seconds: float) -> str:
+            share = seconds / self.wall if self.wall else 0
+            return f'{seconds:9.3f}s {share:6.1%} {"#" * round(share * 40)}'
+
+        lines = [f'{self.name}: {self.wall:.3f}s wall-clock', '', 'test thread:']
+        for category, seconds in sorted(self.totals().items(), key=lambda item: -item[1]):
+            lines.append(f'  {category:<6} {bar(seconds)}')
+            for (test_thread, c, detail), (s, n) in sorted(self.calls.items(), key=lambda item: -item[1][0]):
+                if test_thread and c == category:
+                    lines.append(f'    {detail:<60} {s:9.3f}s x{n}')
+        if concurrent := self.totals(in_test_thread=False):
+            lines += ['', 'concurrent threads (overlapping):']
+            lines += [f'  {category:<6} {seconds:9.3f}s' for category, seconds in concurrent.items()]
+        if self.waits:
+            lines += ['', 'waits:']
+            lines += [f'  {w.name:<60} {w.elapsed:9.3f}s x{w.attempts} {"OK" if w.success else "FAILED"}'
+                      for w in self.waits]
+        return '\n'.join(lines + ['', 'folded stacks (ms):'] + self.folded())
+
+
+class ProfilingClock(clock.RealClock):
+    """ Clock timing sleeps of the wrapped one
+    """
+
+    def __init__(self, inner: clock.RealClock, profiler: 'Profiler'):
+        self.inner = inner
+        self.profiler = profiler
+        self.speed = inner.speed
+
+    def time(self) -> float:
+        return self.inner.time()
+
+    def monotonic(self) -> float:
+        return self.inner.monotonic()
+
+    def perf_counter(self) -> float:
+        return self.inner.perf_counter()
+
+    def to_real(self, seconds: float) -> float:
+        return self.inner.to_real(seconds)
+
+    def sleep(self, seconds: float) -> None:
+        with self.profiler.timed(SLEEP, sleep_caller()):
+            self.inner.sleep(seconds)
+
+
+class Profiler:
+    """ Timing sleeps of app clock, HTTP requests (API ones by their hosts, other ones are edge probes)
+    and DNS queries of the cache, attributing them to the test running
+    """
+
+    def __init__(self):
+        self.api_hosts: Set[str] = set()
+        self.profile: Optional[TimeProfile] = None
+        self._test_thread: Optional[int] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._previous_clock: Optional[clock.RealClock] = None
+        self._previous_send = None
+        self._previous_query = None
+
+    def add_api_urls(self, *urls: str) -> None:
+        self.api_hosts.update(urlsplit(url).netloc for url in urls)
+
+    def install(self) -> None:
+        if self._previous_send is not None:
+            return
+        profiler = self
+        self._previous_clock = clock.use(ProfilingClock(clock.current(), self))
+        self._previous_send = previous_send = HTTPAdapter.send
+        self._previous_query = previous_query = DNSCache._query
+
+        def send(adapter: HTTPAdapter, request: requests.PreparedRequest, *args: Any, **kwargs: Any):
+            url = urlsplit(request.url)
+            host = request.headers.get('Host') or url.netloc
+            if host in profiler.api_hosts:
+                category, detail = API, f'{request.method} {host}{_ID_SEGMENT.sub("/{id}", url.path)}'
+            else:
+                category, detail = EDGE, url.netloc
+            with profiler.timed(category, detail):
+                return previous_send(adapter, request, *args, **kwargs)
+
+        def query(cache: DNSCache, name: str):
+            with profiler.timed(DNS, name):
+                return previous_query(cache, name)
+
+        HTTPAdapter.send = send
+        DNSCache._query = query
+        add_wait_listener(self.add_wait)
+
+    def uninstall(self) -> None:
+        if self._previous_send is None:
+            return
+        clock.use(self._previous_clock)
+        HTTPAdapter.send = self._previous_send
+        DNSCache._query = self._previous_query
+        remove_wait_listener(self.add_wait)
+        self._previous_send = self._previous_query = self._previous_clock = None
+
+    def add_wait(self, result: WaitResult) -> None:
+        with self._lock:
+            if self.profile is not None:
+                self.profile.waits.append(result)
+
+    @contextmanager
+    def timed(self, category: str, detail: str) -> Iterator[None]:
+        """ Time the call, calls made inside of it (e.g. replayed response sleep) are a part of it
+        """
+
+        if getattr(self._local, 'busy', False) or self.profile is None:
+            yield
+            return
+        self._local.busy = True
+        in_test_thread = threading.get_ident() == self._test_thread
+        start, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            self._local.busy = False
+            seconds, cpu = time.perf_counter() - start, time.thread_time() - start_cpu
+            with self._lock:
+                if self.profile is not None:
+                    self.profile.add(in_test_thread, category, detail, seconds, cpu)
+
+    @contextmanager
+    def collect(self, profile: TimeProfile) -> Iterator[TimeProfile]:
+        """ Attribute time spent by the calling thread until exit (time adds up over several collects)
+        """
+
+        self.profile, self._test_thread = profile, threading.get_ident()
+        start, start_cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield profile
+        finally:
+            with self._lock:
+                profile.wall += time.perf_counter() - start
+                profile.cpu += time.thread_time() - start_cpu
+                self.profile, self._test_thread = None, None
+
+
+profiler = Profiler()
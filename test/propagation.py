@@ -0,0 +1,129 @@
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from app.edgeclient import EdgeClientRegistry, edge_clients
+from app.model import CDNResource, EnabledBoolValueDictStrStr
+from app.resource import ResourcesAPIProcessor
+from app.utils import make_random_8_symbols
+from test.logger import logger
+
+PROPAGATION_HEADER = 'param-to-test'
+
+
+def summarize(values: List[Optional[float]]) -> dict:
+    """ Nearest-rank percentiles of propagation times in seconds, None values are not propagated in time
+    """
+
+    propagated = sorted(value for value in values if value is not None)
+
+    def percentile(p: float) -> Optional[float]:
+        if not propagated:
+            return None
+        return round(propagated[max(math.ceil(p / 100 * len(propagated)) - 1, 0)], 3)
+
+    return {
+        'samples': len(values),
+        'not_propagated': len(values) - len(propagated),
+        'min': percentile(0),
+        'p50': percentile(50),
+        'p90': percentile(90),
+        'max': round(propagated[-1], 3) if propagated else None,
+    }
+
+
+class PropagationBenchmark:
+    """ Measuring how long cdn resource update takes to be served by every edge: unique static header value
+    is set as a marker, then all edges are probed at once until each of them responds with the marker.
+    Times are counted from the moment the update API call was started. Trials are separated by a pause,
+    so the next update does not race the rollout of the previous one.
+    """
+
+    def __init__(
+            self,
+            resources_processor: ResourcesAPIProcessor,
+            resource: CDNResource,
+            edges_ips: List[str],
+            protocol: str = 'http',
+            header_name: str = PROPAGATION_HEADER,
+            timeout: float = 600,
+            probe_interval: float = 0.5,
+            delay_between_trials: float = 10,
+            verify: bool = True,
+            clients: EdgeClientRegistry = None
+    ):
+        if not edges_ips:
+            raise ValueError(f'No edges to probe for resource [{resource.id}]')
+        self.resources_processor = resources_processor
+        self.resource = resource
+        self.edges_ips = edges_ips
+        self.protocol = protocol
+        self.header_name = header_name
+        self.timeout = timeout  # max time to wait for one trial
+        self.probe_interval = probe_interval
+        self.delay_between_trials = delay_between_trials
+        self.verify = verify  # tls certificates of edges
+        self.clients = clients or edge_clients
+        self.trials: List[Dict[str, Optional[float]]] = []
+        self.api_calls: List[float] = []
+
+    def _wait_marker(self, edge_ip: str, marker: str, started: float) -> Optional[float]:
+        url = f'{self.protocol}://{self.resource.cname}?propagation={marker}'
+        while time.time() < started + self.timeout:
+            try:
+                response = self.clients.get(url, edge_ip, verify=self.verify, timeout=5)
+                if response.headers.get(self.header_name) == marker:
+                    return time.time() - started
+            except requests.RequestException as e:
+                logger.debug(f'GET {url} through [{edge_ip}] failed: {e}')
+            time.sleep(self.probe_interval)
+        return None
+
+    def trial(self) -> Dict[str, Optional[float]]:
+        """ One marker update, returns seconds to propagate per edge ip (None if not propagated in time)
+        """
+
+        marker = f'propagation-{make_random_8_symbols()}'
+        updated_resource = self.resource.model_copy(deep=True)
+        updated_resource.options.static_headers = EnabledBoolValueDictStrStr(
+            enabled=True, value={self.header_name: marker}
+        )
+
+        logger.info(f'Setting [{self.header_name}: {marker}] of resource [{self.resource.id}]...')
+        started = time.time()
+        if not self.resources_processor.update(updated_resource):
+            raise RuntimeError(f'Failed to update resource [{self.resource.id}]')
+        self.api_calls.append(time.time() - started)
+
+        with ThreadPoolExecutor(max_workers=max(len(self.edges_ips), 1)) as executor:
+            times = list(executor.map(lambda edge_ip: self._wait_marker(edge_ip, marker, started), self.edges_ips))
+        result = dict(zip(self.edges_ips, times))
+        logger.info(f'...propagated: {result}')
+
+        self.trials.append(result)
+        return result
+
+    def run(self, trials: int = 5) -> dict:
+        try:
+            for i in range(trials):
+                if i:
+                    time.sleep(self.delay_between_trials)
+                self.trial()
+        finally:
+            logger.info(f'Restoring resource [{self.resource.id}]...')
+            self.resources_processor.update(self.resource)
+        return self.report()
+
+    def report(self) -> dict:
+        everywhere = [None if None in trial.values() else max(trial.values(), default=None) for trial in self.trials]
+        return {
+            'resource_id': self.resource.id,
+            'cname': self.resource.cname,
+            'api_call': summarize(self.api_calls),
+            'all_edges': summarize([t for trial in self.trials for t in trial.values()]),
+            'everywhere': summarize(everywhere),  # time for the last edge of every trial
+            'edges': {edge_ip: summarize([trial[edge_ip] for trial in self.trials]) for edge_ip in self.edges_ips},
+        }
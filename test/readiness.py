@@ -0,0 +1,94 @@
+from concurrent.futures import ThreadPoolExecutor
+from enum import Enum
+from functools import partial
+from typing import Dict, Iterable, Optional
+
+import requests
+
+from app.utils import FIRST_RETRY_DELAY
+from app.waiter import Condition, wait_for_all
+from test.utils import ConnectionErrorType, get_connection_error_type, http_get_request
+
+
+class CnameState(str, Enum):
+    NOT_FOUND = '404'
+    RESET_BY_PEER = 'reset by peer'
+    NXDOMAIN = 'name not resolved'
+    OTHER = 'other'
+
+
+# cname is served by CDN edges but no resource uses it yet
+READY_STATES = frozenset((CnameState.NOT_FOUND, CnameState.RESET_BY_PEER))
+
+
+class CnameCheck:
+    def __init__(self, cname: str, state: CnameState, details: Optional[str] = None):
+        self.cname = cname
+        self.state = state
+        self.details = details
+
+    @property
+    def ready(self) -> bool:
+        return self.state in READY_STATES
+
+    def __repr__(self) -> str:
+        return f'CnameCheck({self.cname}: {self.state.value}{f", {self.details}" if self.details else ""})'
+
+
+class CnameReadinessChecker:
+    """ Checking cnames are ready for new cdn resources: all cnames are requested at once, every cname gets
+    its own state, rechecks are made for not ready cnames only
+    """
+
+    def __init__(self, protocol: str = 'http', timeout: int = 5, max_workers: int = 16):
+        self.protocol = protocol
+        self.timeout = timeout
+        self.max_workers = max_workers
+
+    def check_cname(self, cname: str) -> CnameCheck:
+        try:
+            response = http_get_request(url=f'{self.protocol}://{cname}', timeout=self.timeout)
+        except requests.exceptions.ConnectionError as ce:
+            err_type = get_connection_error_type(ce.__context__)
+            if err_type == ConnectionErrorType.RESET_BY_PEER:
+                return CnameCheck(cname, CnameState.RESET_BY_PEER)
+            if err_type == ConnectionErrorType.NAME_RESOLUTION_ERROR:
+                return CnameCheck(cname, CnameState.NXDOMAIN, 'check DNS or any other name resolution issues')
+            return CnameCheck(cname, CnameState.OTHER, str(ce))
+        except requests.exceptions.RequestException as e:
+            return CnameCheck(cname, CnameState.OTHER, str(e))
+
+        if response.status_code == 404:
+            return CnameCheck(cname, CnameState.NOT_FOUND)
+        return CnameCheck(cname, CnameState.OTHER, f'status code {response.status_code}')
+
+    def check(self, cnames: Iterable[str]) -> Dict[str, CnameCheck]:
+        cnames = list(dict.fromkeys(cnames))
+        if not cnames:
+            return {}
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(cnames))) as executor:
+            return dict(zip(cnames, executor.map(self.check_cname, cnames)))
+
+    def wait_ready(self, cnames: Iterable[str], attempts: int = 2, attempt_delay: float = 5) -> Dict[str, CnameCheck]:
+        """ Report of all cnames: every cname is waited in its own thread, not ready ones are rechecked with pauses
+        growing up to attempt_delay, at least for the window of attempts - 1 such pauses
+        """
+
+        cnames = list(dict.fromkeys(cnames))
+        conditions = [
+            Condition(
+                f'cname [{cname}] is ready',
+                partial(self.check_cname, cname),
+                attempts=attempts,
+                min_elapsed=(attempts - 1) * attempt_delay,
+                is_success=lambda check: check.ready
+            )
+            for cname in cnames
+        ]
+        results = wait_for_all(
+            conditions,
+            initial_delay=min(FIRST_RETRY_DELAY, attempt_delay),
+            max_delay=attempt_delay,
+            max_workers=self.max_workers
+        )
+        return {cname: result.value for cname, result in zip(cnames, results)}
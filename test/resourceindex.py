@@ -0,0 +1,126 @@
+import threading
+from typing import Any, Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from app.model import CDNResource
+
+ACTIVE = 'active'
+ACL = 'acl'  # policy type of enabled ip address acl, None without acl
+EDGE_CACHE = 'edge_cache'  # None without edge cache settings, otherwise whether it is enabled
+TTL = 'ttl'  # edge cache default value, None without edge cache settings
+IGNORE_QUERY_STRING = 'ignore_query_string'  # whether query string is ignored, None without query params options
+STATIC_HEADER = 'static_header'  # name of enabled static header, one facet value per header
+
+FACETS = (ACTIVE, ACL, EDGE_CACHE, TTL, IGNORE_QUERY_STRING, STATIC_HEADER)
+
+FacetKey = Tuple[str, Hashable]
+
+
+def normalize(facet: str, value: Any) -> Hashable:
+    if facet == TTL and value is not None:
+        return str(value)  # the API keeps ttl as string
+    if facet in (ACTIVE, EDGE_CACHE, IGNORE_QUERY_STRING) and value is not None:
+        return bool(value)
+    return value
+
+
+def resource_facets(resource: CDNResource) -> Set[FacetKey]:
+    """ Normalized option facets of the resource, nested optional fields are walked once here
+    """
+
+    options = resource.options
+    edge_cache = options and options.edge_cache_settings
+    acl = options and options.ip_address_acl
+    query_params = options and options.query_params_options
+    ignore_query_string = query_params and query_params.ignore_query_string
+    static_headers = options and options.static_headers
+
+    facets = {
+        (ACTIVE, bool(resource.active)),
+        (ACL, acl.policy_type if acl and acl.enabled else None),
+        (EDGE_CACHE, edge_cache.enabled if edge_cache else None),
+        (TTL, normalize(TTL, edge_cache.default_value) if edge_cache else None),
+        (IGNORE_QUERY_STRING,
+         ignore_query_string.enabled and ignore_query_string.value if ignore_query_string else None),
+    }
+    if static_headers and static_headers.enabled:
+        facets.update((STATIC_HEADER, name) for name in static_headers.value or {})
+    return facets
+
+
+class ResourceProfileIndex:
+    """ Resources by their option facets: (facet, value) -> ids of resources having it, so selecting resources
+    with given options is an intersection of few sets. Updated resource is reindexed alone.
+    """
+
+    def __init__(self, resources: Iterable[CDNResource] = ()):
+        self._resources: Dict[str, CDNResource] = {}
+        self._positions: Dict[str, int] = {}  # selections keep the order resources were added in
+        self._facets: Dict[str, Set[FacetKey]] = {}
+        self._index: Dict[FacetKey, Set[str]] = {}
+        self._lock = threading.Lock()
+        for resource in resources:
+            self.update(resource)
+
+    @staticmethod
+    def key(resource: CDNResource) -> str:
+        return resource.id or resource.cname
+
+    def _unindex(self, resource_key: str) -> None:
+        for facet in self._facets.pop(resource_key, ()):
+            self._index[facet].discard(resource_key)
+            if not self._index[facet]:
+                del self._index[facet]
+
+    def _put(self, resource_key: str, resource: CDNResource, facets: Set[FacetKey]) -> None:
+        self._unindex(resource_key)
+        self._resources[resource_key] = resource
+        self._positions.setdefault(resource_key, len(self._positions))
+        self._facets[resource_key] = facets
+        for facet in facets:
+            self._index.setdefault(facet, set()).add(resource_key)
+
+    def _drop(self, resource_key: str) -> None:
+        self._unindex(resource_key)
+        self._resources.pop(resource_key, None)
+        self._positions.pop(resource_key, None)
+
+    def update(self, resource: CDNResource) -> None:
+        facets = resource_facets(resource)
+        with self._lock:
+            self._put(self.key(resource), resource, facets)
+
+    def remove(self, resource_key: str) -> None:
+        with self._lock:
+            self._drop(resource_key)
+
+    def on_update(self, resource_id: str, resource: Optional[CDNResource]) -> None:
+        """ Processor update listener: indexed resources are reindexed once updated and dropped once deleted.
+        Membership is checked under the lock, so a resource removed concurrently is not indexed back
+        """
+
+        facets = resource_facets(resource) if resource is not None else None
+        with self._lock:
+            if resource_id not in self._resources:
+                return
+            if resource is None:
+                self._drop(resource_id)
+            else:
+                self._put(self.key(resource), resource, facets)
+
+    def select(self, **facets: Any) -> List[CDNResource]:
+        """ Resources having all given facets values, e.g. select(active=True, acl=None, ttl=10)
+        """
+
+        if unknown := set(facets) - set(FACETS):
+            raise ValueError(f'Unknown facets: {sorted(unknown)}')
+        with self._lock:
+            keys = [(facet, normalize(facet, value)) for facet, value in facets.items()]
+            sets = sorted((self._index.get(key, set()) for key in keys), key=len)
+            selected = set.intersection(*sets) if sets else set(self._resources)
+            return [self._resources[k] for k in sorted(selected, key=self._positions.__getitem__)]
+
+    def __len__(self) -> int:
+        return len(self._resources)
+
+    def __repr__(self) -> str:
+        return f'ResourceProfileIndex(resources={len(self._resources)}, facets={len(self._index)})'
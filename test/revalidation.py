@@ -0,0 +1,106 @@
+from enum import Enum
+from typing import Dict, Optional, Tuple, List
+
+from test.samplestore import CacheStatus
+
+REVALIDATION_STATUSES = frozenset((CacheStatus.MISS, CacheStatus.REVALIDATED))
+
+
+class Verdict(str, Enum):
+    PENDING = 'pending'
+    REVALIDATED_AFTER_TTL = 'revalidated after ttl'
+    REVALIDATED_BEFORE_TTL = 'revalidated before ttl'
+    NOT_REVALIDATED = 'not revalidated during period'
+
+
+class RevalidationDetector:
+    """ Streaming TTL revalidation detector of one (resource, host) pair: takes samples one by one keeping only
+    the last MISS/REVALIDATED time and running intervals stats, so every sample costs O(1).
+    Verdict is given by the first interval between MISS/REVALIDATED and does not change afterwards.
+    """
+
+    __slots__ = ('min_interval', 'verdict', 'last_revalidation', 'intervals_count', 'intervals_sum',
+                 'interval_min', 'interval_max')
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval  # shorter interval between revalidations means revalidated before ttl
+        self.verdict = Verdict.PENDING
+        self.last_revalidation: Optional[float] = None
+        self.intervals_count = 0
+        self.intervals_sum = 0.0
+        self.interval_min = float('inf')
+        self.interval_max = 0.0
+
+    def add(self, time: float, status: CacheStatus) -> Verdict:
+        if status in REVALIDATION_STATUSES:
+            if self.last_revalidation is not None:
+                interval = time - self.last_revalidation
+                self.intervals_count += 1
+                self.intervals_sum += interval
+                self.interval_min = min(self.interval_min, interval)
+                self.interval_max = max(self.interval_max, interval)
+                if self.verdict is Verdict.PENDING:
+                    self.verdict = (
+                        Verdict.REVALIDATED_AFTER_TTL if interval > self.min_interval else Verdict.REVALIDATED_BEFORE_TTL
+                    )
+            self.last_revalidation = time
+        return self.verdict
+
+    def mark_not_revalidated(self) -> Verdict:
+        """ Cached object is known to outlive the period (e.g. by its Age) while no verdict is given yet
+        """
+
+        if self.verdict is Verdict.PENDING:
+            self.verdict = Verdict.NOT_REVALIDATED
+        return self.verdict
+
+    @property
+    def interval_mean(self) -> Optional[float]:
+        return self.intervals_sum / self.intervals_count if self.intervals_count else None
+
+    def __repr__(self) -> str:
+        return (f'RevalidationDetector(verdict={self.verdict.value}, intervals={self.intervals_count}, '
+                f'min={self.interval_min if self.intervals_count else None}, mean={self.interval_mean}, '
+                f'max={self.interval_max if self.intervals_count else None})')
+
+
+class RevalidationDetectors:
+    """ Detectors of all (resource, host) pairs created on their first sample
+    """
+
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self._detectors: Dict[Tuple[str, str], RevalidationDetector] = {}
+
+    def _get(self, resource_id: str, host: str) -> RevalidationDetector:
+        if (detector := self._detectors.get((resource_id, host))) is None:
+            detector = self._detectors[resource_id, host] = RevalidationDetector(self.min_interval)
+        return detector
+
+    def add(self, resource_id: str, host: str, time: float, status: Optional[str]) -> Verdict:
+        return self._get(resource_id, host).add(time, CacheStatus.from_header(status))
+
+    def mark_not_revalidated(self, resource_id: str, host: str) -> Verdict:
+        return self._get(resource_id, host).mark_not_revalidated()
+
+    def verdict(self, resource_id: str, host: str) -> Verdict:
+        detector = self._detectors.get((resource_id, host))
+        return detector.verdict if detector else Verdict.PENDING
+
+    def pending_pairs(self) -> List[Tuple[str, str]]:
+        return [pair for pair, detector in self._detectors.items() if detector.verdict is Verdict.PENDING]
+
+    def resource_is_decided(self, resource_id: str) -> bool:
+        """ All hosts the resource was got from have verdicts (and there was at least one)
+        """
+
+        verdicts = [detector.verdict for (r, _), detector in self._detectors.items() if r == resource_id]
+        return bool(verdicts) and Verdict.PENDING not in verdicts
+
+    def all_revalidated_after_ttl(self) -> bool:
+        return bool(self._detectors) and all(
+            detector.verdict is Verdict.REVALIDATED_AFTER_TTL for detector in self._detectors.values()
+        )
+
+    def __repr__(self) -> str:
+        return f'RevalidationDetectors({self._detectors})'
@@ -0,0 +1,131 @@
+from array import array
+from enum import IntEnum
+from itertools import chain, compress
+from operator import sub
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+class CacheStatus(IntEnum):
+    OTHER = 0
+    HIT = 1
+    MISS = 2
+    REVALIDATED = 3
+    EXPIRED = 4
+    STALE = 5
+    UPDATING = 6
+    BYPASS = 7
+
+    @classmethod
+    def from_header(cls, value: Optional[str]) -> 'CacheStatus':
+        return cls.__members__.get((value or '').upper(), cls.OTHER)
+
+
+# byte translation table: 1 for statuses meaning object was (re)fetched from origin, 0 for others
+_REVALIDATION_MASK_TABLE = bytes(int(code in (CacheStatus.MISS, CacheStatus.REVALIDATED)) for code in range(256))
+
+
+class SampleRing:
+    """ Bounded ring buffer of one (resource, host) pair samples: timestamps and cache statuses codes
+    are kept in flat arrays, the oldest samples are overwritten once capacity is reached
+    """
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.times = array('d', bytes(8 * capacity))
+        self.statuses = bytearray(capacity)
+        self.start = 0
+        self.size = 0
+
+    def append(self, time: float, status: CacheStatus) -> None:
+        index = (self.start + self.size) % self.capacity
+        self.times[index] = time
+        self.statuses[index] = status
+        if self.size < self.capacity:
+            self.size += 1
+        else:
+            self.start = (self.start + 1) % self.capacity
+
+    def _segments(self, buffer) -> Tuple[memoryview, ...]:
+        view = memoryview(buffer)
+        end = self.start + self.size
+        if end <= self.capacity:
+            return view[self.start:end],
+        return view[self.start:], view[:end - self.capacity]
+
+    def times_segments(self) -> Tuple[memoryview, ...]:
+        """ Chronologically ordered views of timestamps (slices of the ring buffer, not copies)
+        """
+        return self._segments(self.times)
+
+    def statuses_segments(self) -> Tuple[memoryview, ...]:
+        """ Chronologically ordered views of cache statuses codes (slices of the ring buffer, not copies)
+        """
+        return self._segments(self.statuses)
+
+    def revalidation_times(self) -> List[float]:
+        # mask and compress run in C: no Python level loop over samples. Statuses are copied once for translate
+        # (one byte per sample, cheaper than a per-sample lookup), timestamps are read through views without copies
+        mask = b''.join(bytes(segment).translate(_REVALIDATION_MASK_TABLE) for segment in self.statuses_segments())
+        return list(compress(chain.from_iterable(self.times_segments()), mask))
+
+    def __len__(self) -> int:
+        return self.size
+
+
+class SampleStore:
+    """ Columnar store of probes samples: resources and hosts names are interned to ids,
+    samples of every (resource, host) pair live in bounded array-backed ring buffer
+    """
+
+    def __init__(self, capacity_per_pair: int = 4096):
+        self.capacity_per_pair = capacity_per_pair
+        self._resources: Dict[str, int] = {}
+        self._hosts: Dict[str, int] = {}
+        self._resources_names: List[str] = []
+        self._hosts_names: List[str] = []
+        self._rings: Dict[Tuple[int, int], SampleRing] = {}
+
+    @staticmethod
+    def _intern(name: str, ids: Dict[str, int], names: List[str]) -> int:
+        if (name_id := ids.get(name)) is None:
+            name_id = ids[name] = len(names)
+            names.append(name)
+        return name_id
+
+    def append(self, resource_id: str, host: str, time: float, status: Optional[str]) -> SampleRing:
+        key = (
+            self._intern(resource_id, self._resources, self._resources_names),
+            self._intern(host, self._hosts, self._hosts_names)
+        )
+        if (ring := self._rings.get(key)) is None:
+            ring = self._rings[key] = SampleRing(self.capacity_per_pair)
+        ring.append(time, CacheStatus.from_header(status))
+        return ring
+
+    def ring(self, resource_id: str, host: str) -> Optional[SampleRing]:
+        if (resource_key := self._resources.get(resource_id)) is None or (host_key := self._hosts.get(host)) is None:
+            return None
+        return self._rings.get((resource_key, host_key))
+
+    def pairs(self) -> Iterator[Tuple[str, str]]:
+        for resource_key, host_key in self._rings:
+            yield self._resources_names[resource_key], self._hosts_names[host_key]
+
+    def revalidation_intervals(self) -> Dict[Tuple[str, str], List[float]]:
+        """ Intervals between consecutive MISS/REVALIDATED samples of all (resource, host) pairs at once
+        """
+
+        intervals = {}
+        for (resource_key, host_key), ring in self._rings.items():
+            times = ring.revalidation_times()
+            intervals[self._resources_names[resource_key], self._hosts_names[host_key]] = list(
+                map(sub, times[1:], times[:-1])
+            )
+        return intervals
+
+    def __len__(self) -> int:
+        return sum(len(ring) for ring in self._rings.values())
+
+    def __repr__(self) -> str:
+        return (f'SampleStore(samples={len(self)}, resources={len(self._resources_names)}, '
+                f'hosts={len(self._hosts_names)})')
@@ -0,0 +1,70 @@
+from typing import Dict, Hashable, Iterable, Optional
+
+from test.cacheage import CacheObjectEstimators, HEADERS_TIME_RESOLUTION
+
+# never probe one pair more often than that
+MIN_PROBE_INTERVAL = 0.05
+
+
+class AdaptiveProbeScheduler:
+    """ Planning probes of (resource, host) pairs around predicted expiry of their cached objects:
+    sparse during the stable part of TTL, dense inside the window around the expiry where revalidation happens.
+    Pairs with unknown expiry (no samples or no Date header yet) are probed densely.
+    Requests are counted against optional budget of the check.
+    """
+
+    def __init__(
+            self,
+            estimators: CacheObjectEstimators,
+            ttl: float,
+            ttl_error_rate: float,
+            requests_budget: Optional[int] = None,
+            sparse_interval: Optional[float] = None,
+            dense_interval: Optional[float] = None
+    ):
+        self.estimators = estimators
+        self.window = ttl * ttl_error_rate + HEADERS_TIME_RESOLUTION  # half width around predicted expiry
+        self.dense_interval = dense_interval or max(self.window / 8, MIN_PROBE_INTERVAL)
+        self.sparse_interval = sparse_interval or max(ttl / 4, self.dense_interval)
+        self.requests_budget = requests_budget
+        self.requests_used = 0
+        self._due: Dict[Hashable, float] = {}
+
+    def next_delay(self, resource_id: str, host: Optional[str], now: float) -> float:
+        """ Seconds to wait before the next probe of the pair
+        """
+
+        estimator = self.estimators.find(resource_id, host)
+        if estimator is None or (expiry := estimator.predicted_expiry()) is None:
+            return self.dense_interval
+        window_start = expiry - self.window
+        if now < window_start:
+            return max(min(self.sparse_interval, window_start - now), self.dense_interval)
+        return self.dense_interval
+
+    def schedule(self, key: Hashable, resource_id: str, host: Optional[str], now: float) -> float:
+        due = self._due[key] = now + self.next_delay(resource_id, host, now)
+        return due
+
+    def is_due(self, key: Hashable, now: float) -> bool:
+        return self._due.get(key, now) <= now
+
+    def time_to_next_due(self, keys: Iterable[Hashable], now: float) -> float:
+        return max(min((self._due.get(key, now) for key in keys), default=now) - now, 0.0)
+
+    def take(self) -> bool:
+        """ Count one request, False if budget is already spent
+        """
+
+        if self.exhausted:
+            return False
+        self.requests_used += 1
+        return True
+
+    @property
+    def exhausted(self) -> bool:
+        return self.requests_budget is not None and self.requests_used >= self.requests_budget
+
+    def __repr__(self) -> str:
+        return (f'AdaptiveProbeScheduler(requests={self.requests_used}/{self.requests_budget}, '
+                f'sparse={self.sparse_interval}, dense={self.dense_interval}, window={self.window})')
@@ -0,0 +1,83 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from pathlib import Path
+from typing import Any, Callable, List, Optional, Sequence
+
+from filelock import FileLock
+
+from test.logger import logger
+
+logging.getLogger('filelock').setLevel(logging.INFO)
+
+
+class Partition(namedtuple('Partition', 'index, count')):
+    """ Disjoint slice of items: partitions with the same count and different indexes never share an item
+    """
+
+    def take(self, items: Optional[Sequence]) -> List:
+        return list(items or [])[self.index::self.count]
+
+    def __str__(self) -> str:
+        return f'{self.index + 1}of{self.count}'
+
+
+def workers_count() -> int:
+    return int(os.environ.get('PYTEST_XDIST_WORKER_COUNT', 1))
+
+
+def current_worker() -> Partition:
+    """ Partition of xdist worker running the code (the only one without xdist)
+    """
+
+    worker_id = os.environ.get('PYTEST_XDIST_WORKER', 'gw0')
+    return Partition(int(worker_id[2:]) if worker_id.startswith('gw') else 0, workers_count())
+
+
+class SharedSessionState:
+    """ State shared by all xdist workers of one run: json files in the common directory guarded by file locks.
+    Without xdist the directory is unique for the process, so everything is done by the process itself.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self.directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+
+    @classmethod
+    def for_current_run(cls) -> 'SharedSessionState':
+        run_id = os.environ.get('PYTEST_XDIST_TESTRUNUID') or f'pid{os.getpid()}'
+        return cls(Path(tempfile.gettempdir()) / f'yccdn-qa-{run_id}')
+
+    def lock(self, name: str) -> FileLock:
+        """ Lock held by one worker of the run at a time
+        """
+
+        return FileLock(str(self.directory / f'{name}.lock'))
+
+    def run_once(self, name: str, func: Callable[[], Any]) -> Any:
+        """ Result of func called by the first worker asking for it, others wait for it and read it.
+        Result has to be json serializable, None result is not shared: next worker calls func again.
+        """
+
+        path = self.directory / f'{name}.json'
+        with self.lock(name):
+            if path.exists():
+                logger.debug(f'[{name}] is read from shared state')
+                return json.loads(path.read_text())
+            if (result := func()) is not None:
+                path.write_text(json.dumps(result))
+            return result
+
+    def read(self, name: str) -> Any:
+        """ Shared result, None if nobody has made it
+        """
+
+        path = self.directory / f'{name}.json'
+        with self.lock(name):
+            return json.loads(path.read_text()) if path.exists() else None
+
+    def remove(self) -> None:
+        shutil.rmtree(self.directory, ignore_errors=True)
@@ -4,13 +4,10 @@ import allure
 import pytest
 import requests
 
-from app.model import CDNResource
 from test.logger import logger
 from test.model import ResourcesInitializeMethod, EdgeResponseHeaders
-from test.utils import RevalidatedBeforeTTL, resource_is_active, \
-    resource_is_not_active, resource_is_active_and_no_acl_and_cache_enabled, resource_is_active_and_no_acl_and_ttl, \
-    resource_is_active_and_no_acl_and_with_ttl, http_get_status_code, repeat_until_success_or_timeout, \
-    resource_is_active_and_no_acl, http_get_request
+from test.utils import RevalidatedBeforeTTL, http_get_status_code, repeat_until_success_or_timeout, \
+    http_get_request
 from test.utils_for_test_class import UtilsForTestClass
 
 # TODO: !True ONLY FOR DEBUG! Use False for Production
@@ -38,10 +35,16 @@ class TestCDN(UtilsForTestClass):
     def teardown_class(cls):
         logger.info('\n\n--- TEARDOWN ---')
 
+        if cls.edge_health:
+            cls.edge_health.stop()
+        if cls.resource_pool:
+            cls.resource_pool.stop()
+
         if cls.initialize_type == ResourcesInitializeMethod.from_scratch:
-            logger.info('Deleting items...')
-            cls.cdn_resources_proc.delete_several_items_by_ids([resource.id for resource in cls.cdn_resources])
-            cls.origin_groups_proc.delete_item_by_id(cls.origin_group.id)
+            # resources are shared by xdist workers: deleted once all of them are finished (see conftest.py)
+            logger.info('Items are to be deleted at the end of the session')
+        elif cls.initialize_type == ResourcesInitializeMethod.from_pool:
+            logger.info('Pool resources are to be released at the end of the session')
         elif cls.initialize_type == ResourcesInitializeMethod.use_existing:
             logger.info('Resetting resources to default...')
             # TODO: RESET TO DEFAULT
@@ -70,7 +73,7 @@ class TestCDN(UtilsForTestClass):
     @allure.story('Active resource returns 200 or 403')
     @repeat_until_success_or_timeout()
     def test_active_resources(self):
-        resources_to_test = self.prepare_resources_list_to_test(resource_is_active)
+        resources_to_test = self.prepare_resources_list_to_test(active=True)
 
         for resource in resources_to_test:
             try:
@@ -84,7 +87,7 @@ class TestCDN(UtilsForTestClass):
     @allure.story('Inactive resource returns 404')
     @repeat_until_success_or_timeout()
     def test_not_active_resources(self):
-        resources_to_test = self.prepare_resources_list_to_test(resource_is_not_active)
+        resources_to_test = self.prepare_resources_list_to_test(active=False)
 
         for resource in resources_to_test:
             response_code = http_get_status_code(f'{self.protocol}://{resource.cname}')
@@ -95,13 +98,7 @@ class TestCDN(UtilsForTestClass):
     @allure.story('Resource is NOT available with ACL on')
     @repeat_until_success_or_timeout()
     def test_ip_address_acl_on(self):
-        def filter_to_test(r: CDNResource) -> bool:
-            if r.active and r.options and r.options.ip_address_acl and r.options.ip_address_acl:
-                if r.options.ip_address_acl.policy_type == 'POLICY_TYPE_ALLOW':
-                    return True
-            return False
-
-        resources_to_test = self.prepare_resources_list_to_test(filter_to_test)
+        resources_to_test = self.prepare_resources_list_to_test(active=True, acl='POLICY_TYPE_ALLOW')
         for resource in resources_to_test:
             request_code = http_get_status_code(f'{self.protocol}://{resource.cname}')
             assert request_code == 403, f'CDN resource {request_code}, should be 403'
@@ -111,7 +108,7 @@ class TestCDN(UtilsForTestClass):
     @allure.story('Resource is available without ACL')
     @repeat_until_success_or_timeout()
     def test_ip_address_acl_off(self):
-        resources_to_test = self.prepare_resources_list_to_test(resource_is_active_and_no_acl)
+        resources_to_test = self.prepare_resources_list_to_test(active=True, acl=None)
         for resource in resources_to_test:
             request_code = http_get_status_code(f'{self.protocol}://{resource.cname}')
             assert request_code != 403, f'CDN resource {request_code}, should not be 403'
@@ -120,47 +117,36 @@ class TestCDN(UtilsForTestClass):
     @allure.feature('Edge cache settings')
     @allure.story('Enabled cache revalidates after ttl')
     @repeat_until_success_or_timeout()
-    def test_edge_cache_settings_enabled_revalidate_after_ttl(self):
+    def test_edge_cache_settings_enabled_revalidate_after_ttl(self, resources_shard):
 
         resources_to_test = self.prepare_resources_list_to_test(
-            resource_is_active_and_no_acl_and_with_ttl(ttl=self.short_ttl)
+            active=True, acl=None, edge_cache=True, ttl=self.short_ttl
         )
-        assert self.method_to_curl_resources(resources=resources_to_test), 'Not all statuses were processed correctly'
+        with self.resources_of_shard(resources_shard, resources_to_test) as resources_to_test:
+            assert self.method_to_curl_resources(
+                resources=resources_to_test
+            ), 'Not all statuses were processed correctly'
 
     @pytest.mark.skipif(SKIP_TESTS, reason='FOR DEBUG ONLY - ACTIVATE FOR PRODUCTION USE')
     @allure.feature('Edge cache settings')
     @allure.story('Enabled cache does not revalidates during ttl')
     @repeat_until_success_or_timeout()
-    def test_edge_cache_settings_enabled_do_not_revalidate_within_ttl(self):
-        def filter_to_test(r: CDNResource) -> bool:
-            return all(
-                (
-                    resource_is_active_and_no_acl_and_ttl(r),
-                    r.options.edge_cache_settings.default_value == str(self.long_ttl)
-
-                )
-            )
-
-        resources_to_test = self.prepare_resources_list_to_test(filter_to_test)
+    def test_edge_cache_settings_enabled_do_not_revalidate_within_ttl(self, resources_shard):
+        resources_to_test = self.prepare_resources_list_to_test(
+            active=True, acl=None, edge_cache=True, ttl=self.long_ttl
+        )
 
-        assert not self.method_to_curl_resources(
-            resources=resources_to_test
-        ), 'Not all statuses were processed correctly'
+        with self.resources_of_shard(resources_shard, resources_to_test) as resources_to_test:
+            assert not self.method_to_curl_resources(
+                resources=resources_to_test
+            ), 'Not all statuses were processed correctly'
 
     @pytest.mark.skipif(SKIP_TESTS, reason='FOR DEBUG ONLY - ACTIVATE FOR PRODUCTION USE')
     @allure.feature('Edge cache settings')
     @allure.story('Disabled cache does not add Cache-Status header')
     @repeat_until_success_or_timeout()
     def test_edge_cache_settings_disabled(self):
-        def filter_to_test(r: CDNResource) -> bool:
-            return all(
-                (
-                    resource_is_active_and_no_acl_and_cache_enabled(r),
-                    not r.options.edge_cache_settings.enabled,
-                )
-            )
-
-        resources_to_test = self.prepare_resources_list_to_test(filter_to_test)
+        resources_to_test = self.prepare_resources_list_to_test(active=True, acl=None, edge_cache=False)
 
         logger.info(f'GET resources [{[r.cname for r in resources_to_test]}]...')
         for resource in resources_to_test:
@@ -173,58 +159,35 @@ class TestCDN(UtilsForTestClass):
     @allure.feature('Query')
     @allure.story('Ignore query params')
     @repeat_until_success_or_timeout()
-    def test_ignore_query_string(self):
-        def filter_to_test(r: CDNResource) -> bool:
-            return all(
-                (
-                    resource_is_active_and_no_acl_and_with_ttl(ttl=self.short_ttl)(resource=r),
-                    r.options.query_params_options,
-                    r.options.query_params_options.ignore_query_string,
-                    r.options.query_params_options.ignore_query_string.enabled,
-                    r.options.query_params_options.ignore_query_string.value,
-                )
-            )
-
-        resources_to_test = self.prepare_resources_list_to_test(filter_to_test)
-
-        assert self.method_to_curl_resources(resources_to_test, add_query_arg=True)
+    def test_ignore_query_string(self, resources_shard):
+        resources_to_test = self.prepare_resources_list_to_test(
+            active=True, acl=None, edge_cache=True, ttl=self.short_ttl, ignore_query_string=True
+        )
+
+        with self.resources_of_shard(resources_shard, resources_to_test) as resources_to_test:
+            assert self.method_to_curl_resources(resources_to_test, add_query_arg=True)
 
     @pytest.mark.skipif(SKIP_TESTS, reason='FOR DEBUG ONLY - ACTIVATE FOR PRODUCTION USE')
     @allure.feature('Query')
     @allure.story('Do not ignore query params')
     @repeat_until_success_or_timeout()
-    def test_do_not_ignore_query_string(self):
-        def filter_to_test(r: CDNResource) -> bool:
-            return all(
-                (
-                    resource_is_active_and_no_acl_and_ttl(r),
-                    r.options.query_params_options,
-                    r.options.query_params_options.ignore_query_string,
-                    not r.options.query_params_options.ignore_query_string.value,
-                )
-            )
-
-        resources_to_test = self.prepare_resources_list_to_test(filter_to_test)
-
-        with pytest.raises(RevalidatedBeforeTTL):
-            self.method_to_curl_resources(resources_to_test, add_query_arg=True)
+    def test_do_not_ignore_query_string(self, resources_shard):
+        resources_to_test = self.prepare_resources_list_to_test(
+            active=True, acl=None, edge_cache=True, ignore_query_string=False
+        )
+
+        with self.resources_of_shard(resources_shard, resources_to_test) as resources_to_test:
+            with pytest.raises(RevalidatedBeforeTTL):
+                self.method_to_curl_resources(resources_to_test, add_query_arg=True)
 
     @pytest.mark.skipif(SKIP_TESTS, reason='FOR DEBUG ONLY - ACTIVATE FOR PRODUCTION USE')
     @allure.feature('Client header')
     @allure.story('Client custom header is set')
     @repeat_until_success_or_timeout()
     def test_static_header_is_set(self):
-        def filter_to_test(r: CDNResource) -> bool:
-            return all(
-                (
-                    resource_is_active_and_no_acl_and_with_ttl(ttl=self.short_ttl)(resource=r),
-                    r.options.static_headers,
-                    r.options.static_headers.enabled,
-                    'param-to-test' in r.options.static_headers.value
-                )
-            )
-
-        resources_to_test = self.prepare_resources_list_to_test(filter_to_test)
+        resources_to_test = self.prepare_resources_list_to_test(
+            active=True, acl=None, edge_cache=True, ttl=self.short_ttl, static_header='param-to-test'
+        )
         logger.info(f'GET resources [{[r.cname for r in resources_to_test]}]...')
 
         for resource in resources_to_test:
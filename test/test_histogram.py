@@ -0,0 +1,50 @@
+import pytest
+
+from test.histogram import LatencyHistogram
+
+
+def histogram_of(values) -> LatencyHistogram:
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.add(value)
+    return histogram
+
+
+class TestLatencyHistogram:
+
+    def test_empty(self):
+        histogram = LatencyHistogram()
+        assert histogram.percentile(50) is None and histogram.mean is None
+        assert histogram.to_dict() == {
+            'count': 0, 'min': None, 'mean': None, 'max': None, 'p50': None, 'p90': None, 'p99': None, 'p99.9': None
+        }
+
+    def test_percentiles_are_within_relative_error(self):
+        values = [i / 1000 for i in range(1, 1001)]  # 1 ms .. 1 s
+        histogram = histogram_of(values)
+        for percentile in (50, 90, 99, 99.9):
+            exact = values[int(percentile / 100 * len(values)) - 1]
+            assert exact <= histogram.percentile(percentile) <= exact * histogram.ratio
+
+    def test_percentile_is_clamped_by_max(self):
+        histogram = histogram_of([0.0123])
+        assert histogram.percentile(99.9) == histogram.max == 0.0123
+        assert histogram.to_dict()['p50'] == 12.3
+
+    def test_values_below_min_value_share_first_bucket(self):
+        histogram = histogram_of([0, 1e-6, 1e-5])
+        assert histogram.buckets == {0: 3}
+
+    def test_merged_equals_histogram_of_all_values(self):
+        first, second = [0.001, 0.002, 0.5], [0.003, 0.004]
+        merged = LatencyHistogram.merged([histogram_of(first), histogram_of(second), LatencyHistogram()])
+        expected = histogram_of(first + second)
+        assert merged.buckets == expected.buckets
+        assert merged.to_dict() == expected.to_dict()
+
+    def test_merged_of_nothing_is_empty(self):
+        assert LatencyHistogram.merged([]).count == 0
+
+    def test_different_buckets_are_not_merged(self):
+        with pytest.raises(ValueError):
+            LatencyHistogram().merge(LatencyHistogram(ratio=1.1))
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT_PATH = Path(__file__).parent.parent
+
+# cold import of main.py takes ~15 ms, the budget leaves room for slow machines, not for heavy imports (~500 ms)
+IMPORT_TIME_BUDGET_SECONDS = 0.15
+HEAVY_MODULES = ('pydantic', 'requests', 'urllib3', 'yaml', 'pytest', 'app.model', 'test.utils')
+
+
+def run_python(code: str) -> str:
+    """ Output of the code run by a fresh interpreter, so nothing is imported yet
+    """
+
+    return subprocess.run(
+        [sys.executable, '-c', code], cwd=ROOT_PATH, capture_output=True, text=True, check=True
+    ).stdout.strip()
+
+
+class TestImportTime:
+
+    def test_cli_cold_import_time_is_within_budget(self):
+        # best of several runs: it is about the code imported, not about other load of the machine
+        import_times = [
+            float(run_python('import time; s = time.perf_counter(); import main; print(time.perf_counter() - s)'))
+            for _ in range(3)
+        ]
+        assert min(import_times) < IMPORT_TIME_BUDGET_SECONDS, \
+            f'Importing main.py takes {min(import_times):.3f}s, budget is {IMPORT_TIME_BUDGET_SECONDS}s'
+
+    def test_cli_does_not_import_heavy_modules(self):
+        imported = run_python(f'import sys, main; print(*[m for m in {HEAVY_MODULES} if m in sys.modules])')
+        assert not imported, f'Heavy modules are imported with main.py: {imported}'
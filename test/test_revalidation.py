@@ -0,0 +1,130 @@
+from email.utils import formatdate
+
+from test.cacheage import CacheObjectEstimator
+from test.model import EdgeResponseHeaders
+from test.revalidation import RevalidationDetector, RevalidationDetectors, Verdict
+from test.samplestore import CacheStatus
+
+TTL = 10
+DATE = 1_800_000_000.0
+
+
+def edge_headers(cache_status: str = 'HIT', date: float = None, age: int = None, **extra: str) -> EdgeResponseHeaders:
+    headers = {'Cache-Host': 'edge-1', 'Cache-Status': cache_status, **extra}
+    if date is not None:
+        headers['Date'] = formatdate(date, usegmt=True)
+    if age is not None:
+        headers['Age'] = str(age)
+    return EdgeResponseHeaders.model_validate(headers)
+
+
+class TestRevalidationDetector:
+
+    def test_first_revalidation_gives_no_verdict(self):
+        detector = RevalidationDetector(TTL)
+        assert detector.add(0, CacheStatus.MISS) is Verdict.PENDING
+        assert detector.add(5, CacheStatus.HIT) is Verdict.PENDING
+
+    def test_revalidation_after_interval_is_after_ttl(self):
+        detector = RevalidationDetector(TTL)
+        detector.add(0, CacheStatus.MISS)
+        detector.add(5, CacheStatus.HIT)
+        assert detector.add(TTL + 1, CacheStatus.REVALIDATED) is Verdict.REVALIDATED_AFTER_TTL
+
+    def test_revalidation_within_interval_is_before_ttl(self):
+        detector = RevalidationDetector(TTL)
+        detector.add(0, CacheStatus.MISS)
+        assert detector.add(TTL - 1, CacheStatus.MISS) is Verdict.REVALIDATED_BEFORE_TTL
+
+    def test_verdict_is_given_by_first_interval(self):
+        detector = RevalidationDetector(TTL)
+        for time in (0, TTL + 1, TTL + 2):
+            detector.add(time, CacheStatus.REVALIDATED)
+        assert detector.verdict is Verdict.REVALIDATED_AFTER_TTL
+        assert (detector.intervals_count, detector.interval_min, detector.interval_max) == (2, 1, TTL + 1)
+        assert detector.interval_mean == (TTL + 2) / 2
+
+    def test_not_revalidated_only_without_verdict(self):
+        pending = RevalidationDetector(TTL)
+        pending.add(0, CacheStatus.MISS)
+        assert pending.mark_not_revalidated() is Verdict.NOT_REVALIDATED
+        assert pending.add(1, CacheStatus.MISS) is Verdict.NOT_REVALIDATED
+
+        decided = RevalidationDetector(TTL)
+        decided.add(0, CacheStatus.MISS)
+        decided.add(1, CacheStatus.MISS)
+        assert decided.mark_not_revalidated() is Verdict.REVALIDATED_BEFORE_TTL
+
+
+class TestRevalidationDetectors:
+
+    def test_resource_is_decided_once_all_its_hosts_are(self):
+        detectors = RevalidationDetectors(TTL)
+        assert detectors.verdict('r1', 'edge-1') is Verdict.PENDING
+        assert not detectors.resource_is_decided('r1')
+
+        for host in ('edge-1', 'edge-2'):
+            detectors.add('r1', host, 0, 'miss')
+        detectors.add('r1', 'edge-1', TTL + 1, 'REVALIDATED')
+        assert detectors.pending_pairs() == [('r1', 'edge-2')]
+        assert not detectors.resource_is_decided('r1')
+
+        detectors.mark_not_revalidated('r1', 'edge-2')
+        assert detectors.resource_is_decided('r1')
+        assert not detectors.all_revalidated_after_ttl()
+
+
+class TestStoreTimeFromHeaders:
+
+    def test_stored_at_is_date_minus_age(self):
+        assert edge_headers(date=DATE, age=4).stored_at == DATE - 4
+
+    def test_stored_at_needs_both_date_and_age(self):
+        assert edge_headers(date=DATE).stored_at is None
+        assert edge_headers(age=4).stored_at is None
+        assert EdgeResponseHeaders.model_validate({'Cache-Host': 'edge-1', 'Date': 'now', 'Age': '4'}).stored_at is None
+
+    def test_freshness_lifetime(self):
+        assert edge_headers(**{'Cache-Control': 'public, max-age=60'}).freshness_lifetime == 60
+        assert edge_headers(**{'Cache-Control': 'max-age=60, s-maxage=30'}).freshness_lifetime == 30
+        expires = formatdate(DATE + 20, usegmt=True)
+        assert edge_headers(date=DATE + 5, age=5, Expires=expires).freshness_lifetime == 20
+        assert edge_headers(date=DATE, Expires=expires).freshness_lifetime is None
+        assert edge_headers(date=DATE, age=0, **{'Cache-Control': 'no-cache'}).freshness_lifetime is None
+
+    def test_estimator_reports_only_new_objects(self):
+        estimator = CacheObjectEstimator(TTL)
+        assert estimator.add(edge_headers('MISS', DATE, 0), DATE + 0.5) == DATE
+        assert estimator.predicted_expiry() == DATE + TTL + 0.5
+        assert estimator.add(edge_headers('HIT', DATE + 3, 3), DATE + 3.5) is None
+        assert estimator.add(edge_headers('HIT', DATE + 12, 1), DATE + 12.5) == DATE + 11
+        assert estimator.lifetimes == [11]
+        assert estimator.age == 1
+        assert estimator.predicted_expiry() == DATE + 11 + 11 + 0.5
+
+    def test_expiry_by_header_lifetime_before_measured_one(self):
+        estimator = CacheObjectEstimator(TTL)
+        estimator.add(edge_headers('HIT', DATE + 2, 2, **{'Cache-Control': 'max-age=30'}), DATE + 2)
+        assert estimator.lifetime == 30
+        assert estimator.predicted_expiry() == DATE + 30
+
+    def test_store_time_without_age(self):
+        estimator = CacheObjectEstimator(TTL)
+        assert estimator.add(edge_headers('HIT', DATE), DATE) is None
+        assert estimator.add(edge_headers('MISS'), DATE) is None
+        assert estimator.stored_at is None and estimator.predicted_expiry() is None
+        assert estimator.add(edge_headers('MISS', DATE + 1), DATE + 1.5) == DATE + 1  # just fetched
+
+    def test_responses_without_date_are_put_on_edge_clock(self):
+        estimator = CacheObjectEstimator(TTL)
+        assert estimator.edge_time(edge_headers(), 100.0) == 100.0
+        assert estimator.edge_time(edge_headers(date=DATE), DATE + 2) == DATE
+        assert estimator.edge_time(edge_headers(), DATE + 7) == DATE + 5
+
+    def test_store_times_give_verdict_without_seeing_revalidation(self):
+        # both responses are HIT, Age tells the object was stored again after ttl
+        estimator, detector = CacheObjectEstimator(TTL), RevalidationDetector(TTL)
+        for date, age in ((DATE + 5, 5), (DATE + 13, 2)):
+            if (stored_at := estimator.add(edge_headers('HIT', date, age), date)) is not None:
+                detector.add(stored_at, CacheStatus.REVALIDATED)
+        assert detector.verdict is Verdict.REVALIDATED_AFTER_TTL
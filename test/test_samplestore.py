@@ -0,0 +1,56 @@
+from test.samplestore import CacheStatus, SampleRing, SampleStore
+
+
+def ring_of(capacity: int, samples) -> SampleRing:
+    ring = SampleRing(capacity)
+    for time, status in samples:
+        ring.append(time, status)
+    return ring
+
+
+class TestCacheStatus:
+
+    def test_from_header(self):
+        assert CacheStatus.from_header('hit') is CacheStatus.HIT
+        assert CacheStatus.from_header('REVALIDATED') is CacheStatus.REVALIDATED
+        assert CacheStatus.from_header('unknown') is CacheStatus.OTHER
+        assert CacheStatus.from_header(None) is CacheStatus.OTHER
+
+
+class TestSampleRing:
+
+    def test_segments_before_wrap(self):
+        ring = ring_of(4, [(1, CacheStatus.MISS), (2, CacheStatus.HIT)])
+        assert len(ring) == 2
+        assert [list(segment) for segment in ring.times_segments()] == [[1, 2]]
+        assert [bytes(segment) for segment in ring.statuses_segments()] == [bytes((CacheStatus.MISS, CacheStatus.HIT))]
+
+    def test_oldest_samples_are_overwritten(self):
+        ring = ring_of(3, [(time, CacheStatus.HIT) for time in range(1, 6)])
+        assert len(ring) == 3
+        assert [list(segment) for segment in ring.times_segments()] == [[3], [4, 5]]
+
+    def test_revalidation_times_are_chronological_after_wrap(self):
+        statuses = [CacheStatus.MISS, CacheStatus.HIT, CacheStatus.REVALIDATED, CacheStatus.EXPIRED, CacheStatus.MISS]
+        ring = ring_of(4, enumerate(statuses))
+        assert ring.revalidation_times() == [2, 4]
+
+
+class TestSampleStore:
+
+    def test_revalidation_intervals_per_pair(self):
+        store = SampleStore(capacity_per_pair=8)
+        for time, status in ((0, 'MISS'), (3, 'HIT'), (10, 'REVALIDATED'), (25, 'MISS')):
+            store.append('r1', 'edge-1', time, status)
+        store.append('r1', 'edge-2', 1, 'MISS')
+
+        assert sorted(store.pairs()) == [('r1', 'edge-1'), ('r1', 'edge-2')]
+        assert store.revalidation_intervals() == {('r1', 'edge-1'): [10, 15], ('r1', 'edge-2'): []}
+        assert len(store) == 5
+
+    def test_unknown_pair_has_no_ring(self):
+        store = SampleStore()
+        store.append('r1', 'edge-1', 0, 'HIT')
+        assert store.ring('r1', 'edge-2') is None
+        assert store.ring('r2', 'edge-1') is None
+        assert len(store.ring('r1', 'edge-1')) == 1
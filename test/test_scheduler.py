@@ -0,0 +1,62 @@
+from email.utils import formatdate
+
+from test.cacheage import CacheObjectEstimators
+from test.model import EdgeResponseHeaders
+from test.scheduler import AdaptiveProbeScheduler
+
+TTL = 10
+TTL_ERROR_RATE = 0.1
+DATE = 1_800_000_000.0
+LATENCY = 0.5
+
+
+def make_scheduler(**kwargs) -> AdaptiveProbeScheduler:
+    return AdaptiveProbeScheduler(CacheObjectEstimators(TTL), TTL, TTL_ERROR_RATE, **kwargs)
+
+
+def add_stored_object(scheduler: AdaptiveProbeScheduler, stored_at: float) -> None:
+    headers = EdgeResponseHeaders.model_validate(
+        {'Cache-Host': 'edge-1', 'Cache-Status': 'MISS', 'Date': formatdate(stored_at, usegmt=True), 'Age': '0'}
+    )
+    scheduler.estimators.get('r1', 'edge-1').add(headers, stored_at + LATENCY)
+
+
+class TestAdaptiveProbeScheduler:
+
+    def test_intervals(self):
+        scheduler = make_scheduler()
+        assert scheduler.window == TTL * TTL_ERROR_RATE + 1
+        assert scheduler.dense_interval == scheduler.window / 8
+        assert scheduler.sparse_interval == TTL / 4
+
+    def test_unknown_expiry_is_probed_densely(self):
+        scheduler = make_scheduler()
+        assert scheduler.next_delay('r1', 'edge-1', DATE) == scheduler.dense_interval
+
+    def test_probes_are_sparse_until_expiry_window(self):
+        scheduler = make_scheduler()
+        add_stored_object(scheduler, DATE)
+        window_start = DATE + TTL + LATENCY - scheduler.window
+
+        assert scheduler.next_delay('r1', 'edge-1', DATE + 1) == scheduler.sparse_interval
+        assert scheduler.next_delay('r1', 'edge-1', window_start - 1) == 1
+        assert scheduler.next_delay('r1', 'edge-1', window_start - 0.01) == scheduler.dense_interval
+        assert scheduler.next_delay('r1', 'edge-1', window_start + 1) == scheduler.dense_interval
+
+    def test_due_pairs(self):
+        scheduler = make_scheduler()
+        pairs = [('r1', 'edge-1'), ('r1', 'edge-2')]
+        assert scheduler.is_due(pairs[0], DATE)
+
+        due = scheduler.schedule(pairs[0], *pairs[0], DATE)
+        assert due == DATE + scheduler.dense_interval
+        assert not scheduler.is_due(pairs[0], DATE)
+        assert scheduler.is_due(pairs[0], due)
+        assert scheduler.time_to_next_due(pairs, DATE) == 0
+        assert scheduler.time_to_next_due(pairs[:1], DATE) == scheduler.dense_interval
+
+    def test_requests_budget(self):
+        scheduler = make_scheduler(requests_budget=2)
+        assert [scheduler.take() for _ in range(3)] == [True, True, False]
+        assert scheduler.exhausted and scheduler.requests_used == 2
+        assert not make_scheduler().exhausted
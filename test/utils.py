@@ -1,15 +1,14 @@
-import time
 from functools import wraps
 from typing import Callable, Any, Optional, Dict
 
-import pytest
 import requests
 from requests.exceptions import ReadTimeout
 from enum import Enum
 from urllib3.exceptions import MaxRetryError, NameResolutionError, ProtocolError
 
 
-from app.model import CDNResource
+from app.utils import FIRST_RETRY_DELAY
+from app.waiter import wait_for
 from test.logger import logger
 
 
@@ -18,47 +17,6 @@ class RevalidatedBeforeTTL(Exception): ...
 class ResourceIsNotEqualToExisting(Exception): ...
 
 
-def resource_is_active(resource: CDNResource) -> bool:
-    return resource.active
-
-def resource_is_not_active(resource: CDNResource) -> bool:
-    return not resource_is_active(resource)
-
-def resource_is_active_and_no_acl(resource: CDNResource) -> bool:
-    return all(
-        (
-            resource_is_active(resource),
-            resource.options,
-            not resource.options.ip_address_acl or not resource.options.ip_address_acl.enabled,
-        )
-    )
-
-def resource_is_active_and_no_acl_and_cache_enabled(resource: CDNResource) -> bool:
-    return all(
-        (
-            resource_is_active_and_no_acl(resource),
-            resource.options.edge_cache_settings,
-        )
-    )
-
-def resource_is_active_and_no_acl_and_ttl(resource: CDNResource) -> bool:
-    return all(
-        (
-            resource_is_active_and_no_acl_and_cache_enabled(resource),
-            resource.options.edge_cache_settings.enabled,
-        )
-    )
-
-def resource_is_active_and_no_acl_and_with_ttl(ttl: int) -> Callable:
-    def func(resource: CDNResource):
-        return all(
-            (
-                resource_is_active_and_no_acl_and_ttl(resource),
-                resource.options.edge_cache_settings.default_value == str(ttl)
-            )
-        )
-    return func
-
 def http_get_request(
     url: str,
     verify: Optional[bool] = False,
@@ -93,19 +51,27 @@ def http_get_status_code(url: str) -> int:
     return response.status_code
 
 def repeat_until_success_or_timeout(attempts: int = 20, attempt_delay: int = 15):
+    """ Repeat test until it passes: pauses after failures grow from short ones up to attempt_delay.
+    Test is not failed before attempts - 1 pauses of attempt_delay (285 seconds by default), as with fixed pauses
+    """
+
     def decorator(func: Callable):
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            for i in range(attempts):
-                logger.debug(f'Attempt #{i + 1} of {attempts}...')
-                try:
-                    res = func(*args, **kwargs)
-                    return res
-                except (AssertionError, ResourceIsNotEqualToExisting, RevalidatedBeforeTTL, ReadTimeout) as e:
-                    logger.debug(f'...failed. Error: [{e}]. Sleeping for {attempt_delay} seconds...')
-                    if i < attempts - 1:
-                        time.sleep(attempt_delay)
-            pytest.fail('All attempts failed.')
+            result = wait_for(
+                func.__qualname__,
+                lambda: func(*args, **kwargs),
+                initial_delay=min(FIRST_RETRY_DELAY, attempt_delay),
+                max_delay=attempt_delay,
+                attempts=attempts,
+                min_elapsed=(attempts - 1) * attempt_delay,
+                is_success=lambda _: True,
+                exceptions=(AssertionError, ResourceIsNotEqualToExisting, RevalidatedBeforeTTL, ReadTimeout)
+            )
+            if not result.success:
+                import pytest  # test helpers are used by CLI as well, which does not need pytest otherwise
+                pytest.fail(f'All attempts failed. Last error: [{result.error}]')
+            return result.value
         return wrapper
     return decorator
 
@@ -113,24 +79,21 @@ def repeat_for_period_ot_time_or_until_fail(
         attempts_needed_to_succeed: int = 5,
         success_attempt_delay: int = 1,
         tries_if_fail: int = 2):
+    """ True once func is true for attempts_needed_to_succeed checks in a row, False after tries_if_fail failures
+    """
+
     def decorator(func: Callable):
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> bool:
-            for _ in range(tries_if_fail):
-                res = None
-                for i in range(attempts_needed_to_succeed):
-                    logger.debug(f'Attempt #{i + 1} of {attempts_needed_to_succeed}...')
-                    res = func(*args, **kwargs)
-                    if not res:
-                        break
-                    logger.debug(f'...OK. Sleeping for {success_attempt_delay} seconds...')
-                    if i < attempts_needed_to_succeed - 1:
-                        time.sleep(success_attempt_delay)
-                if not res:
-                    continue
-                else:
-                    return True
-            return False
+            return wait_for(
+                func.__qualname__,
+                lambda: func(*args, **kwargs),
+                initial_delay=FIRST_RETRY_DELAY,
+                max_delay=max(success_attempt_delay, FIRST_RETRY_DELAY),
+                hold=attempts_needed_to_succeed,
+                hold_interval=success_attempt_delay,
+                max_failures=tries_if_fail
+            ).success
         return wrapper
     return decorator
 
@@ -1,30 +1,49 @@
+import json
 import os
-import time
-from copy import deepcopy
-from typing import List, Callable
-
+import socket
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from typing import List, Callable, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import allure
 import pytest
 import requests
 import yaml
 
 
+from app import clock
 from app.authorization import Authorization
 from app.model import ItemType, APIFolder, EdgeCacheSettings, QueryParamsOptions, EnabledBoolValueBool, \
     EnabledBoolValueDictStrStr
 from app.model import OriginGroup, Origin, IpAddressAcl, CDNResource
 from app.origingroup import OriginGroupsAPIProcessor
 from app.resource import ResourcesAPIProcessor
-from app.utils import ping, http_get_request_through_ip_address, increment, make_random_8_symbols
+from app.teardown import TeardownScheduler
+from app.edgeclient import http_get_request_through_ip_address, edge_clients
+from app.edgehealth import EdgeHealthMonitor
+from app.resolver import dns_cache
+from app.utils import FIRST_RETRY_DELAY, increment, make_random_8_symbols
+from app.waiter import Condition, wait_for_all
 from test.logger import logger
-from test.model import Config, RequestsType, ResourcesInitializeMethod, HostResponse, EdgeResponseHeaders, Resources
-from test.utils import RevalidatedBeforeTTL, ResourceIsNotEqualToExisting, get_connection_error_type, \
-    ConnectionErrorType, repeat_until_success_or_timeout, http_get_status_code, repeat_for_period_ot_time_or_until_fail, http_get_request
+from test.cacheage import CacheObjectEstimators
+from test.model import Config, RequestsType, ResourcesInitializeMethod, HostResponse, EdgeResponseHeaders, Resources, \
+    EdgeCacheHost
+from test.origins import OriginProber, origin_targets
+from test.pool import PoolLeases, PoolResource, ResourcePool
+from test.profiler import profiler
+from test.prober import AsyncEdgeProber, ProbeTarget, ProbeSample
+from test.readiness import CnameReadinessChecker
+from test.resourceindex import ResourceProfileIndex
+from test.revalidation import RevalidationDetector, RevalidationDetectors, Verdict
+from test.samplestore import SampleStore, CacheStatus
+from test.scheduler import AdaptiveProbeScheduler
+from test.sharding import Partition, SharedSessionState, current_worker
+from test.utils import RevalidatedBeforeTTL, ResourceIsNotEqualToExisting, repeat_until_success_or_timeout
 
 OAUTH = os.environ['OAUTH']
 
-# TODO: !True ONLY FOR DEBUG! Use False for Production
-SKIP_PING_EDGED = True
-
 
 class UtilsForTestClass:
     @classmethod
@@ -33,9 +52,14 @@ class UtilsForTestClass:
             config_dict = yaml.safe_load(fp)
         cls.config = Config.model_validate(config_dict)
 
+        # xdist workers of the run share token and created resources
+        cls.shared_state = SharedSessionState.for_current_run()
+        cls.worker = current_worker()
+
         # Yandex Cloud API parameters
         cls.iam_token_url = cls.config.yandex_cloud_api.iam_token_url
         cls.api_url = cls.config.yandex_cloud_api.api_url
+        profiler.add_api_urls(cls.iam_token_url, cls.api_url)
 
         # API test settings
         # --- Setup initialize resources check settings
@@ -51,6 +75,14 @@ class UtilsForTestClass:
         cls.periods_to_test = cls.config.api_test_parameters.edge_curl_settings.periods_to_test
         cls.finish_once_success = cls.config.api_test_parameters.edge_curl_settings.finish_once_success
         cls.curl_method = cls.config.api_test_parameters.edge_curl_settings.requests_type
+        cls.max_in_flight = cls.config.api_test_parameters.edge_curl_settings.max_in_flight
+        cls.max_in_flight_per_host = cls.config.api_test_parameters.edge_curl_settings.max_in_flight_per_host
+        cls.requests_budget = cls.config.api_test_parameters.edge_curl_settings.requests_budget
+        cls.verify_tls = cls.config.api_test_parameters.edge_curl_settings.verify_tls
+        # --- Edge health settings
+        cls.edge_health_settings = cls.config.api_test_parameters.edge_health_settings
+        # --- Origin probe settings
+        cls.origin_probe_settings = cls.config.api_test_parameters.origin_probe_settings
         # --- Client headers settings
         cls.custom_header_value = cls.config.api_test_parameters.client_headers_settings.custom_header_value
         cls.use_random_headers = cls.config.api_test_parameters.client_headers_settings.use_random_headers
@@ -65,38 +97,83 @@ class UtilsForTestClass:
         cls.origin_group_name = cls.config.resources.origin_group_name
         cls.cdn_resources = cls.config.resources.cdn_resources
         cls.edge_cache_hosts = cls.config.resources.edge_cache_hosts
+        cls.pool_settings = cls.config.resources.pool
+        cls.resource_pool = None
+        if cls.config.resources.discover_edge_cache_hosts:
+            cls.edge_cache_hosts = cls.discover_edge_cache_hosts()
+
+        cls.edge_health = None
+        if cls.edge_health_settings.enabled and cls.edge_cache_hosts:
+            # edges are checked in the background while the rest of setup goes on
+            cls.edge_health = EdgeHealthMonitor(
+                hosts=[edge_host.ip_address for edge_host in cls.edge_cache_hosts],
+                port=443 if cls.protocol == 'https' else 80,
+                use_icmp=cls.edge_health_settings.use_icmp,
+                timeout=cls.edge_health_settings.timeout,
+                interval=cls.edge_health_settings.interval
+            )
+            cls.edge_health.start()
 
         if cls.curl_method == RequestsType.targeted:
             cls.method_to_curl_resources = cls.targeted_http_curl_resources
+        elif cls.curl_method == RequestsType.concurrent:
+            cls.method_to_curl_resources = cls.concurrently_curl_resources
         else:
             cls.method_to_curl_resources = cls.randomly_curl_resources
         cls.custom_header = make_random_8_symbols() if cls.use_random_headers else cls.custom_header_value
 
     @classmethod
     def init_iam_token(cls) -> None:
-        authorization = Authorization(oauth=OAUTH, iam_token_url=cls.iam_token_url)
-        if not (token := authorization.get_token()):
+        # every xdist worker gets its own token, so it is never written to the shared state
+        token = Authorization(oauth=OAUTH, iam_token_url=cls.iam_token_url).get_token()
+        if not token:
             pytest.fail('Error while getting token.')
         cls.token = token
 
+    @staticmethod
+    def make_api_processors(
+            api_url: str,
+            folder_id: str,
+            token: str
+    ) -> Tuple[ResourcesAPIProcessor, OriginGroupsAPIProcessor]:
+        resources_processor = ResourcesAPIProcessor(
+            item_type=ItemType.CDN_RESOURCE,
+            api_url=api_url,
+            api_endpoint=APIFolder.CDN_RESOURCE,
+            folder_id=folder_id,
+            api_token=token
+        )
+        origin_groups_processor = OriginGroupsAPIProcessor(
+            item_type=ItemType.ORIGIN_GROUP,
+            api_url=api_url,
+            api_endpoint=APIFolder.ORIGIN_GROUP,
+            folder_id=folder_id,
+            api_token=token
+        )
+        return resources_processor, origin_groups_processor
+
     @classmethod
     def init_resources_processors(cls):
 
-        cls.cdn_resources_proc = ResourcesAPIProcessor(
-            item_type=ItemType.CDN_RESOURCE,
-            api_url=cls.api_url,
-            api_endpoint=APIFolder.CDN_RESOURCE,
-            folder_id=cls.folder_id,
-            api_token=cls.token
+        cls.cdn_resources_proc, cls.origin_groups_proc = cls.make_api_processors(
+            cls.api_url, cls.folder_id, cls.token
         )
 
         if cls.initialize_type == ResourcesInitializeMethod.from_scratch:
-            cls.origin_groups_proc = OriginGroupsAPIProcessor(
-                entity_name=ItemType.ORIGIN_GROUP,
-                api_url=cls.api_url,
-                api_entity=APIFolder.ORIGIN_GROUP,
-                folder_id=cls.folder_id,
-                token=cls.token
+            cls.teardown_scheduler = TeardownScheduler(
+                resources_processor=cls.cdn_resources_proc,
+                origin_groups_processor=cls.origin_groups_proc
+            )
+        elif cls.initialize_type == ResourcesInitializeMethod.from_pool:
+            if not cls.pool_settings:
+                pytest.fail('Resources pool settings are absent')
+            cls.resource_pool = ResourcePool(
+                resources_processor=cls.cdn_resources_proc,
+                leases=PoolLeases(Path(cls.pool_settings.state_path), lease_ttl=cls.pool_settings.lease_ttl),
+                origin_group_id=cls.origin.origin_group_id,
+                cnames=cls.pool_settings.cnames,
+                size=cls.pool_settings.size,
+                refill_interval=cls.pool_settings.refill_interval
             )
 
     @classmethod
@@ -106,16 +183,120 @@ class UtilsForTestClass:
             cls.init_resources_from_existing()
         elif cls.initialize_type == ResourcesInitializeMethod.update_existing:
             ...
-        else:  # from scratch
-            cls.cdn_resources_proc.delete_all_items()
-            cls.origin_groups_proc.delete_all_items()
-            cls.init_new_resources()
+        elif cls.initialize_type == ResourcesInitializeMethod.from_pool:
+            cls.init_resources_from_pool()
+        else:  # from scratch: the first xdist worker cleans folder and creates resources for all of them
+            new_resources = cls.shared_state.run_once('new_resources', cls.init_new_resources_once)
+            cls.origin_group = OriginGroup.model_validate(new_resources['origin_group'])
+            cls.cdn_resources = [CDNResource.model_validate(resource) for resource in new_resources['cdn_resources']]
+        cls.init_resources_index()
         logger.info('...OK')
 
+    @classmethod
+    def init_resources_index(cls) -> None:
+        # resources of tests are selected by their options, index follows updates made through the processor
+        cls.resources_index = ResourceProfileIndex(cls.cdn_resources)
+        cls.cdn_resources_proc.add_update_listener(cls.resources_index.on_update)
+
+    @classmethod
+    def init_new_resources_once(cls) -> dict:
+        cls.teardown_scheduler.teardown()
+        cls.init_new_resources()
+        return {
+            'iam_token_url': cls.iam_token_url,
+            'api_url': cls.api_url,
+            'folder_id': cls.folder_id,
+            'origin_group': cls.origin_group.model_dump(mode='json', by_alias=True),
+            'cdn_resources': [resource.model_dump(mode='json', by_alias=True) for resource in cls.cdn_resources],
+        }
+
+    @classmethod
+    def init_resources_from_pool(cls) -> None:
+        """ Lease pool resources once per run (xdist workers share the lease) and make tests options of them,
+        the first worker keeps the pool refilled and the lease renewed in the background
+        """
+
+        if not (lease := cls.shared_state.run_once('pool_lease', cls.lease_pool_resources_once)):
+            pytest.fail('Not enough free resources in the pool')
+        cls.cdn_resources = [PoolResource.model_validate(resource) for resource in lease['cdn_resources']]
+        cls.custom_header = lease['custom_header']
+        cls.make_resources_with_tests_options()
+        if cls.worker.index == 0:
+            cls.resource_pool.start_refill(owner=lease['owner'])
+
+    @classmethod
+    def lease_pool_resources_once(cls) -> Optional[dict]:
+        cls.resource_pool.refill()  # cold pool gets its resources, nothing to do for a warm one
+        owner = f'{socket.gethostname()}:{cls.shared_state.directory.name}'
+        if not (leased := cls.resource_pool.leases.lease(cls.pool_settings.lease_size, owner)):
+            return None
+
+        # lease is given back on any failure, otherwise nobody releases it until it expires
+        try:
+            cls.cdn_resources = leased
+            cls.make_resources_with_tests_options()
+            if not cls.resource_pool.reset(cls.cdn_resources) or not cls.all_cdn_resources_are_equal_to_existing():
+                pytest.fail('Pool resources are not reset to tests options')
+        except BaseException:
+            cls.resource_pool.leases.release(owner)
+            raise
+        return {
+            'state_path': str(cls.resource_pool.leases.state_path),
+            'owner': owner,
+            'custom_header': cls.custom_header,
+            'cdn_resources': [resource.model_dump() for resource in leased],
+        }
+
+    @classmethod
+    def delete_shared_new_resources(cls, state: SharedSessionState) -> None:
+        """ Global cleanup of resources created once for all xdist workers, to be done after all of them finished
+        """
+
+        if not (new_resources := state.read('new_resources')):
+            return
+        if not (token := Authorization(oauth=OAUTH, iam_token_url=new_resources['iam_token_url']).get_token()):
+            logger.error(f'Error while getting token, resources {new_resources["cdn_resources"]} are not deleted')
+            return
+
+        logger.info('Deleting items...')
+        resources_processor, origin_groups_processor = cls.make_api_processors(
+            new_resources['api_url'], new_resources['folder_id'], token
+        )
+        TeardownScheduler(resources_processor, origin_groups_processor).teardown(
+            resources_ids=[resource['id'] for resource in new_resources['cdn_resources']],
+            origin_groups_ids=[new_resources['origin_group']['id']]
+        )
+        logger.info('...OK')
+
+    @classmethod
+    @contextmanager
+    def resources_of_shard(cls, shard: Partition, resources: List[CDNResource]) -> Iterator[List[CDNResource]]:
+        """ Resources probed by one shard of TTL check. All resources of the run are split between shards
+        by their position, so shards with different indexes never probe the same (resource, edge) caches whatever
+        tests they belong to. Shards with the same index of different tests may select the same resources,
+        so they are probed by one xdist worker at a time.
+        """
+
+        owned = {ResourceProfileIndex.key(resource) for resource in shard.take(cls.cdn_resources)}
+        if not (resources := [r for r in resources if ResourceProfileIndex.key(r) in owned]):
+            pytest.skip(f'No resources left for shard {shard}')
+        with cls.shared_state.lock(f'resources_shard_{shard}'):
+            yield resources
+
     @classmethod
     def init_resources_from_existing(cls):
         #TODO: make resources from yaml and then compare them with what really in Cloud are
 
+        cls.make_resources_with_tests_options()
+
+        if cls.initialize_type in (ResourcesInitializeMethod.update_existing, ResourcesInitializeMethod.from_scratch):
+            for resource in cls.cdn_resources:
+                cls.cdn_resources_proc.update(resource)
+            if not cls.all_cdn_resources_are_equal_to_existing():
+                pytest.fail('CDN resources are not equal to existing')
+
+    @classmethod
+    def make_resources_with_tests_options(cls):
         cdn_resources = []
         for cdn_resource in cls.cdn_resources:
             resource = cls.cdn_resources_proc.make_default_cdn_resource(
@@ -140,12 +321,6 @@ class UtilsForTestClass:
             policy_type='POLICY_TYPE_ALLOW'
         )
 
-        if cls.initialize_type in (ResourcesInitializeMethod.update_existing, ResourcesInitializeMethod.from_scratch):
-            for resource in cls.cdn_resources:
-                cls.cdn_resources_proc.update(resource)
-            if not cls.all_cdn_resources_are_equal_to_existing():
-                pytest.fail('CDN resources are not equal to existing')
-
     @classmethod
     def init_new_resources(cls):
 
@@ -172,30 +347,96 @@ class UtilsForTestClass:
 
 
 
+    @classmethod
+    def discover_edge_cache_hosts(cls) -> List[EdgeCacheHost]:
+        """ Configured edge cache hosts and edges cdn resources cnames resolve to (named by ip addresses)
+        """
+
+        edge_cache_hosts = list(cls.edge_cache_hosts or [])
+        known_ips = {edge_host.ip_address for edge_host in edge_cache_hosts}
+        cnames = [urlsplit(f'//{resource.cname}').hostname for resource in cls.cdn_resources]
+
+        logger.info(f'Discovering edges of cnames {cnames}...')
+        for cname, ip_addresses in dns_cache.resolve_all(cnames).items():
+            for ip_address in ip_addresses:
+                if ip_address not in known_ips:
+                    known_ips.add(ip_address)
+                    edge_cache_hosts.append(EdgeCacheHost(url=ip_address, ip_address=ip_address))
+        logger.info(f'...OK: {len(edge_cache_hosts) - len(cls.edge_cache_hosts or [])} edges discovered')
+
+        return edge_cache_hosts
+
+    @classmethod
+    def configured_origin_groups(cls) -> List[OriginGroup]:
+        """ Existing origin groups of config: the one with configured id and ones named as configured.
+        from_scratch run creates its group later, its origin is the origin domain checked anyway
+        """
+
+        if cls.initialize_type == ResourcesInitializeMethod.from_scratch:
+            return []
+
+        origin_groups = {}
+        if cls.origin.origin_group_id:
+            if origin_group := cls.origin_groups_proc.get_origin_group_by_id(cls.origin.origin_group_id):
+                origin_groups[origin_group.id] = origin_group
+            else:
+                logger.warning(f'Origin group [{cls.origin.origin_group_id}] is not found')
+        if cls.origin_group_name:
+            for origin_group in cls.origin_groups_proc.get_origin_groups_list() or []:
+                if origin_group.name == cls.origin_group_name:
+                    origin_groups.setdefault(origin_group.id, origin_group)
+        return list(origin_groups.values())
+
     @classmethod
     def check_origin_is_200(cls) -> None:
+        """ All origins of configured origin groups and origin domain are sampled at once: every primary origin
+        has to respond 200 to min_success_ratio of requests, status, TTFB and throughput of each are reported
+        """
+
         logger.info('Checking origins 200...')
 
-        request_status_code = http_get_status_code(url=f'{cls.protocol}://{cls.origin_domain}')
-        if request_status_code != 200:
-            pytest.fail('Origin is not available')
+        settings = cls.origin_probe_settings
+        prober = OriginProber(
+            origin_targets(cls.configured_origin_groups(), [cls.origin_domain]),
+            protocol=cls.protocol,
+            path=settings.path,
+            window=settings.window,
+            interval=settings.interval,
+            timeout=settings.timeout
+        )
+        cls.origins_report = prober.run()
+        logger.debug(f'origins: {cls.origins_report}')
+        allure.attach(
+            json.dumps(cls.origins_report, indent=2), name='Origins', attachment_type=allure.attachment_type.JSON
+        )
+
+        # single failed request of the window does not fail setup, the report keeps strict stats
+        if failed_backups := [target.source for target in prober.failed(include_backup=True) if target.backup]:
+            logger.warning(f'Backup origins are not available: {failed_backups}')
+        if failed := prober.failed(settings.min_success_ratio):
+            pytest.fail(f'Origins are not available: {[target.source for target in failed]}')
 
         logger.info('...OK')
 
     @classmethod
     def ping_edges(cls) -> None:
 
-        if not SKIP_PING_EDGED and cls.edge_cache_hosts:
-            ping_fail_edges = []
-
-            logger.info('Pinging edges...')
-            for edge_host_url in cls.edge_cache_hosts:
-                # TODO: make attempts a parametr at config
-                if not ping(edge_host_url.url, attempts=2):
-                    ping_fail_edges.append(edge_host_url.url)
-
-            if ping_fail_edges:
-                pytest.fail(f'Edges are not pinged successfully: {ping_fail_edges}')
+        if cls.edge_health:
+            logger.info('Checking edges health...')
+            settings = cls.edge_health_settings
+            # first background round is usually finished by now, otherwise wait for it: edges are judged after it
+            cls.edge_health.wait_checked()
+            logger.debug(f'edges health: {cls.edge_health.snapshot()}')
+
+            unchecked_ips = set(cls.edge_health.unchecked())
+            if unchecked_edges := [edge_host.url for edge_host in cls.edge_cache_hosts
+                                   if edge_host.ip_address in unchecked_ips]:
+                logger.warning(f'Edges health is unknown, they are not checked yet: {unchecked_edges}')
+            unhealthy_ips = set(cls.edge_health.unhealthy(settings.max_loss))
+            if unhealthy_edges := [edge_host.url for edge_host in cls.edge_cache_hosts
+                                   if edge_host.ip_address in unhealthy_ips]:
+                pytest.fail(f'Edges are not reachable: {unhealthy_edges}')
+            logger.info('...OK')
 
     @classmethod
     def cdn_resource_is_equal_to_existing(cls, cdn_resource: CDNResource) -> None:
@@ -220,12 +461,11 @@ class UtilsForTestClass:
             finish_once_success = cls.finish_once_success
 
         time_to_test = periods_count * period_of_time
-        start_time = time.time()
+        start_time = clock.time()
 
         return period_of_time, finish_once_success, time_to_test, start_time
 
-    # TODO: make random check but with return once success
-    # TODO: make async otherwise too few requests and needs too many periods_count (such as 5) to assert successfully
+    # NB! too few requests to assert successfully with few periods_count: use concurrently_curl_resources
     # NB! better use targeted requests to specific cache hosts
     @classmethod
     def randomly_curl_resources(
@@ -235,217 +475,360 @@ class UtilsForTestClass:
             period_of_time: int = None,
             periods_count: int = None,
             add_query_arg: bool = False,
-            finish_once_success: bool = None
+            finish_once_success: bool = None,
+            edge_cache_hosts: List[EdgeCacheHost] = None
     ) -> bool:
 
         if protocol is None:
             protocol = cls.protocol
 
-        resources_statuses = {}
+        samples = SampleStore()
         query_generator = increment()
         period_of_time, finish_once_success, time_to_test, start_time = cls.init_parameters_for_curl(
             period_of_time, periods_count, finish_once_success
         )
-
-        with requests.session() as requests_session:
-            logger.info(f'GET resources [{[r.cname for r in resources]}] for {time_to_test} seconds...')
-            while time.time() < start_time + time_to_test:
-                for resource in resources:
-                    url = f'{protocol}://{resource.cname}'
-                    if add_query_arg:
-                        url += '?foo=' + str(next(query_generator))
-                    response = http_get_request(url, timeout=5, session=requests_session)
-                    response_headers = EdgeResponseHeaders(**response.headers)
+        detectors = cls.make_revalidation_detectors(period_of_time)
+        estimators = CacheObjectEstimators(ttl=period_of_time)
+        scheduler = cls.make_probe_scheduler(estimators, period_of_time)
+        resources_to_curl = list(resources)
+
+        logger.info(f'GET resources [{[r.cname for r in resources]}] for {time_to_test} seconds...')
+        while resources_to_curl and clock.time() < start_time + time_to_test and not scheduler.exhausted:
+            for resource in list(resources_to_curl):
+                if not scheduler.is_due(resource.id, clock.time()) or not scheduler.take():
+                    continue
+                url = f'{protocol}://{resource.cname}'
+                if add_query_arg:
+                    url += '?foo=' + str(next(query_generator))
+                # edges are chosen by cname cached addresses rotation, no DNS lookup per request
+                logger.debug(f'GET {url}...')
+                response = edge_clients.get_resolved(url, verify=cls.verify_tls, timeout=5)
+                response_headers = EdgeResponseHeaders(**response.headers)
+                logger.debug(response_headers)
+                if not response_headers.cache_status:
                     logger.debug(response_headers)
-                    if not response_headers.cache_status:
-                        logger.debug(response_headers)
-                        pytest.fail('Cache-Status header is absent')
-                    host_response = HostResponse(time=time.time(), status=response_headers.cache_status)
-                    resources_statuses.setdefault(
-                        resource.id,
-                        {response_headers.cache_host: []}
-                    ).setdefault(response_headers.cache_host, []).append(host_response)
-
-                    if finish_once_success:
-                        if cls.cache_is_revalidated_during_ttl(
-                                statuses=resources_statuses[resource.id][response_headers.cache_host],
-                                period_of_time=period_of_time
-                        ):
-                            return True
-
-        logger.debug(f'resources statuses: {resources_statuses}')
-
-        # TODO: don't copy but create above where original dict is created
-        resources_statuses_copy = deepcopy(resources_statuses)
+                    pytest.fail('Cache-Status header is absent')
 
-        for resource_id, resource_statuses in resources_statuses.items():
-            for host_name, host_responses in resource_statuses.items():
-                if cls.cache_is_revalidated_during_ttl(statuses=host_responses, period_of_time=period_of_time):
-                    resources_statuses_copy[resource_id].pop(host_name)
-            if not resources_statuses_copy[resource_id]:
-                resources_statuses_copy.pop(resource_id)
+                received = clock.time()
+                samples.append(resource.id, response_headers.cache_host, received, response_headers.cache_status)
+                verdict = cls.add_edge_sample(
+                    detectors, estimators, resource.id, response_headers.cache_host, received, response_headers,
+                    period_of_time
+                )
+                if cls.verdict_is_revalidated_during_ttl(verdict) and finish_once_success:
+                    return True
+                # hosts are not chosen by random requests: resource is done once all seen hosts are
+                if verdict is not Verdict.PENDING and detectors.resource_is_decided(resource.id):
+                    resources_to_curl.remove(resource)
+                else:
+                    scheduler.schedule(resource.id, resource.id, response_headers.cache_host, clock.time())
 
-        logger.debug(f'resources statuses after processing: {resources_statuses_copy}')
+            cls.sleep_until_next_probe(
+                scheduler, [resource.id for resource in resources_to_curl], start_time + time_to_test
+            )
 
-        return resources_statuses_copy == {}
+        logger.debug(f'resources statuses: {samples}, detectors: {detectors}, cached objects: {estimators}, '
+                     f'{scheduler}')
+        return detectors.all_revalidated_after_ttl()
 
     @classmethod
     # TODO: refactor - too long method
-    # TODO: make async otherwise too few requests and needs too many periods_count (such as 5) to assert successfully
-    # NB! better use targeted requests to specific cache hosts
+    # NB! too few requests to assert successfully with few periods_count: use concurrently_curl_resources
     def targeted_http_curl_resources(
             cls,
             resources: List[CDNResource],
+            protocol: str = None,
             period_of_time: int = None,
             periods_count: int = None,
             add_query_arg: bool = False,
-            finish_once_success: bool = None
+            finish_once_success: bool = None,
+            edge_cache_hosts: List[EdgeCacheHost] = None
     ) -> bool:
 
-        if not cls.edge_cache_hosts:
+        if edge_cache_hosts is None:
+            edge_cache_hosts = cls.edge_cache_hosts
+        if not edge_cache_hosts:
             pytest.fail('Edge cache hosts should be defined for targeted curl')
 
-        resources_statuses = {}
+        if protocol is None:
+            protocol = cls.protocol
+
+        samples = SampleStore()
         resources_statuses_template = {}
         query_generator = increment()
-
-        for resource in resources:
-            resources_statuses[resource.id] = {}
-            resources_statuses_template[resource.id] = {}
-            for edge_host in cls.edge_cache_hosts:
-
-                url = resource.cname
-                if add_query_arg:
-                    url += '?foo=' + str(next(query_generator))
-                logger.debug(f'GET {url}...')
-                response = http_get_request_through_ip_address(url, edge_host['ip_address'])
-                response_headers = EdgeResponseHeaders(**response.headers)
-                logger.debug(response_headers)
-
-                if not response_headers.cache_status:
-                    pytest.fail('Cache-Status header is absent')
-
-                host_response = HostResponse(time=time.time(), status=response_headers.cache_status)
-                resources_statuses[resource.id][edge_host['url']] = [host_response, ]
-                resources_statuses_template[resource.id][edge_host['url']] = None
-
         period_of_time, finish_once_success, time_to_test, start_time = (
             cls.init_parameters_for_curl(period_of_time, periods_count, finish_once_success)
         )
+        detectors = cls.make_revalidation_detectors(period_of_time)
+        estimators = CacheObjectEstimators(ttl=period_of_time)
+        scheduler = cls.make_probe_scheduler(estimators, period_of_time)
+
+        for resource in resources:
+            resources_statuses_template[resource.id] = {edge_host.url: None for edge_host in edge_cache_hosts}
 
         logger.info(f'GET resources [{[r.cname for r in resources]}] for up to {time_to_test} seconds...')
-        while time.time() < start_time + time_to_test:
+        while clock.time() < start_time + time_to_test and not scheduler.exhausted:
             for resource in resources:
                 if resource.id in resources_statuses_template:
-                    for edge_host in cls.edge_cache_hosts:
-                        if edge_host in resources_statuses_template[resource.id]:
+                    for edge_host in edge_cache_hosts:
+                        pair = (resource.id, edge_host.url)
+                        if (
+                                edge_host.url in resources_statuses_template[resource.id]
+                                and scheduler.is_due(pair, clock.time())
+                                and scheduler.take()
+                        ):
 
                             url = resource.cname
                             if add_query_arg:
                                 url += '?foo=' + str(next(query_generator))
                             logger.debug(f'GET {url}...')
-                            response = http_get_request_through_ip_address(url, edge_host['ip_address'])
+                            response = http_get_request_through_ip_address(
+                                url, edge_host.ip_address, protocol=protocol, verify=cls.verify_tls
+                            )
+                            if response is None:
+                                # failed request is no sample, pair is probed again once due
+                                scheduler.schedule(pair, *pair, clock.time())
+                                continue
                             response_headers = EdgeResponseHeaders(**response.headers)
 
                             if not response_headers.cache_status:
                                 pytest.fail('Cache-Status header is absent')
 
-                            host_response = HostResponse(time=time.time(), status=response_headers.cache_status)
-                            resources_statuses[resource.id][response_headers.cache_host].append(host_response)
+                            received = clock.time()
+                            samples.append(resource.id, edge_host.url, received, response_headers.cache_status)
+                            verdict = cls.add_edge_sample(
+                                detectors, estimators, resource.id, edge_host.url, received, response_headers,
+                                period_of_time
+                            )
 
-                            if cls.cache_is_revalidated_during_ttl(
-                                statuses=resources_statuses[resource.id][response_headers.cache_host],
-                                period_of_time=period_of_time
-                            ):
+                            if cls.verdict_is_revalidated_during_ttl(verdict) and finish_once_success:
+                                logger.debug(f'edge connections stats: {edge_clients.connection_stats()}')
+                                return True
 
-                                if finish_once_success:
-                                    return True
-
-                                del resources_statuses_template[resource.id][response_headers.cache_host]
+                            if verdict is not Verdict.PENDING:
+                                del resources_statuses_template[resource.id][edge_host.url]
+                            else:
+                                scheduler.schedule(pair, *pair, clock.time())
 
                     if resources_statuses_template[resource.id] == {}:
                         del resources_statuses_template[resource.id]
 
             if resources_statuses_template == {}:
-                return True
+                logger.debug(f'edge connections stats: {edge_clients.connection_stats()}, {scheduler}')
+                return detectors.all_revalidated_after_ttl()
 
+            cls.sleep_until_next_probe(
+                scheduler,
+                [(resource_id, url) for resource_id, urls in resources_statuses_template.items() for url in urls],
+                start_time + time_to_test
+            )
+
+        logger.debug(f'resources statuses: {samples}, detectors: {detectors}, cached objects: {estimators}, '
+                     f'{scheduler}')
+        logger.debug(f'edge connections stats: {edge_clients.connection_stats()}')
         return False
 
     @classmethod
-    def cache_is_revalidated_during_ttl(
+    def concurrently_curl_resources(
             cls,
-            statuses: List[HostResponse],
+            resources: List[CDNResource],
+            protocol: str = None,
             period_of_time: int = None,
-            ttl_error_rate: float = None
+            periods_count: int = None,
+            add_query_arg: bool = False,
+            finish_once_success: bool = None,
+            edge_cache_hosts: List[EdgeCacheHost] = None
     ) -> bool:
 
+        if protocol is None:
+            protocol = cls.protocol
+
+        period_of_time, finish_once_success, time_to_test, start_time = cls.init_parameters_for_curl(
+            period_of_time, periods_count, finish_once_success
+        )
+
+        samples = SampleStore()
+        detectors = cls.make_revalidation_detectors(period_of_time)
+        estimators = CacheObjectEstimators(ttl=period_of_time)
+        scheduler = cls.make_probe_scheduler(estimators, period_of_time)
+
+        if edge_cache_hosts is None:
+            edge_cache_hosts = cls.edge_cache_hosts
+        edges_ips = [edge_host.ip_address for edge_host in edge_cache_hosts] if edge_cache_hosts else [None]
+        targets = [ProbeTarget(r.id, r.cname, edge_ip) for r in resources for edge_ip in edges_ips]
+        prober = AsyncEdgeProber(
+            protocol=protocol,
+            max_in_flight=cls.max_in_flight,
+            max_in_flight_per_host=cls.max_in_flight_per_host,
+            add_query_arg=add_query_arg,
+            verify=cls.verify_tls,
+            scheduler=scheduler
+        )
+        revalidated = []
+
+        def on_sample(sample: ProbeSample) -> bool:
+            if not sample.headers.cache_status:
+                pytest.fail('Cache-Status header is absent')
+
+            pair = (sample.target.resource_id, sample.headers.cache_host)
+            samples.append(*pair, sample.time, sample.headers.cache_status)
+
+            verdict = cls.add_edge_sample(detectors, estimators, *pair, sample.time, sample.headers, period_of_time)
+            if cls.verdict_is_revalidated_during_ttl(verdict):
+                revalidated.append(pair)
+                if finish_once_success:
+                    prober.stop()
+            if verdict is not Verdict.PENDING:
+                # target pinned to edge is done, not pinned one can get to other cache hosts yet
+                return sample.target.edge_ip is not None or detectors.resource_is_decided(pair[0])
+            return False
+
+        logger.info(f'GET resources [{[r.cname for r in resources]}] through [{len(edges_ips)}] edges '
+                    f'concurrently for up to {time_to_test} seconds...')
+        prober.run_sync(targets, duration=start_time + time_to_test - clock.time(), on_sample=on_sample)
+        logger.debug(f'requests sent: {prober.requests_sent}, resources statuses: {samples}, detectors: {detectors}, '
+                     f'cached objects: {estimators}, {scheduler}')
+
+        if finish_once_success:
+            return bool(revalidated)
+        return detectors.all_revalidated_after_ttl()
+
+    @classmethod
+    def min_revalidation_interval(cls, period_of_time: int = None, ttl_error_rate: float = None) -> float:
         if period_of_time is None:
             period_of_time = cls.short_ttl
         if ttl_error_rate is None:
             ttl_error_rate = cls.ttl_error_rate
+        return ttl_error_rate * period_of_time
 
-        last_revalidated_or_miss = None
+    @classmethod
+    def make_revalidation_detectors(cls, period_of_time: int = None, ttl_error_rate: float = None) -> RevalidationDetectors:
+        return RevalidationDetectors(min_interval=cls.min_revalidation_interval(period_of_time, ttl_error_rate))
 
-        for host_response in statuses:
-            if host_response.status in ('REVALIDATED', 'MISS'):
-                if last_revalidated_or_miss:
-                    # TODO: Check not the time of response received but response prepared by host? (Header 'Date:...')
-                    # return host_response.time - last_revalidated_or_miss > error_rate * period_of_time
-                    if host_response.time - last_revalidated_or_miss > ttl_error_rate * period_of_time:
-                        return True
-                    else:
-                        raise RevalidatedBeforeTTL()
-                last_revalidated_or_miss = host_response.time
+    @classmethod
+    def make_probe_scheduler(
+            cls,
+            estimators: CacheObjectEstimators,
+            period_of_time: int = None,
+            ttl_error_rate: float = None
+    ) -> AdaptiveProbeScheduler:
+        return AdaptiveProbeScheduler(
+            estimators,
+            ttl=period_of_time if period_of_time is not None else cls.short_ttl,
+            ttl_error_rate=ttl_error_rate if ttl_error_rate is not None else cls.ttl_error_rate,
+            requests_budget=cls.requests_budget
+        )
 
-        return False
+    @staticmethod
+    def sleep_until_next_probe(scheduler: AdaptiveProbeScheduler, keys: list, deadline: float) -> None:
+        now = clock.time()
+        if keys and (delay := min(scheduler.time_to_next_due(keys, now), deadline - now)) > 0:
+            clock.sleep(delay)
+
+    @classmethod
+    def add_edge_sample(
+            cls,
+            detectors: RevalidationDetectors,
+            estimators: CacheObjectEstimators,
+            resource_id: str,
+            host: str,
+            received: float,
+            headers: EdgeResponseHeaders,
+            period_of_time: int
+    ) -> Verdict:
+        """ Feed revalidation detector with store times of cached objects by edge clock: Date - Age, or Date of
+        MISS/REVALIDATED responses. Other responses without Age go with their Date, or receive time converted
+        to the edge clock if there is no Date, so all samples of the pair are on one clock. Knowing the age of the object first response
+        gives the previous revalidation, so the check needs about one period instead of several.
+        """
+
+        estimator = estimators.get(resource_id, host)
+        if (stored_at := estimator.add(headers, received)) is not None:
+            detectors.add(resource_id, host, stored_at, CacheStatus.REVALIDATED.name)
+        elif headers.stored_at is None:
+            detectors.add(resource_id, host, estimator.edge_time(headers, received), headers.cache_status)
+        if estimator.age is not None and estimator.age > (1 + cls.ttl_error_rate) * period_of_time:
+            # object has outlived the period: it is not revalidated after it
+            return detectors.mark_not_revalidated(resource_id, host)
+        return detectors.verdict(resource_id, host)
+
+    @staticmethod
+    def verdict_is_revalidated_during_ttl(verdict: Verdict) -> bool:
+        """ Tests expect RevalidatedBeforeTTL to be raised from curl methods in case of early revalidation
+        """
+
+        if verdict is Verdict.REVALIDATED_BEFORE_TTL:
+            raise RevalidatedBeforeTTL()
+        return verdict is Verdict.REVALIDATED_AFTER_TTL
+
+    @classmethod
+    def cache_is_revalidated_during_ttl(
+            cls,
+            statuses: List[HostResponse],
+            period_of_time: int = None,
+            ttl_error_rate: float = None
+    ) -> bool:
+
+        detector = RevalidationDetector(min_interval=cls.min_revalidation_interval(period_of_time, ttl_error_rate))
+        for host_response in statuses:
+            if detector.add(host_response.time, CacheStatus.from_header(host_response.status)) is not Verdict.PENDING:
+                break
+        return cls.verdict_is_revalidated_during_ttl(detector.verdict)
 
     @classmethod
-    def prepare_resources_list_to_test(cls, conditions: Callable) -> List[CDNResource]:
-        resources_to_test = [r for r in cls.cdn_resources if conditions(r)]
+    def prepare_resources_list_to_test(cls, conditions: Optional[Callable] = None, **facets) -> List[CDNResource]:
+        """ Resources with given option facets (see test.resourceindex) satisfying conditions if given
+        """
+
+        resources_to_test = cls.resources_index.select(**facets)
+        if conditions:
+            resources_to_test = [r for r in resources_to_test if conditions(r)]
         if not resources_to_test:
-            pytest.fail(f'No resources found to test disabled edge_cache_settings')
+            pytest.fail(f'No resources found to test: {facets or conditions}')
         return resources_to_test
 
     @classmethod
-    @repeat_for_period_ot_time_or_until_fail(attempts_needed_to_succeed=2, success_attempt_delay=5, tries_if_fail=2)
     def check_cdn_resources_are_equal_to_existing_for_period_of_time(cls) -> bool:
-        return cls.all_cdn_resources_are_equal_to_existing()
+        """ Every resource is equal to existing one for 2 checks in a row 5 seconds apart, 2 failures fail it
+        """
+
+        return cls.wait_cdn_resources_are_equal_to_existing(hold=2, hold_interval=5, max_failures=2)
 
     @classmethod
     def all_cdn_resources_are_equal_to_existing(cls) -> bool:
+        return cls.wait_cdn_resources_are_equal_to_existing(attempts=1)
+
+    @classmethod
+    def wait_cdn_resources_are_equal_to_existing(cls, **condition_kwargs) -> bool:
+        """ Resources are compared to existing ones at once, each of them is a condition of its own
+        """
+
         logger.info('Checking all cdn resources are equal to existing...')
-        for resource in cls.cdn_resources:
-            logger.debug(f'Checking resource: {resource.id}...')
-            if not cls.cdn_resources_proc.compare_resource_to_existing(resource):
-                logger.debug('...FAIL')
-                return False
-            logger.debug('...OK')
+        conditions = [
+            Condition(
+                f'resource [{resource.id}] is equal to existing',
+                partial(cls.cdn_resources_proc.compare_resource_to_existing, resource),
+                **condition_kwargs
+            )
+            for resource in cls.cdn_resources
+        ]
+        results = wait_for_all(conditions, initial_delay=FIRST_RETRY_DELAY, max_delay=5)
+        if failed := [result.name for result in results if not result.success]:
+            logger.debug(f'...FAIL: {failed}')
+            return False
         logger.info('...OK')
         return True
 
     @classmethod
-    @repeat_for_period_ot_time_or_until_fail(attempts_needed_to_succeed=1, success_attempt_delay=0, tries_if_fail=2)
     def check_cnames_are_404_or_reset_by_peer(cls, cnames: List[str]) -> bool:
         logger.info(f'Checking if cnames are 404 or reset by peer...')  # TODO: to add config parameter as period of time
-        for cname in cnames:
-            try:
-                request = http_get_request(url=f'{cls.protocol}://{cname}')
-                logger.debug(f'GET {cname}...')
-                if request.status_code != 404:  # TODO: think about this check
-                    return False
-
-            except requests.exceptions.ConnectionError as ce:  # DNS CNAME records should be created before hence should be reachable TODO remake with DNS creation
-                err_type = get_connection_error_type(ce.__context__)
-                logger.debug(f'err: {ce}, error type: {err_type.value}')
-
-                if err_type == ConnectionErrorType.RESET_BY_PEER:
-                    logger.debug('...OK - reset by peer')
-                elif err_type == ConnectionErrorType.NAME_RESOLUTION_ERROR:
-                    logger.error(f'...FAIL. Check DNS or any other name resolution issues')
-                    return False
-                else:
-                    logger.error(f'...FAIL. Unknown connection error')
-                    return False
+        # DNS CNAME records should be created before hence should be reachable TODO remake with DNS creation
+        report = CnameReadinessChecker(protocol=cls.protocol).wait_ready(cnames, attempts=2)
+        logger.debug(f'cnames readiness: {list(report.values())}')
+
+        if not_ready := [check for check in report.values() if not check.ready]:
+            logger.error(f'...FAIL. Cnames are not ready: {not_ready}')
+            return False
 
-            return True
         logger.info('...OK')
+        return True
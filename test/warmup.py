@@ -0,0 +1,176 @@
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import requests
+
+from app import clock
+from app.cacheops import RateLimiter
+from app.edgeclient import EdgeClientRegistry
+from test.histogram import LatencyHistogram
+from test.logger import logger
+from test.samplestore import CacheStatus
+from test.utils import get_connection_error_type
+
+WarmupTarget = namedtuple('WarmupTarget', 'cname, path')
+
+
+class EdgeWarmupStats:
+    """ Warm coverage of one edge: which urls got HIT and how long it took since the first request of the url
+    """
+
+    def __init__(self):
+        self.time_to_warm = LatencyHistogram()
+        self.requests = 0
+        self.cache_statuses: Dict[str, int] = {}
+        self.errors: Dict[str, int] = {}
+        self.warm: Dict[WarmupTarget, float] = {}
+        self.cold: List[WarmupTarget] = []
+
+    def add_response(self, cache_status: Optional[str]) -> None:
+        self.requests += 1
+        status = CacheStatus.from_header(cache_status).name
+        self.cache_statuses[status] = self.cache_statuses.get(status, 0) + 1
+
+    def add_error(self, error_type: str) -> None:
+        self.requests += 1
+        self.errors[error_type] = self.errors.get(error_type, 0) + 1
+
+    def add_warm(self, target: WarmupTarget, seconds: float) -> None:
+        self.warm[target] = seconds
+        self.time_to_warm.add(seconds)
+
+    @property
+    def coverage(self) -> Optional[float]:
+        urls = len(self.warm) + len(self.cold)
+        return len(self.warm) / urls if urls else None
+
+    def to_dict(self, protocol: str) -> dict:
+        return {
+            'urls': len(self.warm) + len(self.cold),
+            'warm': len(self.warm),
+            'coverage': None if self.coverage is None else round(self.coverage, 4),
+            'time_to_warm_ms': self.time_to_warm.to_dict(),
+            'requests': self.requests,
+            'cache_statuses': self.cache_statuses,
+            'errors': self.errors,
+            'cold': [f'{protocol}://{target.cname}{target.path}' for target in self.cold],
+        }
+
+
+class EdgeWarmup:
+    """ Requesting every url through every edge until edge answers HIT (or attempts/timeout are over).
+    Requests go over pooled keep-alive connections pinned to edges ips. Origin is protected by the overall
+    requests rate and by the limit of requests in flight for one url: until url is cached each edge request of it
+    is an origin fetch.
+    """
+
+    def __init__(
+            self,
+            targets: List[WarmupTarget],
+            edges_ips: List[str],
+            protocol: str = 'http',
+            interval: float = 1,
+            timeout: float = 60,
+            max_attempts: int = 10,
+            rate: Optional[float] = 20,
+            max_workers: int = 16,
+            max_in_flight_per_url: int = 2,
+            request_timeout: float = 5,
+            verify: bool = True
+    ):
+        if not targets or not edges_ips:
+            raise ValueError('No urls or edges to warm up')
+        self.targets = list(dict.fromkeys(targets))
+        self.edges_ips = edges_ips
+        self.protocol = protocol
+        self.interval = interval  # between requests of one url to one edge
+        self.timeout = timeout  # for one url on one edge
+        self.max_attempts = max_attempts
+        self.max_workers = max_workers
+        self.request_timeout = request_timeout
+        self.verify = verify  # tls certificates of edges
+
+        self.stats: Dict[str, EdgeWarmupStats] = {edge_ip: EdgeWarmupStats() for edge_ip in edges_ips}
+        self._limiter = RateLimiter(rate)
+        self._url_slots = {target: threading.BoundedSemaphore(max_in_flight_per_url) for target in self.targets}
+        self._lock = threading.Lock()
+        self._clients = EdgeClientRegistry(pool_maxsize=max_workers)
+
+    def _request(self, target: WarmupTarget, edge_ip: str) -> Optional[CacheStatus]:
+        url = f'{self.protocol}://{target.cname}{target.path}'
+        self._limiter.acquire()
+        try:
+            with self._url_slots[target]:
+                with self._clients.get(url, edge_ip, verify=self.verify, timeout=self.request_timeout, stream=True) as r:
+                    for _ in r.iter_content(64 * 1024):  # body has to be read for edge to cache it
+                        pass
+        except requests.Timeout:
+            error_type = 'TIMEOUT'
+        except requests.ConnectionError as e:
+            error_type = get_connection_error_type(e.__context__).name
+        except requests.RequestException as e:
+            logger.debug(f'GET {url} through [{edge_ip}] failed: {e}')
+            error_type = 'REQUEST_ERROR'
+        else:
+            cache_status = r.headers.get('Cache-Status')
+            with self._lock:
+                self.stats[edge_ip].add_response(cache_status)
+            return CacheStatus.from_header(cache_status) if r.status_code == 200 else None
+
+        with self._lock:
+            self.stats[edge_ip].add_error(error_type)
+        return None
+
+    def warm(self, target: WarmupTarget, edge_ip: str) -> None:
+        start = clock.monotonic()
+        for attempt in range(1, self.max_attempts + 1):
+            if self._request(target, edge_ip) == CacheStatus.HIT:
+                with self._lock:
+                    self.stats[edge_ip].add_warm(target, clock.monotonic() - start)
+                return
+            if attempt == self.max_attempts or clock.monotonic() - start + self.interval > self.timeout:
+                break
+            clock.sleep(self.interval)
+
+        logger.debug(f'{target.cname}{target.path} is not cached by [{edge_ip}] after {attempt} attempt(s)')
+        with self._lock:
+            self.stats[edge_ip].cold.append(target)
+
+    def run(self) -> dict:
+        logger.info(f'Warming up [{len(self.targets)}] urls on [{len(self.edges_ips)}] edges...')
+        start = clock.monotonic()
+        # diagonal order: requests in flight go to different urls on different edges
+        pairs = [(self.targets[(i + j) % len(self.targets)], edge_ip)
+                 for i in range(len(self.targets)) for j, edge_ip in enumerate(self.edges_ips)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(lambda pair: self.warm(*pair), pairs))
+        elapsed = clock.monotonic() - start
+        self._clients.close()
+        return self.report(elapsed)
+
+    def report(self, elapsed: float) -> dict:
+        with self._lock:
+            edges = {edge_ip: stats.to_dict(self.protocol) for edge_ip, stats in sorted(self.stats.items())}
+            resources = {}
+            for target in self.targets:
+                resource = resources.setdefault(target.cname, {'urls': 0, 'warm_edges': 0})
+                resource['urls'] += 1
+                resource['warm_edges'] += sum(target in stats.warm for stats in self.stats.values())
+            time_to_warm = LatencyHistogram.merged(stats.time_to_warm for stats in self.stats.values())
+            warm = sum(len(stats.warm) for stats in self.stats.values())
+            requests_count = sum(stats.requests for stats in self.stats.values())
+
+        for resource in resources.values():
+            resource['coverage'] = round(resource.pop('warm_edges') / (resource['urls'] * len(self.edges_ips)), 4)
+        return {
+            'urls': len(self.targets),
+            'edges': len(self.edges_ips),
+            'elapsed': round(elapsed, 3),
+            'requests': requests_count,
+            'coverage': round(warm / (len(self.targets) * len(self.edges_ips)), 4),
+            'time_to_warm_ms': time_to_warm.to_dict(),
+            'resources': resources,
+            'edges_stats': edges,
+        }